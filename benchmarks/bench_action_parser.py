@@ -0,0 +1,49 @@
+import time
+import argparse
+import numpy as np
+import gymnasium as gym
+from llfbench.envs.action_parser import make_parser
+
+"""
+
+Benchmark of parsing the text of a Box action, as done by `TextWrapper`.
+
+It compares `exec`-ing `np.array(<text>)` (the previous implementation) with
+the compiled regexes of `llfbench/envs/action_parser.py`, for the 4-d action
+of metaworld and a nested (2, 2) action.
+
+Usage:
+    python benchmarks/bench_action_parser.py [--repeats 20000]
+
+"""
+
+CASES = (
+    ((4,), '[0.512, -0.034, 0.127, 1.0]'),
+    ((2, 2), '[[0.5, -0.25], [0.125, 1.0]]'),
+)
+
+
+def legacy_parse(action):
+    locals_dict = {}
+    exec("action = np.array({})".format(action), globals(), locals_dict)
+    return locals_dict['action']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'shape':<10}{'exec (us)':>11}{'parser (us)':>13}{'speedup':>10}")
+    for shape, text in CASES:
+        action_parser = make_parser(gym.spaces.Box(-1, 1, shape))
+        assert np.allclose(legacy_parse(text), action_parser.parse(text))
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            legacy_parse(text)
+        legacy = (time.perf_counter() - start) / args.repeats * 1e6
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            action_parser.parse(text)
+        parsed = (time.perf_counter() - start) / args.repeats * 1e6
+        print(f'{str(shape):<10}{legacy:>11.2f}{parsed:>13.2f}{legacy / parsed:>9.1f}x')
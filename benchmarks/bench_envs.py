@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import warnings
+from llfbench.profile import text_action
+
+"""
+
+Throughput benchmark of the registered LLF envs, with stored baselines.
+
+Each env id is run in a fresh Python process, over every combination of its
+instruction types and feedback types (including 'n', 'a' and 'm'), as in
+`tests/test_envs.py`. For each combination, it measures the latency of reset
+and the steps per second under a policy that takes `info['expert_action']`
+when the env provides one (with `--policy expert`) or a random action
+otherwise. For each env id, it measures the peak RSS of the process.
+
+The results can be saved as a baseline, and later runs are compared against
+it: a reset slower than the baseline, fewer steps per second, or a larger
+peak RSS, each by more than `--tolerance`, is reported as a regression and the
+script exits with status 1. An env without a baseline is reported as such, as
+it cannot regress. Baselines are machine specific; regenerate them with
+`--save` on the machine used for tracking, with every family installed. The
+`_meta` of a baseline lists its families, and the families left out of it
+with the reason (not installed, or not run).
+
+Usage:
+    python benchmarks/bench_envs.py [--prefixes llf-gridworld llf-optimization] [--steps 200] [--resets 5]
+    python benchmarks/bench_envs.py --save      # write the baseline
+    python benchmarks/bench_envs.py --compare   # compare with the baseline
+
+"""
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'envs.json')
+
+
+def run_config(env_name, config, steps, resets, policy, seed=0):
+    """ Return the reset latency (ms) and the steps per second of a config. """
+    import gymnasium as gym
+    import llfbench
+    env = llfbench.make(env_name, **config)
+    env.action_space.seed(seed)
+    is_text = isinstance(env.action_space, gym.spaces.Text)
+
+    # Warm up (e.g. the caches of compiled templates) before timing.
+    env.reset(seed=seed)
+    env.step(text_action(env_name) if is_text else env.action_space.sample())
+
+    reset_time = 0.0
+    for i in range(resets):
+        start = time.perf_counter()
+        env.reset(seed=seed + i)
+        reset_time += time.perf_counter() - start
+
+    _, info = env.reset(seed=seed)
+    step_time = 0.0
+    for _ in range(steps):
+        if policy == 'expert' and info.get('expert_action') is not None:
+            action = info['expert_action']
+        else:
+            action = text_action(env_name) if is_text else env.action_space.sample()
+        start = time.perf_counter()
+        _, _, terminated, truncated, info = env.step(action)
+        step_time += time.perf_counter() - start
+        if terminated or truncated:
+            _, info = env.reset()  # not timed
+    env.close()
+    return dict(reset_ms=reset_time / resets * 1e3, steps_per_sec=steps / step_time)
+
+
+def run_env(env_name, steps, resets, policy):
+    """ Run all the configs of an env id. This is run in a fresh process. """
+    import llfbench
+    from llfbench.utils.utils import generate_combinations_dict
+    instruction_types, feedback_types = llfbench.supported_types(env_name)
+    feedback_types = list(feedback_types) + ['n', 'a', 'm']
+    configs = generate_combinations_dict(dict(instruction_type=instruction_types, feedback_type=feedback_types))
+    results = {}
+    for config in configs:
+        results[f"{config['instruction_type']}-{config['feedback_type']}"] = run_config(env_name, config, steps, resets, policy)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    return dict(peak_rss_mb=peak_rss_mb, configs=results)
+
+
+def run_in_subprocess(env_name, args):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', env_name,
+               '--steps', str(args.steps), '--resets', str(args.resets), '--policy', args.policy]
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        return dict(error=process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'failed')
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def env_names(prefixes):
+    import llfbench
+    return [spec.id for spec in llfbench.ENV_SPECS.values()
+            if spec.available and any(spec.id.startswith(p) for p in prefixes)]
+
+
+def baseline_families(baseline):
+    """ The families of the envs in a baseline, and the families of
+        llfbench.envs left out of it, with the reason. """
+    import pkgutil
+    import llfbench
+    import llfbench.envs
+    families = sorted({llfbench.ENV_SPECS[env_name].family for env_name in baseline if env_name in llfbench.ENV_SPECS})
+    installed = {spec.family for spec in llfbench.ENV_SPECS.values() if spec.available}
+    omitted = {module.name: 'not run' if module.name in installed else 'not installed'
+               for module in pkgutil.iter_modules(llfbench.envs.__path__)
+               if module.ispkg and module.name not in families}
+    return families, omitted
+
+
+def compare(results, baseline, tolerance):
+    """ Return the regressions of results with respect to the baseline. """
+    regressions = []
+    for env_name, result in results.items():
+        if env_name not in baseline or 'error' in result or 'error' in baseline[env_name]:
+            continue
+        base = baseline[env_name]
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{env_name}: peak RSS {result['peak_rss_mb']:.0f} MB > {base['peak_rss_mb']:.0f} MB")
+        for name, config in result['configs'].items():
+            if name not in base['configs']:
+                continue
+            base_config = base['configs'][name]
+            if config['reset_ms'] > base_config['reset_ms'] * (1 + tolerance):
+                regressions.append(f"{env_name} [{name}]: reset {config['reset_ms']:.2f} ms > {base_config['reset_ms']:.2f} ms")
+            if config['steps_per_sec'] < base_config['steps_per_sec'] / (1 + tolerance):
+                regressions.append(f"{env_name} [{name}]: {config['steps_per_sec']:.0f} steps/s < {base_config['steps_per_sec']:.0f} steps/s")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prefixes', nargs='+', default=['llf-'])
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--resets', type=int, default=5)
+    parser.add_argument('--policy', choices=('random', 'expert'), default='expert')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='compare the results with the baseline')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        warnings.filterwarnings('ignore')
+        print(json.dumps(run_env(args.worker, args.steps, args.resets, args.policy)))
+        sys.exit(0)
+
+    results = {}
+    print(f"{'env':<50}{'configs':>8}{'reset (ms)':>12}{'steps/s':>10}{'peak RSS (MB)':>15}")
+    for env_name in env_names(args.prefixes):
+        result = results[env_name] = run_in_subprocess(env_name, args)
+        if 'error' in result:
+            print(f"{env_name:<50}{'error':>8}   ({result['error']})")
+            continue
+        configs = result['configs'].values()
+        reset_ms = sum(c['reset_ms'] for c in configs) / len(configs)
+        steps_per_sec = sum(c['steps_per_sec'] for c in configs) / len(configs)
+        print(f"{env_name:<50}{len(configs):>8}{reset_ms:>12.2f}{steps_per_sec:>10.0f}{result['peak_rss_mb']:>15.0f}")
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)  # keep the baselines of the envs not run
+        baseline.pop('_meta', None)
+        families, omitted_families = baseline_families(baseline)
+        baseline['_meta'] = dict(python=platform.python_version(), machine=platform.machine(), cpus=os.cpu_count(),
+                                 steps=args.steps, resets=args.resets, policy=args.policy,
+                                 families=families, omitted_families=omitted_families,
+                                 command=' '.join(['python benchmarks/bench_envs.py'] + sys.argv[1:]),
+                                 date=time.strftime('%Y-%m-%d'))
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f'Saved the baseline to {args.baseline}')
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for env_name in results:
+            if env_name not in baseline:
+                print(f'NO BASELINE {env_name}')
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        print(f'{len(regressions)} regressions (tolerance {args.tolerance:.0%}).')
+        sys.exit(1 if regressions else 0)
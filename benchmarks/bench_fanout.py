@@ -0,0 +1,77 @@
+import time
+import argparse
+import warnings
+import gymnasium as gym
+import llfbench
+from llfbench.envs.oracle import get_llf_wrapper
+from llfbench.profile import text_action
+
+"""
+
+Benchmark of rendering one trajectory under many feedback configurations.
+
+For each env, it measures the time to step the same trajectory (the same seed
+and actions) under every config of a feedback ablation: each feedback type
+('r', 'hp', 'hn', 'fp', 'fn', 'm', 'a' and 'n' by default) under each of
+`--paraphrase_methods`. This is done
+
+    separate: once per config, as separate runs of the env.
+    fanout: once, with `LLFWrapper.set_fanout(configs)`, which steps the
+        simulator once and computes the feedback of each config.
+
+The time reported is per step of the trajectory, over all the configs.
+
+Usage:
+    python benchmarks/bench_fanout.py [--steps 50] [--paraphrase_methods random 0]
+
+"""
+
+ENVS = ('llf-gridworld-v0', 'llf-optimization-Rosenbrock-v0', 'llf-poem-Haiku-v0', 'llf-highway-parking-v0',
+        'llf-metaworld-pick-place-v2')
+
+
+def make_actions(env, env_name, steps):
+    if isinstance(env.action_space, gym.spaces.Text):
+        return [text_action(env_name)] * steps
+    env.action_space.seed(0)
+    return [env.action_space.sample() for _ in range(steps)]
+
+
+def run(env, actions, fanout=None, **config):
+    wrapper = get_llf_wrapper(env)
+    wrapper.set_feedback_type(config.get('feedback_type', 'a'))
+    wrapper.set_paraphrase_method(config.get('paraphrase_method', 'random'))
+    wrapper.set_fanout(fanout)
+    env.reset(seed=0)
+    start = time.perf_counter()
+    for action in actions:
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            env.reset()  # timed; the same in both variants
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--feedback_types', nargs='+', default=None, help='default: the supported types and m, a, n')
+    parser.add_argument('--paraphrase_methods', nargs='+', default=['random'], help="'random' or integers")
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+    methods = [m if m == 'random' else int(m) for m in args.paraphrase_methods]
+
+    print(f"{'env':<40}{'configs':>8}{'separate (ms)':>15}{'fanout (ms)':>13}{'speedup':>9}")
+    for env_name in ENVS:
+        spec = llfbench.get_spec(env_name)
+        if spec is None or not spec.available:
+            print(f'{env_name:<40}{"not installed":>15}')
+            continue
+        feedback_types = args.feedback_types or list(llfbench.supported_types(env_name)[1]) + ['m', 'a', 'n']
+        configs = [dict(feedback_type=t, paraphrase_method=m) for t in feedback_types for m in methods]
+        env = llfbench.make(env_name, production=True)
+        actions = make_actions(env, env_name, args.steps)
+        run(env, actions[:2])  # warm up
+        separate = sum(run(env, actions, **config) for config in configs)
+        fanout = run(env, actions, configs)
+        print(f'{env_name:<40}{len(configs):>8}{separate / len(actions) * 1e3:>15.2f}'
+              f'{fanout / len(actions) * 1e3:>13.2f}{separate / fanout:>9.1f}')
@@ -0,0 +1,56 @@
+import time
+import string
+import argparse
+import importlib
+import numpy as np
+from llfbench.envs.utils import format
+
+"""
+
+Benchmark of sampling and formatting a paraphrase with `llfbench.envs.utils.format`.
+
+It compares `np.random.choice(prompts).format(**kwargs)` (the previous
+implementation) with drawing an index from a `np.random.Generator` and
+rendering the cached, pre-split template, over all the tuples of prompts in
+the prompts modules.
+
+Usage:
+    python benchmarks/bench_format.py [--repeats 200]
+
+"""
+
+FAMILIES = ('gridworld', 'bandits', 'optimization', 'reco', 'poem', 'highway')
+
+
+def all_prompts(family):
+    module = importlib.import_module(f'llfbench.envs.{family}.prompts')
+    for value in vars(module).values():
+        if isinstance(value, (tuple, list)) and len(value) > 0 and all(isinstance(v, str) for v in value):
+            fields = {f for p in value for _, f, _, _ in string.Formatter().parse(p) if f}
+            yield value, {f: f'<{f}>' for f in fields}
+
+
+def legacy_format(prompts, **kwargs):
+    return np.random.choice(prompts).format(**kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'family':<15}{'prompts':>9}{'legacy (us)':>14}{'sampler (us)':>15}{'speedup':>10}")
+    for family in FAMILIES:
+        cases = list(all_prompts(family))
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            for prompts, kwargs in cases:
+                legacy_format(prompts, **kwargs)
+        legacy = (time.perf_counter() - start) / (args.repeats * len(cases)) * 1e6
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            for prompts, kwargs in cases:
+                format(prompts, rng=rng, **kwargs)
+        sampler = (time.perf_counter() - start) / (args.repeats * len(cases)) * 1e6
+        print(f'{family:<15}{len(cases):>9}{legacy:>14.2f}{sampler:>15.2f}{legacy / sampler:>9.1f}x')
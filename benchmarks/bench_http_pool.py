@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+
+Benchmark of the connections to the LLM backend, with and without an
+`llfbench.agents.http_pool.HTTPPool`, against a local stand-in server.
+
+The server answers chat completions after `--latency` ms, over HTTP/1.1
+keep-alive connections, and with `--tls` over TLS with a self-signed
+certificate (made with the openssl command), so that the handshakes are paid
+as with the real backend. It counts the connections opened.
+
+`--requests` requests are sent by `--concurrency` callers, in two modes:
+
+    threads: threads calling `openai.ChatCompletion.create`, which by default
+        opens a session (and connections) per thread.
+    async: coroutines calling `openai.ChatCompletion.acreate`, which by
+        default opens a session (and a connection) per request.
+
+Each mode is run with the default connections of the openai client and with
+a pool of `--pool_size` connections, and the throughput, the mean latency and
+the connections opened are reported.
+
+Usage:
+    python benchmarks/bench_http_pool.py [--requests 500] [--concurrency 32] [--pool_size 8] [--latency 20] [--tls]
+
+"""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # the headers and the body are sent apart
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.server.latency)
+        data = json.dumps(dict(choices=[dict(index=0, message=dict(role='assistant', content=body['messages'][-1]['content']))],
+                               usage=dict(prompt_tokens=5, completion_tokens=5, total_tokens=10))).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_certificate(directory):
+    """ A self-signed certificate of 127.0.0.1; trusted by the clients started after this. """
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', cert,
+                    '-days', '1', '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1'],
+                   check=True, capture_output=True)
+    os.environ['REQUESTS_CA_BUNDLE'] = os.environ['SSL_CERT_FILE'] = cert  # requests, and ssl's default context
+    return cert, key
+
+
+def start_server(latency, certificate=None):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads, server.lock, server.connections, server.latency = True, threading.Lock(), 0, latency
+    scheme = 'http'
+    if certificate is not None:
+        import ssl
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*certificate)
+        # The handshake is done by the thread of the connection, not the one accepting it.
+        server.socket = context.wrap_socket(server.socket, server_side=True, do_handshake_on_connect=False)
+        scheme = 'https'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'{scheme}://127.0.0.1:{server.server_address[1]}/v1'
+
+
+def run_threads(args, pool):
+    import openai
+    from llfbench.agents.http_pool import set_default_pool
+
+    def create(i):
+        start = time.perf_counter()
+        openai.ChatCompletion.create(model='gpt-35-turbo', messages=[{'role': 'user', 'content': str(i)}])
+        return time.perf_counter() - start
+
+    set_default_pool(pool)
+    try:
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            return list(executor.map(create, range(args.requests)))
+    finally:
+        set_default_pool(None)
+
+
+def run_async(args, pool):
+    import openai
+    from llfbench.agents.http_pool import aiosession
+
+    async def acreate(i, semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            with aiosession(pool):
+                await openai.ChatCompletion.acreate(model='gpt-35-turbo', messages=[{'role': 'user', 'content': str(i)}])
+            return time.perf_counter() - start
+
+    async def main():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = await asyncio.gather(*[acreate(i, semaphore) for i in range(args.requests)])
+        if pool is not None:
+            await pool.aclose()
+        return latencies
+
+    return asyncio.run(main())
+
+
+MODES = dict(threads=run_threads, async_=run_async)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--pool_size', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=20.0, help='the latency (ms) of the server')
+    parser.add_argument('--tls', action='store_true', help='serve over TLS, with a self-signed certificate')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        certificate = make_certificate(directory) if args.tls else None
+        import openai  # after the certificate is trusted
+        from llfbench.agents.http_pool import HTTPPool
+        server, openai.api_base = start_server(args.latency / 1e3, certificate)
+        openai.api_key = 'sk-stand-in'
+
+        print(f"{'mode':<10}{'connections':>14}{'requests/s':>12}{'latency (ms)':>14}{'opened':>8}")
+        for mode, run in MODES.items():
+            for pool in (None, HTTPPool(args.pool_size)):
+                server.connections = 0
+                start = time.perf_counter()
+                latencies = run(args, pool)
+                elapsed = time.perf_counter() - start
+                name = 'default' if pool is None else f'pool of {args.pool_size}'
+                print(f"{mode.rstrip('_'):<10}{name:>14}{len(latencies) / elapsed:>12.1f}"
+                      f"{sum(latencies) / len(latencies) * 1e3:>14.1f}{server.connections:>8}")
+        server.shutdown()
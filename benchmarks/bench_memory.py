@@ -0,0 +1,311 @@
+import gc
+import os
+import sys
+import json
+import resource
+import argparse
+import subprocess
+import warnings
+import tracemalloc
+import numpy as np
+import gymnasium as gym
+import llfbench
+from llfbench.agents.utils import rollout
+from llfbench.agents.basic_ai_agent import BasicAIAgent
+from llfbench.envs.env_wrappers import TextWrapper
+from llfbench.profile import text_action
+
+"""
+
+Memory-growth regression harness of the LLF envs and agents.
+
+Each (env id, agent, scenario) is run in a fresh Python process. The memory
+of the process is sampled after a full garbage collection (every `--sample_every`
+steps in the long scenario, and after every episode in the episodes scenario,
+whose episodes may end long before `--horizon`): its RSS, and the memory
+traced by tracemalloc (which sees only Python allocations, but without the
+noise of the allocator). The growth rate of each, in bytes per step, is the
+slope of a least-squares line fitted to the samples after the first
+`--warmup` fraction of them (caches filling up is not a leak). A run whose
+traced memory grows faster than `--max_slope`, or whose RSS grows faster than
+`--max_rss_slope`, fails, and the script exits with status 1, as it does when
+a run crashes. A run with fewer than `--min_samples` samples after the warmup
+is skipped, with a warning. Everything is imported before the first sample,
+so that importing is not counted as growth.
+
+The scenarios are:
+
+    long: a single run of `--steps` steps, as if the episode never ended
+        (the env is reset only when it terminates or truncates).
+    episodes: `--episodes` sequential episodes of at most `--horizon` steps,
+        run by `llfbench.agents.utils.rollout` as in `evaluate_agent`. With
+        `--log_data`, the data of every episode is kept, as `evaluate_agent`
+        does, which is expected to grow.
+
+The agents are 'random' (which takes the fixed text actions of
+`llfbench.profile.text_action` in the envs with a Text action space), 'expert', which takes
+`info['expert_action']` when the env provides one (e.g. gridworld) and a
+random action otherwise, and two `BasicAIAgent`s over a stub LLM answering
+with the action of the expert, so that the memory of the agent and its LLM is
+measured without calling a backend (their text actions are parsed by a
+`TextWrapper`):
+
+    llm: the agent queries the LLM with `generate`, one prompt at a time.
+    chat: the agent queries the LLM within one chat (as `GPT.chat`), whose
+        history is never reset, which is expected to grow.
+
+Usage:
+    python benchmarks/bench_memory.py [--prefixes llf-gridworld llf-poem] [--agents random expert] [--steps 2000]
+    python benchmarks/bench_memory.py --scenarios episodes --episodes 1000 --log_data
+    python benchmarks/bench_memory.py --agents chat
+
+"""
+
+
+def current_rss() -> int:
+    """ The current (not peak) RSS of this process in bytes. """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:  # not Linux; fall back to the peak RSS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+class MemoryProbe(gym.Wrapper):
+    """ Count the steps of an env, sample the memory every `sample_every`
+        steps (unless it is None), and keep the last info (for the expert
+        agent). The room for `max_samples` samples is allocated upfront, so
+        that keeping them is not counted as growth. """
+
+    def __init__(self, env, sample_every, max_samples):
+        super().__init__(env)
+        self.sample_every = sample_every
+        self.num_steps = 0
+        self._samples = np.zeros((max_samples, 3), dtype=np.int64)  # (steps, rss, traced)
+        self.num_samples = 0
+        self.info = {}
+
+    @property
+    def samples(self):
+        return self._samples[:self.num_samples]
+
+    def sample(self):
+        gc.collect()  # also clears the free lists of the interpreter, which tracemalloc counts as allocated
+        self._samples[self.num_samples] = (self.num_steps, current_rss(), tracemalloc.get_traced_memory()[0])
+        self.num_samples += 1
+
+    def reset(self, **kwargs):
+        observation, self.info = self.env.reset(**kwargs)
+        return observation, self.info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, self.info = self.env.step(action)
+        self.num_steps += 1
+        if self.sample_every is not None and self.num_steps % self.sample_every == 0:
+            self.sample()
+        return observation, reward, terminated, truncated, self.info
+
+
+class RandomAgent:
+    """ An agent (with the interface of `llfbench.agents.abstract_agent.Agent`)
+        that takes random actions. """
+
+    NAME = 'RandomAgent'
+
+    def __init__(self, probe, seed=0):
+        self.probe = probe
+        self.probe.action_space.seed(seed)
+
+    def reset(self, docstring):
+        pass
+
+    def act(self, observation, feedback, **kwargs):
+        if isinstance(self.probe.action_space, gym.spaces.Text):  # cannot be sampled
+            return text_action(self.probe.spec.id)
+        return self.probe.action_space.sample()
+
+
+class ExpertAgent(RandomAgent):
+
+    NAME = 'ExpertAgent'
+
+    def act(self, observation, feedback, **kwargs):
+        expert_action = self.probe.info.get('expert_action')
+        return super().act(observation, feedback) if expert_action is None else expert_action
+
+
+class StubLLM:
+    """ A stand-in for `llfbench.agents.llm.GPT` (with the interface of
+        `llfbench.agents.llm.LLM`), answering in the format asked by
+        BasicAIAgent with the action of `agent`. With `chat=True`, every
+        prompt is sent with `chat`, which keeps the history as GPT does. """
+
+    def __init__(self, agent, chat=False, system_prompt=''):
+        self.agent = agent
+        self.system_prompt = system_prompt
+        if chat:
+            self.generate = self.chat
+        self.reset()
+
+    def reset(self):
+        self.messages = [{"role": "system", "content": self.system_prompt}]
+
+    def _respond(self, prompt):
+        action = self.agent.act(None, None)
+        if isinstance(action, np.ndarray):
+            action = np.array2string(action, separator=', ', max_line_width=sys.maxsize)
+        return f'Thought: I follow the expert.\nResponse: {action}', {}
+
+    def chat(self, prompt, **kwargs):
+        self.messages.append({"role": "user", "content": prompt})
+        response, info = self._respond(prompt)
+        self.messages.append({"role": "assistant", "content": response})
+        return response, info
+
+    def generate(self, prompt, **kwargs):
+        return self._respond(prompt)
+
+
+def llm_agent(probe, chat=False):
+    return BasicAIAgent(StubLLM(ExpertAgent(probe), chat=chat))
+
+
+AGENTS = dict(random=RandomAgent, expert=ExpertAgent, llm=llm_agent, chat=lambda probe: llm_agent(probe, chat=True))
+TEXT_AGENTS = ('llm', 'chat')  # whose actions are text
+
+
+def run_long(probe, agent, args):
+    observation, _ = probe.reset(seed=0)
+    agent.reset(observation['instruction'])
+    episode = 0
+    while probe.num_steps < args.steps:
+        observation, _, terminated, truncated, _ = probe.step(agent.act(observation['observation'], observation['feedback']))
+        if terminated or truncated:
+            episode += 1
+            observation, _ = probe.reset(seed=episode)
+            agent.reset(observation['instruction'])
+
+
+def run_episodes(probe, agent, args):
+    data = []
+    for episode in range(args.episodes):
+        probe.reset(seed=episode)  # rollout resets without a seed, continuing this stream
+        _, episode_data = rollout(agent, probe, horizon=args.horizon, log_data=args.log_data)
+        if args.log_data:
+            data.append(episode_data)
+        probe.sample()
+    return data
+
+
+SCENARIOS = dict(long=run_long, episodes=run_episodes)
+
+
+# The sample_every of the probe (None: sampled by the scenario) and the max
+# number of samples of each scenario, including the first and the last.
+SAMPLING = dict(long=lambda args: (args.sample_every, args.steps // args.sample_every + 2),
+                episodes=lambda args: (None, args.episodes + 2))
+
+
+def slope(samples, warmup, min_samples):
+    """ The least-squares slope (bytes per step) of the RSS and the traced
+        memory, or the reason to skip the run if there are too few samples. """
+    samples = np.array(samples[int(len(samples) * warmup):], dtype=np.float64)
+    if len(samples) < max(2, min_samples):
+        return dict(skipped=f'{len(samples)} samples after the warmup, fewer than {min_samples}; '
+                            f'lower --sample_every or run more steps')
+    return dict(rss_slope=float(np.polyfit(samples[:, 0], samples[:, 1], 1)[0]),
+                traced_slope=float(np.polyfit(samples[:, 0], samples[:, 2], 1)[0]))
+
+
+def run_worker(env_name, agent_name, scenario, args):
+    """ Run one (env, agent, scenario) in this process. """
+    env = llfbench.make(env_name, instruction_type=args.instruction_type, feedback_type=args.feedback_type)
+    if agent_name in TEXT_AGENTS:
+        env = TextWrapper(env)
+    probe = MemoryProbe(env, *SAMPLING[scenario](args))
+    agent = AGENTS[agent_name](probe)
+    tracemalloc.start()
+    probe.sample()
+    SCENARIOS[scenario](probe, agent, args)
+    probe.sample()
+    tracemalloc.stop()
+    probe.close()
+    samples = probe.samples
+    return dict(steps=probe.num_steps,
+                rss_growth=int(samples[-1][1] - samples[0][1]),
+                traced_growth=int(samples[-1][2] - samples[0][2]),
+                **slope(samples, args.warmup, args.min_samples))
+
+
+def run_in_subprocess(env_name, agent_name, scenario, argv):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', env_name, agent_name, scenario] + argv
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        return dict(error=process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'failed')
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def env_names(prefixes):
+    return [spec.id for spec in llfbench.ENV_SPECS.values()
+            if spec.available and any(spec.id.startswith(p) for p in prefixes)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prefixes', nargs='+', default=['llf-'])
+    parser.add_argument('--agents', nargs='+', choices=tuple(AGENTS), default=['random', 'expert', 'llm'])
+    parser.add_argument('--scenarios', nargs='+', choices=tuple(SCENARIOS), default=['long', 'episodes'])
+    parser.add_argument('--instruction_type', default='b')
+    parser.add_argument('--feedback_type', default='a')
+    parser.add_argument('--steps', type=int, default=2000, help='the steps of the long scenario')
+    parser.add_argument('--episodes', type=int, default=100, help='the episodes of the episodes scenario')
+    parser.add_argument('--horizon', type=int, default=20, help='the horizon of the episodes scenario')
+    parser.add_argument('--log_data', action='store_true', help='keep the data of every episode, as evaluate_agent does')
+    parser.add_argument('--sample_every', type=int, default=100)
+    parser.add_argument('--warmup', type=float, default=0.2, help='the fraction of the samples ignored in the slopes')
+    parser.add_argument('--min_samples', type=int, default=5, help='the min number of samples in the slopes')
+    parser.add_argument('--max_slope', type=float, default=64.0, help='the max growth (bytes per step) of the traced memory')
+    parser.add_argument('--max_rss_slope', type=float, default=1024.0, help='the max growth (bytes per step) of the RSS')
+    parser.add_argument('--worker', nargs=3, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        warnings.filterwarnings('ignore')
+        print(json.dumps(run_worker(*args.worker, args)))
+        sys.exit(0)
+
+    # The arguments passed on to the workers.
+    argv = [f'--{k}={v}' for k, v in vars(args).items()
+            if k in ('instruction_type', 'feedback_type', 'steps', 'episodes', 'horizon', 'sample_every', 'warmup',
+                     'min_samples')]
+    argv += ['--log_data'] if args.log_data else []
+
+    failures, errors, skips = [], [], []
+    print(f"{'env':<44}{'agent':>8}{'scenario':>10}{'steps':>8}{'traced B/step':>15}{'RSS B/step':>12}{'RSS growth (MB)':>17}")
+    for env_name in env_names(args.prefixes):
+        for agent_name in args.agents:
+            for scenario in args.scenarios:
+                result = run_in_subprocess(env_name, agent_name, scenario, argv)
+                if 'error' in result:
+                    print(f"{env_name:<44}{agent_name:>8}{scenario:>10}{'error':>8}   ({result['error']})")
+                    errors.append(f"{env_name} [{agent_name}, {scenario}]: {result['error']}")
+                    continue
+                if 'skipped' in result:
+                    print(f"{env_name:<44}{agent_name:>8}{scenario:>10}{result['steps']:>8}   (skipped: {result['skipped']})")
+                    skips.append(f"{env_name} [{agent_name}, {scenario}]: {result['skipped']}")
+                    continue
+                print(f"{env_name:<44}{agent_name:>8}{scenario:>10}{result['steps']:>8}{result['traced_slope']:>15.1f}"
+                      f"{result['rss_slope']:>12.1f}{result['rss_growth'] / 2**20:>17.1f}")
+                if result['traced_slope'] > args.max_slope:
+                    failures.append(f"{env_name} [{agent_name}, {scenario}]: traced memory grows {result['traced_slope']:.1f} B/step > {args.max_slope:.1f}")
+                if result['rss_slope'] > args.max_rss_slope:
+                    failures.append(f"{env_name} [{agent_name}, {scenario}]: RSS grows {result['rss_slope']:.1f} B/step > {args.max_rss_slope:.1f}")
+
+    for failure in failures:
+        print(f'GROWTH {failure}')
+    for error in errors:
+        print(f'ERROR {error}')
+    for skip in skips:
+        print(f'SKIP {skip}')
+    print(f'{len(failures)} runs grew faster than allowed, {len(errors)} runs failed, {len(skips)} runs were skipped.')
+    sys.exit(1 if failures or errors else 0)
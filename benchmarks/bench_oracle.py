@@ -0,0 +1,74 @@
+import copy
+import time
+import argparse
+import functools
+import numpy as np
+import llfbench
+from llfbench.envs.oracle import OracleEngine, get_llf_wrapper
+
+"""
+
+Benchmark of evaluating a set of counterfactual actions from the current state
+of an env, as done by `FullInformationWrapper`.
+
+It compares stepping a deep copy of the env per action (the previous
+implementation) with the OracleEngine restoring a snapshot in this process,
+and with the OracleEngine fanning the actions out to worker processes.
+
+Usage:
+    python benchmarks/bench_oracle.py [--num_actions 16] [--num_workers 4] [--repeats 5]
+
+"""
+
+ENVS = ('llf-gridworld-v0', 'llf-highway-parking-v0')
+
+
+def sample_actions(env, num_actions):
+    if hasattr(env.action_space, 'n'):
+        return [i % env.action_space.n for i in range(num_actions)]
+    env.action_space.seed(0)
+    return [env.action_space.sample() for _ in range(num_actions)]
+
+
+def deepcopy_oracle(env, actions):
+    results = []
+    for action in actions:
+        results.append(copy.deepcopy(env).step(action))
+    return results
+
+
+def timeit(fn, repeats):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e3
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_actions', type=int, default=16)
+    parser.add_argument('--num_workers', type=int, default=4)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'env':<26}{'step (ms)':>11}{'deepcopy (ms)':>15}{'snapshot (ms)':>15}{f'{args.num_workers} workers (ms)':>18}")
+    for env_name in ENVS:
+        env_fn = functools.partial(llfbench.make, env_name)
+        env = get_llf_wrapper(env_fn())
+        env.reset(seed=0)
+        actions = sample_actions(env, args.num_actions)
+        state = env.get_state()
+
+        def step():
+            env.set_state(state)
+            env.step(actions[0])
+
+        serial, pool = OracleEngine(), OracleEngine(env_fn, num_workers=args.num_workers)
+        step_time = timeit(step, args.repeats * args.num_actions)
+        env.set_state(state)
+        legacy = timeit(lambda: deepcopy_oracle(env, actions), args.repeats)
+        snapshot = timeit(lambda: serial.evaluate(env, actions), args.repeats)
+        workers = timeit(lambda: pool.evaluate(env, actions), args.repeats)
+        pool.close()
+        print(f'{env_name:<26}{step_time:>11.2f}{legacy:>15.2f}{snapshot:>15.2f}{workers:>18.2f}')
@@ -0,0 +1,138 @@
+import time
+import argparse
+import numpy as np
+import parse
+import llfbench
+from llfbench.envs.llf_env import LLFWrapper
+from llfbench.envs.templates import compile_template
+
+"""
+
+Benchmark of the per-step cost of reformatting (paraphrasing) feedback.
+
+The reformat calls made by real env steps are recorded and then replayed with
+
+    legacy:   `parse.search` on every call (the previous implementation),
+    compiled: templates compiled once, one regex search per template,
+    current:  compiled templates, and a single regex pass for the template sets
+              used by the wrappers (e.g. positive/negative reward feedback).
+
+The replays use the same random seed, and their results are checked to be the
+same.
+
+Usage:
+    python benchmarks/bench_reformat.py [--steps 20] [--repeats 200]
+
+"""
+
+ACTIONS = {
+    'llf-optimization-Rosenbrock-v0': ['x = [1.0, 2.0]', 'x = [0.5, -1.0]', 'x = [1.0, 1.0]'],
+    'llf-reco-movie-v0': ['[{"title": "John Wick"}]', '[{"title": "Toy Story"}, {"title": "Up"}]'],
+    'llf-poem-Haiku-v0': ['An old silent pond\nA frog jumps into the pond\nSplash! Silence again',
+                          'This is a poem\nthat is not a haiku'],
+}
+
+METHODS = ('legacy', 'compiled', 'current')
+
+
+def legacy_reformat(env, original, prompts, template=None):
+    if original is None:
+        return original
+    template = template or prompts[0]
+    parsed = parse.search(template, original)
+    if parsed is None:
+        return original
+    old = template.format(**parsed.named)
+    new = env.format(prompts, **parsed.named)
+    return original.replace(old, new)
+
+
+def compiled_reformat(env, original, prompts, template=None):
+    if original is None:
+        return original
+    return compile_template(template or prompts[0]).reformat(original, prompts, env.format)
+
+
+def record(env_name, steps, seed=0):
+    """ Step the env and record the reformat calls of each step. """
+    env = llfbench.make(env_name, feedback_type='a')
+    llf_env = env
+    while not isinstance(llf_env, LLFWrapper):
+        llf_env = llf_env.env
+    calls = [[]]
+    reformat, reformat_all = llf_env.reformat, llf_env.reformat_all
+
+    def recorded_reformat(original, prompts, template=None):
+        result = reformat(original, prompts, template=template)
+        calls[-1].append(('one', (original, prompts, template), result))
+        return result
+
+    def recorded_reformat_all(original, templates):
+        result = reformat_all(original, templates)
+        calls[-1].append(('set', (original, templates), result))
+        return result
+
+    llf_env.reformat, llf_env.reformat_all = recorded_reformat, recorded_reformat_all
+    env.reset(seed=seed)
+    calls.clear()  # only the steps are benchmarked
+    actions = ACTIONS[env_name]
+    for i in range(steps):
+        calls.append([])
+        env.step(actions[i % len(actions)])
+    env.close()
+    return llf_env, calls
+
+
+def replay(env, calls, method):
+    """ Replay the recorded calls. Return the results of every call. """
+    results = []
+    for step_calls in calls:
+        for kind, args, _ in step_calls:
+            if kind == 'one':
+                original, prompts, template = args
+                if method == 'legacy':
+                    result = legacy_reformat(env, original, prompts, template)
+                else:
+                    result = compiled_reformat(env, original, prompts, template)
+            else:
+                original, templates = args
+                if method == 'current':
+                    result = templates.reformat(original, env.format)
+                else:
+                    reformat = legacy_reformat if method == 'legacy' else compiled_reformat
+                    result = original
+                    for template, prompts in zip(templates.templates, templates.prompts):
+                        result = reformat(env, result, prompts, template.template)
+            results.append(result)
+    return results
+
+
+def bench(env_name, steps, repeats, seed=0):
+    env, calls = record(env_name, steps, seed=seed)
+    results = {}
+    for method in METHODS:
+        env._rng = np.random.default_rng(seed)  # the same paraphrases are drawn by every method
+        results[method] = replay(env, calls, method)
+    assert all(results[m] == results['legacy'] for m in METHODS), f'{env_name}: the reformatted texts differ.'
+
+    report = {}
+    for method in METHODS:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            replay(env, calls, method)
+        report[method] = (time.perf_counter() - start) / (repeats * steps)
+    return report, sum(len(c) for c in calls) / steps
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--envs', nargs='+', default=list(ACTIONS.keys()))
+    args = parser.parse_args()
+
+    print(f"{'env':<35}{'calls/step':>12}{'legacy (us)':>14}{'compiled (us)':>16}{'current (us)':>15}{'speedup':>10}")
+    for env_name in args.envs:
+        report, calls_per_step = bench(env_name, args.steps, args.repeats)
+        legacy, compiled, current = (report[m] * 1e6 for m in METHODS)
+        print(f'{env_name:<35}{calls_per_step:>12.1f}{legacy:>14.1f}{compiled:>16.1f}{current:>15.1f}{legacy / current:>9.1f}x')
@@ -0,0 +1,70 @@
+import sys
+import json
+import argparse
+import subprocess
+
+"""
+
+Benchmark of the startup time of a worker that runs one env family.
+
+For each family, a fresh Python process imports llfbench and makes one of its
+envs. It reports the time of `import llfbench`, of the first `llfbench.make`
+(which imports the family), and the number of modules loaded. Families whose
+dependencies are not installed are reported as unavailable.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeats 3]
+
+"""
+
+FAMILIES = {
+    'gridworld': 'llf-gridworld-v0',
+    'bandits': 'llf-bandits-BanditTenArmedGaussian-v0',
+    'optimization': 'llf-optimization-Rosenbrock-v0',
+    'reco': 'llf-reco-movie-v0',
+    'poem': 'llf-poem-Haiku-v0',
+    'highway': 'llf-highway-parking-v0',
+    'alfworld': 'llf-alfworld-v0',
+    'metaworld': 'llf-metaworld-reach-v2',
+}
+
+WORKER = """
+import sys, time, json, warnings
+warnings.filterwarnings('ignore')
+start = time.perf_counter()
+import llfbench
+imported = time.perf_counter()
+modules = len(sys.modules)
+result = dict(import_time=imported - start, modules_after_import=modules)
+try:
+    llfbench.make({env_name!r})
+    result['make_time'] = time.perf_counter() - imported
+    result['modules_after_make'] = len(sys.modules)
+except Exception as e:
+    result['error'] = f'{{type(e).__name__}}: {{e}}'
+print(json.dumps(result))
+"""
+
+
+def run(env_name):
+    output = subprocess.run([sys.executable, '-c', WORKER.format(env_name=env_name)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--families', nargs='+', default=list(FAMILIES.keys()))
+    args = parser.parse_args()
+
+    print(f"{'family':<15}{'import (s)':>12}{'first make (s)':>16}{'modules':>18}")
+    for family in args.families:
+        results = [run(FAMILIES[family]) for _ in range(args.repeats)]
+        import_time = min(r['import_time'] for r in results)
+        if 'error' in results[0]:
+            print(f"{family:<15}{import_time:>12.3f}{'unavailable':>16}   ({results[0]['error']})")
+            continue
+        make_time = min(r['make_time'] for r in results)
+        modules = f"{results[0]['modules_after_import']} -> {results[0]['modules_after_make']}"
+        print(f'{family:<15}{import_time:>12.3f}{make_time:>16.3f}{modules:>18}')
@@ -0,0 +1,70 @@
+import time
+import argparse
+import warnings
+import gymnasium as gym
+import llfbench
+from llfbench.envs.oracle import get_llf_wrapper
+from llfbench.envs.llf_env import fused_step
+from llfbench.profile import text_action
+
+"""
+
+Benchmark of the overhead of the wrappers around an LLF env.
+
+For each env, it measures:
+
+    chain: stepping the env wrapped by the LLFWrapper (e.g. TerminalFreeWrapper
+        -> EnvCompatibility -> the legacy env) through the `step` of each
+        wrapper, and through the step fused by `fused_step`.
+    make: a full step of the env made by `llfbench.make`, and by
+        `llfbench.make(production=True)`, which skips the OrderEnforcing,
+        PassiveEnvChecker and AsyncWrapper wrappers.
+
+The variants are run in turn from the same reset, `--repeats` times, and the
+fastest time of each is reported.
+
+Usage:
+    python benchmarks/bench_wrappers.py [--steps 2000] [--repeats 5]
+
+"""
+
+ENVS = ('llf-gridworld-v0', 'llf-poem-Haiku-v0', 'llf-reco-movie-v0', 'llf-bandits-BanditTenArmedGaussian-v0')
+
+
+def make_actions(env, env_name, steps):
+    if isinstance(env.action_space, gym.spaces.Text):
+        return [text_action(env_name)] * steps
+    env.action_space.seed(0)
+    return [env.action_space.sample() for _ in range(steps)]
+
+
+def timeit(step, actions):
+    start = time.perf_counter()
+    for action in actions:
+        step(action)
+    return (time.perf_counter() - start) / len(actions) * 1e6  # us
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+
+    print(f"{'env':<40}{'chain (us)':>12}{'fused (us)':>12}{'make (us)':>12}{'production (us)':>17}")
+    for env_name in ENVS:
+        if not llfbench.get_spec(env_name).available:
+            print(f'{env_name:<40}{"not installed":>12}')
+            continue
+        env, production_env = llfbench.make(env_name), llfbench.make(env_name, production=True)
+        actions = make_actions(env, env_name, args.steps)
+        inner = get_llf_wrapper(env).env
+        steps = (inner.step, fused_step(inner), env.step, production_env.step)
+        times = [float('inf')] * len(steps)
+        for _ in range(args.repeats):
+            for i, step in enumerate(steps):
+                env.reset(seed=0)
+                production_env.reset(seed=0)
+                times[i] = min(times[i], timeit(step, actions))
+        print(f'{env_name:<40}' + ''.join(f'{t:>{w}.1f}' for t, w in zip(times, (12, 12, 12, 17))))
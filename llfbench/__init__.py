@@ -1,11 +1,52 @@
 from llfbench import envs
+from llfbench.envs.specs import ENV_SPECS, get_spec
+from llfbench.envs.llf_env import AsyncWrapper
 import gymnasium as gym
+import dataclasses
+from functools import partial
 
-def make(env_name, *, instruction_type='b', feedback_type='a', visual=False):
-    env = gym.make(env_name, instruction_type=instruction_type, feedback_type=feedback_type, visual=visual)
-    return env
+def make(env_name, *, instruction_type='b', feedback_type='a', visual=False, production=False):
+    """ Make an LLF env. It is wrapped by an `AsyncWrapper`, whose `areset`
+        and `astep` are the coroutine versions of `reset` and `step`.
+
+        Args:
+            production: whether to skip the wrappers that gym.make adds to
+            check the use of the env (OrderEnforcing and PassiveEnvChecker),
+            and the AsyncWrapper, so that a step goes through fewer wrappers.
+            Use it once the code using the env is known to be correct. Wrap
+            the env with an AsyncWrapper to use `areset` and `astep`.
+    """
+    spec = env_name
+    if production:
+        spec = dataclasses.replace(gym.spec(env_name), order_enforce=False, disable_env_checker=True)
+    env = gym.make(spec, instruction_type=instruction_type, feedback_type=feedback_type, visual=visual)
+    return env if production else AsyncWrapper(env)
+
+def make_vec(env_name, num_envs, mode='sync', *, instruction_type='b', feedback_type='a', visual=False, autoreset=True,
+             production=False, **kwargs):
+    """ Make `num_envs` copies of an LLF env that are stepped together.
+
+        Args:
+            mode: 'sync' steps the copies one after another in this process;
+            'process' steps them in parallel, one subprocess per copy.
+
+            autoreset: whether to reset a copy as soon as its episode ends.
+
+            production: see `make`.
+
+            **kwargs: extra arguments of the vector env (e.g. `context` of the
+            'process' mode).
+    """
+    from llfbench.envs.vector_env import VECTOR_MODES
+    assert mode in VECTOR_MODES, f'mode must be one of {tuple(VECTOR_MODES.keys())}.'
+    env_fn = partial(make, env_name, instruction_type=instruction_type, feedback_type=feedback_type, visual=visual,
+                     production=production)
+    return VECTOR_MODES[mode]([env_fn] * num_envs, autoreset=autoreset, **kwargs)
 
 def supported_types(env_name):
     """ Return the supported INSTRUCTION_TYPES and FEEDBACK_TYPES for the given env_name. """
+    spec = get_spec(env_name)
+    if spec is not None:  # read from the registry without making the env
+        return spec.instruction_types, spec.feedback_types
     env = gym.make(env_name)
     return env.INSTRUCTION_TYPES, env.FEEDBACK_TYPES
@@ -0,0 +1,276 @@
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Union
+import openai
+from llfbench.agents.utils import print_color
+from llfbench.agents.llm_cache import get_default_cache
+from llfbench.agents.shared_limiter import get_default_limiter
+from llfbench.agents.failures import RETRYABLE, LLMCallError, classify, failure, get_default_breaker
+
+"""
+
+An asyncio client of the LLM backend that keeps the request rate within the
+quota of a deployment.
+
+`AsyncClient` sends the requests of any number of callers (coroutines and
+threads), with at most `max_in_flight` of them in flight at a time, and
+paces them with token buckets of requests per minute and tokens per minute.
+A request that fails with a retryable error (rate limit, timeout, connection
+or server error) is retried after an exponential backoff with full jitter,
+so that callers that were throttled together do not retry together. Failed
+requests raise the errors of `llfbench.agents.failures`, as in `call_model`.
+
+All the requests of a client run on its own event loop, in a background
+thread, so its limits hold across threads and across the event loops of its
+callers. `llm.AsyncGPT` is the `LLM` built on it.
+
+"""
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0, rng: random.Random = random) -> float:
+    """ The delay (s) before retrying after `attempt` failures: uniform in
+        [0, min(cap, base * 2 ** (attempt - 1))] (full jitter). """
+    return rng.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def retry_after(error: Exception) -> float:
+    """ The delay (s) asked by the Retry-After header of an error, or 0. """
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after', headers.get('Retry-After', 0)))
+    except (TypeError, ValueError):  # an HTTP date
+        return 0.0
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: Union[int, None]) -> int:
+    """ A rough count (about 4 characters per token) of the tokens of a
+        request, charged before it is sent and corrected by its usage. """
+    return sum(len(m.get('content') or '') for m in messages) // 4 + 4 * len(messages) + (max_tokens or 0)
+
+
+def usage_tokens(info: Union[Dict[str, Any], None]) -> Union[int, None]:
+    """ The tokens used by a request, from the info of its response, if known. """
+    try:
+        return int(info['response']['usage']['total_tokens'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """ A bucket of `per_minute` units per minute, holding at most `burst`
+        units. Acquiring more units than are left waits for them. """
+
+    def __init__(self, per_minute: float, burst: Union[float, None] = None, clock: Callable[[], float] = time.monotonic):
+        """
+            Args:
+                per_minute: The rate at which the bucket refills.
+
+                burst: The capacity of the bucket. By default, the units of
+                10 s, since quotas are also enforced over short windows.
+        """
+        assert per_minute > 0
+        self.rate = per_minute / 60.0  # per second
+        self.burst = max(1.0, per_minute / 6.0) if burst is None else burst
+        self.clock = clock
+        self.level = self.burst
+        self.last = clock()
+        self._lock = None  # created on the loop that uses it
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.burst, self.level + (now - self.last) * self.rate)
+        self.last = now
+
+    async def acquire(self, amount: float = 1.0):
+        """ Take `amount` units, waiting (in turn with the other callers) until
+            they are available. An amount larger than the burst waits for a
+            full bucket and leaves it in debt. """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._refill()
+            needed = min(amount, self.burst)
+            while self.level < needed:
+                await asyncio.sleep((needed - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+
+    def charge(self, amount: float):
+        """ Take (or give back, if negative) units without waiting, e.g. to
+            correct an estimate. """
+        self._refill()
+        self.level = min(self.burst, self.level - amount)
+
+
+class AsyncClient:
+    """ Sends the requests of its callers concurrently, within the limits. """
+
+    def __init__(self,
+                 request: Callable[..., Awaitable[Tuple[str, Dict[str, Any]]]],
+                 max_in_flight: int = 8,
+                 requests_per_minute: Union[float, None] = None,
+                 tokens_per_minute: Union[float, None] = None,
+                 max_attempts: int = 10,
+                 backoff_base: float = 1.0,
+                 backoff_cap: float = 60.0,
+                 seed: Union[int, None] = None,
+                 limiter=None,
+                 breaker=None):
+        """
+            Args:
+                request: A coroutine function sending one request, called as
+                request(messages, model, temperature, timeout,
+                max_tokens=max_tokens, logprobs=logprobs), which returns
+                (response, info), e.g. `llm._acall_model`.
+
+                max_in_flight: The maximum number of requests in flight.
+
+                requests_per_minute, tokens_per_minute: The quota of the
+                deployment. None means no limit.
+
+                max_attempts: The default number of attempts of a request.
+
+                backoff_base, backoff_cap: The first and the maximum backoff
+                (s) before retrying.
+
+                seed: The seed of the jitter.
+
+                limiter: A SharedRateLimiter that the requests are also
+                acquired from, by default the one of `call_model`.
+
+                breaker: The CircuitBreaker pausing the requests while the
+                backend is down, by default the one of `call_model`.
+        """
+        assert max_in_flight > 0
+        self.request = request
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.seed = seed
+        self.limiter = limiter
+        self.breaker = breaker
+        self._start()
+
+    def _start(self):
+        self.requests = None if self.requests_per_minute is None else TokenBucket(self.requests_per_minute)
+        self.tokens = None if self.tokens_per_minute is None else TokenBucket(self.tokens_per_minute)
+        self.rng = random.Random(self.seed)
+        self.in_flight = 0
+        self.stats = dict(requests=0, retries=0, failures=0, tokens=0)
+        self._semaphore = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def __getstate__(self):
+        # The loop and its thread belong to this process; a copy starts its own.
+        return {k: v for k, v in vars(self).items()
+                if k in ('request', 'max_in_flight', 'requests_per_minute', 'tokens_per_minute',
+                         'max_attempts', 'backoff_base', 'backoff_cap', 'seed', 'limiter', 'breaker')}
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self._start()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """ The event loop running the requests, started on first use. """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='AsyncClient', daemon=True).start()
+        return self._loop
+
+    def run(self, coroutine: Awaitable) -> Any:
+        """ Run a coroutine on the loop of the client and wait for its result
+            (from a thread that is not running the loop). """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def call(self, messages, model, temperature, timeout, max_tokens=None, logprobs=None,
+                   max_attempts=None, cache=None, **kwargs):
+        """ Like `llm.call_model`, but awaitable: returns (response, info), and
+            raises an LLMCallError if the request failed. """
+        future = asyncio.run_coroutine_threadsafe(
+            self._call(messages, model, temperature, timeout, max_tokens, logprobs, max_attempts, cache), self.loop)
+        return await asyncio.wrap_future(future)
+
+    async def _call(self, messages, model, temperature, timeout, max_tokens, logprobs, max_attempts, cache):
+        cache = get_default_cache() if cache is None else cache
+        limiter = get_default_limiter() if self.limiter is None else self.limiter
+        breaker = get_default_breaker() if self.breaker is None else self.breaker
+        loop = asyncio.get_running_loop()
+        key = None
+        if cache is not None and cache.accepts(temperature):
+            key = cache.key(model, messages, temperature, max_tokens)
+            # SQLite, which may wait for a lock; blocking, so in a thread, as are the puts
+            cached = await loop.run_in_executor(None, cache.get, key)
+            if cached is not None:
+                return cached
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        max_attempts = self.max_attempts if max_attempts is None else max_attempts
+        estimate = estimate_tokens(messages, max_tokens)
+        error = None
+        attempt = 0
+        while attempt < max_attempts:
+            attempt += 1
+            delay = breaker.delay()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = breaker.delay()
+            try:
+                if self.requests is not None:
+                    await self.requests.acquire()
+                if self.tokens is not None:
+                    await self.tokens.acquire(estimate)
+                if limiter is not None:  # shared with the other processes; blocking, so in a thread
+                    await loop.run_in_executor(None, limiter.acquire, estimate)
+                async with self._semaphore:
+                    self.in_flight += 1
+                    self.stats['requests'] += 1
+                    try:
+                        response, info = await self.request(messages, model, temperature, timeout,
+                                                            max_tokens=max_tokens, logprobs=logprobs)
+                    finally:
+                        self.in_flight -= 1
+            except Exception as e:
+                error = e
+                pause = breaker.failure(e)
+                if classify(e) != RETRYABLE:
+                    self.stats['failures'] += 1
+                    print_color(f"The request cannot succeed: {type(e).__name__}: {e}", "red")
+                    raise failure(e, attempt) from e
+                self.stats['retries'] += 1
+                if pause > 0 and limiter is not None:
+                    await loop.run_in_executor(None, limiter.pause, pause)
+                delay = max(retry_after(e), backoff_delay(attempt, self.backoff_base, self.backoff_cap, self.rng))
+                print(f"{type(e).__name__}: {e}. Retrying in {delay:.1f} seconds...")
+                if limiter is not None and isinstance(e, openai.error.RateLimitError):
+                    await loop.run_in_executor(None, limiter.pause, retry_after(e))
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:  # e.g. cancelled
+                breaker.release()
+                raise
+            breaker.success()
+            used = usage_tokens(info)
+            if used is not None:
+                self.stats['tokens'] += used
+                if self.tokens is not None:
+                    self.tokens.charge(used - estimate)
+                if limiter is not None:
+                    await loop.run_in_executor(None, limiter.charge, used - estimate)
+            if key is not None:
+                await loop.run_in_executor(None, cache.put, key, response, info)
+            return response, info
+
+        self.stats['failures'] += 1
+        if error is None:
+            raise LLMCallError('No attempt was made', attempts=0)
+        print_color("Failed to call the model after {} attempts.".format(attempt), "red")
+        raise failure(error, attempt)
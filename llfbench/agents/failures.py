@@ -0,0 +1,207 @@
+import time
+import asyncio
+import threading
+from typing import Any, Dict, Union
+import openai
+
+"""
+
+The failures of the calls to the LLM backend, and what they stop.
+
+An error of a call is one of:
+
+    RETRYABLE: the same request may succeed later (rate limit, timeout,
+        connection or server error, or an unknown error). It is retried.
+    REQUEST: the request cannot succeed (e.g. it is invalid or too long for the
+        context). `call_model` raises an `LLMCallError`, and `rollout` marks the
+        episode failed and goes on with the next one. So does a request that
+        still fails after all its attempts.
+    PROCESS: no request can succeed (e.g. the credentials are wrong).
+        `call_model` raises an `LLMFatalError`, which `rollout` does not catch.
+
+Errors that mean the backend is down (connection, timeout and server errors)
+are also counted by a `CircuitBreaker`, shared by all the callers of a process.
+After `threshold` of them in a row it opens, pausing all the callers for a
+cooldown, after which a single request probes the backend: its success, or
+any answer of the backend (e.g. a rate limit), closes the breaker, and a
+backend error of the probe opens it again for twice as long. The errors of
+the requests that were already in flight when it opened are counted, but do
+not extend the pause.
+
+"""
+
+RETRYABLE, REQUEST, PROCESS = 'retryable', 'request', 'process'
+
+# Errors after which no request can succeed.
+PROCESS_ERRORS = (openai.error.AuthenticationError, openai.error.PermissionError,
+                  openai.error.SignatureVerificationError)
+# Errors after which retrying the same request cannot succeed.
+REQUEST_ERRORS = (openai.error.InvalidRequestError,)
+# Errors that mean that the backend is down or overloaded.
+BACKEND_ERRORS = (openai.error.APIConnectionError, openai.error.ServiceUnavailableError, openai.error.Timeout,
+                  openai.error.TryAgain, openai.error.APIError, TimeoutError, ConnectionError)
+
+
+def classify(error: Exception) -> str:
+    """ Whether an error of a call is RETRYABLE, fatal for the REQUEST, or
+        fatal for the PROCESS. """
+    if isinstance(error, PROCESS_ERRORS):
+        return PROCESS
+    if isinstance(error, REQUEST_ERRORS):
+        return REQUEST
+    status = getattr(error, 'http_status', None)
+    if isinstance(error, openai.error.APIError) and status is not None and 400 <= status < 500 and status not in (408, 409, 429):
+        return REQUEST  # a client error reported as a generic API error
+    return RETRYABLE
+
+
+class LLMCallError(RuntimeError):
+    """ A call to the LLM that failed, with what it stops (REQUEST or PROCESS). """
+
+    def __init__(self, message: str, kind: str = REQUEST, error: Union[Exception, None] = None, attempts: int = 0):
+        super().__init__(message)
+        self.kind = kind
+        self.error = error
+        self.attempts = attempts
+
+    def asdict(self) -> Dict[str, Any]:
+        """ The failure, as recorded in the data of a rollout. """
+        return dict(kind=self.kind, message=str(self),
+                    error=None if self.error is None else f'{type(self.error).__name__}: {self.error}',
+                    attempts=self.attempts)
+
+    def __reduce__(self):  # e.g. raised in a worker
+        return type(self), (str(self), self.kind, None if self.error is None else RuntimeError(repr(self.error)), self.attempts)
+
+
+class LLMFatalError(LLMCallError):
+    """ A failure after which no call can succeed in this process. """
+
+    def __init__(self, message: str, kind: str = PROCESS, error: Union[Exception, None] = None, attempts: int = 0):
+        super().__init__(message, kind, error, attempts)
+
+
+def failure(error: Exception, attempts: int) -> LLMCallError:
+    """ The LLMCallError (or LLMFatalError) raised for the error of a call. """
+    kind = classify(error)
+    message = f'{type(error).__name__}: {error}'
+    if kind == PROCESS:
+        return LLMFatalError(message, PROCESS, error, attempts)
+    if kind == RETRYABLE:
+        message = f'Failed to call the model after {attempts} attempts. Last error: {message}'
+    return LLMCallError(message, REQUEST, error, attempts)
+
+
+def _caller():
+    """ The task (in an event loop) or the thread making a request. """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:  # no running event loop
+        task = None
+    return threading.get_ident() if task is None else task
+
+
+class CircuitBreaker:
+    """ Pauses all the callers of a process while the backend is down. """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 10.0, max_cooldown: float = 300.0):
+        """
+            Args:
+                threshold: The number of backend errors in a row that open it.
+
+                cooldown: The first pause (s) when it opens, doubled each time
+                the probe fails, up to max_cooldown.
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._start()
+
+    def _start(self):
+        self.failures = 0
+        self.open_until = None  # None when closed
+        self.next_cooldown = self.cooldown
+        self.probe = None  # the caller probing the backend, if half open
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return dict(threshold=self.threshold, cooldown=self.cooldown, max_cooldown=self.max_cooldown)
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self._start()
+
+    @property
+    def closed(self) -> bool:
+        return self.open_until is None
+
+    @property
+    def probing(self) -> bool:
+        return self.probe is not None
+
+    def delay(self) -> float:
+        """ How long (s) a caller should wait before trying again; 0 means
+            that it may send its request now (as the probe, if half open). """
+        with self._lock:
+            if self.open_until is None:
+                return 0.0
+            now = time.time()
+            if now < self.open_until:
+                return self.open_until - now
+            caller = _caller()
+            if self.probe is not None and self.probe != caller:  # wait for the result of the probe
+                return min(1.0, self.cooldown)
+            self.probe = caller
+            return 0.0
+
+    def wait(self):
+        """ Wait until a request may be sent. """
+        delay = self.delay()
+        while delay > 0:
+            time.sleep(delay)
+            delay = self.delay()
+
+    def success(self):
+        with self._lock:
+            self.failures, self.open_until, self.probe = 0, None, None
+            self.next_cooldown = self.cooldown
+
+    def release(self):
+        """ Give up the probe, e.g. when its request was cancelled, so that
+            another caller probes the backend. """
+        with self._lock:
+            if self.probe == _caller():
+                self.probe = None
+
+    def failure(self, error: Exception) -> float:
+        """ Count an error; returns the pause (s) if it opened the breaker, or 0.
+            Any other error (e.g. a rate limit) means that the backend is up,
+            and closes it. """
+        if not isinstance(error, BACKEND_ERRORS):
+            self.success()
+            return 0.0
+        with self._lock:
+            self.failures += 1
+            if self.open_until is None:
+                if self.failures < self.threshold:
+                    return 0.0
+            elif self.probe is None or self.probe != _caller():
+                return 0.0  # a request sent before it opened
+            pause = self.next_cooldown
+            self.open_until, self.probe = time.time() + pause, None
+            self.next_cooldown = min(2 * self.next_cooldown, self.max_cooldown)
+        print(f"The backend seems down ({self.failures} errors in a row). Pausing all calls for {pause:.0f} seconds...")
+        return pause
+
+
+_DEFAULT_BREAKER = CircuitBreaker()
+
+
+def set_default_breaker(breaker: CircuitBreaker):
+    """ Set the breaker used by `call_model` and `AsyncClient` when none is given. """
+    global _DEFAULT_BREAKER
+    _DEFAULT_BREAKER = breaker
+
+
+def get_default_breaker() -> CircuitBreaker:
+    return _DEFAULT_BREAKER
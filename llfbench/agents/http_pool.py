@@ -0,0 +1,166 @@
+import os
+import threading
+import contextlib
+import weakref
+import asyncio
+from urllib.parse import urlsplit
+from typing import Dict, Union
+import requests
+from requests.adapters import HTTPAdapter
+import openai
+from openai.api_requestor import MAX_CONNECTION_RETRIES
+
+"""
+
+Pooled keep-alive HTTP connections for the calls to the OpenAI/Azure backend.
+
+By default, the openai client opens a `requests` session per thread, and
+replaces it every 3 minutes, and `acreate` opens a new aiohttp session, and
+so a new connection (and TLS handshake), for every request. An `HTTPPool`
+keeps a few connections per endpoint open and shares them between all the
+threads, and between all the requests of an event loop, so that the requests
+of many concurrent episodes go over at most `pool_size` connections per
+endpoint, waiting for a free one rather than opening more.
+
+The transports of the openai client (requests and aiohttp) speak HTTP/1.1,
+so the connections are reused, one request at a time, rather than
+multiplexed with HTTP/2.
+
+Install a pool with `set_default_pool(HTTPPool(pool_size))`, or by setting the
+environment variable LLFBENCH_HTTP_POOL to the pool size. `call_model` then
+uses it through `openai.requestssession`, and `AsyncGPT` through `aiosession`.
+
+"""
+
+
+class _SharedSession(requests.Session):
+    """ A session shared by all the threads; the openai client closes the
+        session of a thread every 3 minutes, which must not drop the pool. """
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        super().close()
+
+
+class HTTPPool:
+    """ Keep-alive connections to each endpoint, shared by all the callers. """
+
+    def __init__(self,
+                 pool_size: int = 8,
+                 pool_sizes: Union[Dict[str, int], None] = None,
+                 keepalive_timeout: float = 60.0):
+        """
+            Args:
+                pool_size: The maximum number of connections to an endpoint.
+
+                pool_sizes: The pool size of specific endpoints, by URL prefix
+                (e.g. {'https://my-deployment.openai.azure.com': 32}).
+
+                keepalive_timeout: How long (s) an idle connection is kept
+                open by the async sessions.
+        """
+        assert pool_size > 0
+        self.pool_size = pool_size
+        self.pool_sizes = dict(pool_sizes or {})
+        self.keepalive_timeout = keepalive_timeout
+        self._start()
+
+    def _start(self):
+        self._session = None
+        self._lock = threading.Lock()
+        self._aiohttp_sessions = weakref.WeakKeyDictionary()  # loop -> {endpoint: session}
+
+    def __getstate__(self):
+        # Connections belong to this process; a copy (e.g. in a worker) opens its own.
+        return dict(pool_size=self.pool_size, pool_sizes=self.pool_sizes, keepalive_timeout=self.keepalive_timeout)
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self._start()
+
+    def size(self, url: str) -> int:
+        """ The pool size of the endpoint of a URL. """
+        for prefix, size in sorted(self.pool_sizes.items(), key=lambda item: -len(item[0])):
+            if url.startswith(prefix):
+                return size
+        return self.pool_size
+
+    def session(self) -> requests.Session:
+        """ The requests session shared by all the threads. """
+        with self._lock:
+            if self._session is None:
+                session = _SharedSession()
+                for prefix in ('http://', 'https://'):
+                    session.mount(prefix, self._adapter(self.pool_size))
+                for prefix, size in self.pool_sizes.items():
+                    session.mount(prefix, self._adapter(size))
+                self._session = session
+        return self._session
+
+    @staticmethod
+    def _adapter(size):
+        # pool_block: wait for a free connection rather than opening (and dropping) another
+        return HTTPAdapter(pool_connections=4, pool_maxsize=size, pool_block=True, max_retries=MAX_CONNECTION_RETRIES)
+
+    def aiohttp_session(self, url: str):
+        """ The aiohttp session to the endpoint of a URL, for the running event loop. """
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        parts = urlsplit(url)
+        endpoint = f'{parts.scheme}://{parts.netloc}'
+        sessions = self._aiohttp_sessions.setdefault(loop, {})
+        session = sessions.get(endpoint)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.size(url), keepalive_timeout=self.keepalive_timeout)
+            session = sessions[endpoint] = aiohttp.ClientSession(connector=connector)
+        return session
+
+    def close(self):
+        """ Close the connections of the requests session. The async sessions
+            are closed with `aclose`, on their event loop. """
+        with self._lock:
+            if self._session is not None:
+                self._session.close_pool()
+                self._session = None
+
+    async def aclose(self):
+        """ Close the async sessions of the running event loop. """
+        for session in self._aiohttp_sessions.pop(asyncio.get_running_loop(), {}).values():
+            await session.close()
+
+
+_DEFAULT_POOL = None
+
+
+def set_default_pool(pool: Union[HTTPPool, None]):
+    """ Send the requests of the openai client through a pool. None restores
+        the connections of the openai client. """
+    global _DEFAULT_POOL
+    _DEFAULT_POOL = pool
+    openai.requestssession = None if pool is None else pool.session
+
+
+def get_default_pool() -> Union[HTTPPool, None]:
+    return _DEFAULT_POOL
+
+
+@contextlib.contextmanager
+def aiosession(pool: Union[HTTPPool, None] = None):
+    """ Within a coroutine, send the async requests of the openai client
+        through the session of a pool (by default, the default pool) to
+        `openai.api_base`. """
+    pool = get_default_pool() if pool is None else pool
+    if pool is None:
+        yield
+        return
+    token = openai.aiosession.set(pool.aiohttp_session(openai.api_base))
+    try:
+        yield
+    finally:
+        openai.aiosession.reset(token)
+
+
+if os.environ.get('LLFBENCH_HTTP_POOL'):
+    set_default_pool(HTTPPool(int(os.environ['LLFBENCH_HTTP_POOL'])))
@@ -2,6 +2,11 @@ from abc import ABC
 import openai
 import time, os
 from llfbench.agents.utils import print_color
+from llfbench.agents.llm_cache import get_default_cache
+from llfbench.agents.async_client import AsyncClient, backoff_delay, estimate_tokens, retry_after, usage_tokens
+from llfbench.agents.shared_limiter import get_default_limiter
+from llfbench.agents.failures import RETRYABLE, LLMCallError, classify, failure, get_default_breaker
+from llfbench.agents.http_pool import aiosession
 
 class LLM(ABC):
     """ This class represents a black box LLM. """
@@ -56,13 +61,14 @@ class LLM(ABC):
 OPENAI_API_INITIALIZED = False
 API_MODE_AZURE = True
 
-def _call_model(messages, model, temperature, timeout, logprobs=None, max_tokens=None):
+def _model_config(messages, model, temperature, timeout, logprobs=None, max_tokens=None):
+    """ The arguments of the openai call, and whether the model is a legacy
+        (Completion) model. """
 
     backend, model = model.split(':')
     assert backend in ('azure', 'openai')
     init_openai_api(api_mode_azure=(backend=='azure'))
 
-    # Place one call to the model, returning the response and total number of tokens involved.
     # Minor difference between using azure service (like MSR do) or not: use `engine` or `model`
     config = dict(
         messages=messages,
@@ -80,24 +86,44 @@ def _call_model(messages, model, temperature, timeout, logprobs=None, max_tokens
         model = model.replace('35', '3.5')
         config['model'] = model
 
-    if model in ('text-davinci-003'):  # legacy models
+    legacy = model in ('text-davinci-003')
+    if legacy:
         prompt = ''
         for m in config['messages']:
             if len(m['content']) > 0:
                 prompt += m['role'] + ': ' + m['content'] + '\n'
         config['prompt'] = prompt
         del config['messages']
-        response = openai.Completion.create(**config)
+    else:
+        del config['logprobs']  # logprobs is not supported by GPT3.5 or newer
+    return config, legacy
+
+
+def _parse_response(response, legacy):
+    if legacy:
         logprobs = response["choices"][0]["logprobs"]
         info = {'logprobs': logprobs, 'response': response}
         return response['choices'][0]['text'], info
     else:
-        del config['logprobs']  # logprobs is not supported by GPT3.5 or newer
-        response = openai.ChatCompletion.create(**config)
         info = {'logprobs': None, 'response': response}
         return response['choices'][0]['message'].get('content', ''), info
 
 
+def _call_model(messages, model, temperature, timeout, logprobs=None, max_tokens=None):
+    # Place one call to the model, returning the response and total number of tokens involved.
+    config, legacy = _model_config(messages, model, temperature, timeout, logprobs, max_tokens)
+    response = (openai.Completion if legacy else openai.ChatCompletion).create(**config)
+    return _parse_response(response, legacy)
+
+
+async def _acall_model(messages, model, temperature, timeout, logprobs=None, max_tokens=None):
+    # The same call as _call_model, awaitable.
+    config, legacy = _model_config(messages, model, temperature, timeout, logprobs, max_tokens)
+    with aiosession():  # the connections of the default HTTPPool, if any
+        response = await (openai.Completion if legacy else openai.ChatCompletion).acreate(**config)
+    return _parse_response(response, legacy)
+
+
 def init_openai_api(api_mode_azure=True):
     global OPENAI_API_INITIALIZED, API_MODE_AZURE
     if not OPENAI_API_INITIALIZED:
@@ -113,49 +139,78 @@ def init_openai_api(api_mode_azure=True):
             openai.api_key_path = os.getenv('OPENAI_KEY_PATH')
 
 
-def call_model(messages, model, temperature, timeout, wait_time=2, max_tokens=None, logprobs=None, max_attempts=float('inf')):
+def call_model(messages, model, temperature, timeout, wait_time=2, max_tokens=None, logprobs=None, max_attempts=float('inf'), cache=None, limiter=None, breaker=None):
+    """ Call the model, retrying on retryable errors. Raises an LLMCallError
+        if the request cannot succeed or fails max_attempts times, and an
+        LLMFatalError if no request can (see `llfbench.agents.failures`).
+
+        Responses are looked up in and added to `cache` (a ResponseCache; by
+        default the one set by `llm_cache.set_default_cache`), if any. Each
+        request is first acquired from `limiter` (a SharedRateLimiter; by
+        default the one set by `shared_limiter.set_default_limiter`), if any,
+        which a rate limit error pauses for all the processes sharing it.
+        While the backend is down, `breaker` (a CircuitBreaker; by default the
+        one of the process) pauses the calls. """
+    cache = get_default_cache() if cache is None else cache
+    limiter = get_default_limiter() if limiter is None else limiter
+    key = None
+    if cache is not None and cache.accepts(temperature):
+        key = cache.key(model, messages, temperature, max_tokens)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    breaker = get_default_breaker() if breaker is None else breaker
+    estimate = estimate_tokens(messages, max_tokens)
+    error = None
     i = 0
     while i < max_attempts:
         i+=1
+        breaker.wait()
         try:
-            return _call_model(messages, model, temperature, timeout, max_tokens)
-        except openai.error.Timeout as e:
-            print(f"Request timed out: {e}")
-            print("Retrying the call...")
-            continue
-        except openai.error.RateLimitError as e:
-            print(f"OpenAI API request exceeded rate limit: {e}")
-            # Wait the timeout period before retrying, to avoid a retry storm.
-            print(f"Waiting {wait_time} seconds before retrying...")
-            time.sleep(wait_time)
-            print("Retrying the call...")
-            continue
-        except openai.error.APIError as e:
-            print(f"OpenAI API returned an API Error: {e}")
-            exit(1)
-        except openai.error.AuthenticationError as e:
-            print(f"OpenAI API returned an Authentication Error: {e}")
-            exit(1)
-        except openai.error.APIConnectionError as e:
-            print(f"Failed to connect to OpenAI API: {e}")
-            exit(1)
-        except openai.error.InvalidRequestError as e:
-            print(f"Invalid Request Error: {e}")
-            exit(1)
-        except openai.error.ServiceUnavailableError as e:
-            print(f"Service Unavailable: {e}")
-            exit(1)
+            if limiter is not None:
+                limiter.acquire(estimate)
+            response, info = _call_model(messages, model, temperature, timeout, logprobs=logprobs, max_tokens=max_tokens)
         except Exception as e:
-            print(f"Unexpected exception: {e}")
-            print(f"Message: {messages}")
-            #exit(1)
-            #import pdb; pdb.set_trace()
-            time.sleep(timeout)
+            error = e
+            pause = breaker.failure(e)
+            if classify(e) != RETRYABLE:
+                print_color(f"The call cannot succeed: {type(e).__name__}: {e}", "red")
+                raise failure(e, i) from e
+            if pause > 0 and limiter is not None:  # the other processes pause too
+                limiter.pause(pause)
+            if isinstance(e, openai.error.RateLimitError):
+                print(f"OpenAI API request exceeded rate limit: {e}")
+                # Wait the timeout period before retrying, to avoid a retry storm.
+                delay = max(wait_time, retry_after(e))
+                print(f"Waiting {delay} seconds before retrying...")
+                if limiter is not None:  # the other processes wait too
+                    limiter.pause(delay)
+                else:
+                    time.sleep(delay)
+            elif isinstance(e, openai.error.Timeout):
+                print(f"Request timed out: {e}")
+            else:
+                delay = backoff_delay(i, base=wait_time, cap=timeout)
+                print(f"{type(e).__name__}: {e}")
+                print(f"Waiting {delay:.1f} seconds before retrying...")
+                time.sleep(delay)
             print("Retrying the call...")
             continue
-
-    print_color("Failed to call the model after {} attempts.".format(max_attempts), "red")
-    return None, None
+        except BaseException:  # e.g. interrupted
+            breaker.release()
+            raise
+        breaker.success()
+        if limiter is not None and usage_tokens(info) is not None:
+            limiter.charge(usage_tokens(info) - estimate)
+        if key is not None:
+            cache.put(key, response, info)
+        return response, info
+
+    if error is None:
+        raise LLMCallError('No attempt was made', attempts=0)
+    print_color("Failed to call the model after {} attempts.".format(i), "red")
+    raise failure(error, i)
 
 class GPT(LLM):
     """ This is based on ChatCompletion api. """
@@ -191,15 +246,53 @@ class GPT(LLM):
 
     def generate(self, prompt, **kwargs):
         """ This is one-time query response. """
+        spec = self.spec.copy()
+        spec.update(kwargs)
+        return call_model(self._messages(prompt), **spec)
+
+    def _messages(self, prompt):
         if isinstance(prompt, str):
-            messages = [{"role": "system", "content": self.system_prompt},
-                        {"role": "user", "content": prompt}]
-        else:
-            assert type(prompt) == list, "we also accept a list of messages or a single message, but this is not"
-            messages = prompt
+            return [{"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": prompt}]
+        assert type(prompt) == list, "we also accept a list of messages or a single message, but this is not"
+        return prompt
+
+
+class AsyncGPT(GPT):
+    """ GPT whose requests go through an `AsyncClient`, which bounds the
+        requests in flight, paces them within the requests/tokens per minute
+        of the deployment, and retries with exponential backoff and jitter.
+        Use `agenerate`/`achat` to send many requests concurrently (e.g. with
+        asyncio.gather); `generate`/`chat` wait for the result. """
+
+    CLIENT_ARGS = ('max_in_flight', 'requests_per_minute', 'tokens_per_minute', 'backoff_base', 'backoff_cap', 'seed', 'limiter', 'breaker')
+
+    def __init__(self, system_prompt='', *, client=None, **kwargs):
+        """ client is an AsyncClient, possibly shared by several LLMs to share
+            its limits; the remaining kwargs are those of GPT and, if client
+            is None, of AsyncClient. """
+        client_kwargs = {k: kwargs.pop(k) for k in list(kwargs) if k in self.CLIENT_ARGS}
+        super().__init__(system_prompt, **kwargs)
+        self.client = AsyncClient(_acall_model, **client_kwargs) if client is None else client
+
+    async def achat(self, prompt, **kwargs):
+        """ This is a history-dependent response. """
+        self.messages.append({"role": "user", "content": prompt})
         spec = self.spec.copy()
         spec.update(kwargs)
-        return call_model(messages, **spec)
+        return await self.client.call(list(self.messages), **spec)
+
+    async def agenerate(self, prompt, **kwargs):
+        """ This is one-time query response. """
+        spec = self.spec.copy()
+        spec.update(kwargs)
+        return await self.client.call(self._messages(prompt), **spec)
+
+    def chat(self, prompt, **kwargs):
+        return self.client.run(self.achat(prompt, **kwargs))
+
+    def generate(self, prompt, **kwargs):
+        return self.client.run(self.agenerate(prompt, **kwargs))
 
 
 
@@ -282,8 +375,9 @@ def standardize_model_name(model):
     return model
 
 
-def make_llm(model, **kwargs):
-    """ model = backend:model_name """
+def make_llm(model, asynchronous=False, **kwargs):
+    """ model = backend:model_name. With asynchronous=True, the azure and
+        openai backends return an AsyncGPT. """
     available_backends = ['gcr']  # TODO
     if os.getenv('AZURE_OPENAI_KEY') is not None:
         available_backends.append('azure')
@@ -311,7 +405,7 @@ def make_llm(model, **kwargs):
     model = standardize_model_name(model)
 
     if backend in ('azure', 'openai'):
-        return GPT(model=backend+':'+model, **kwargs)
+        return (AsyncGPT if asynchronous else GPT)(model=backend+':'+model, **kwargs)
     elif backend == 'autogen':
         return Autgen(model=model, **kwargs)
     else:
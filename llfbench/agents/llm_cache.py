@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, Tuple, Union
+
+"""
+
+A persistent, content-addressed cache of LLM responses, used by `call_model`.
+
+A response is stored under the SHA-256 hash of the request: the model, the
+messages, the temperature and max_tokens. The cache is a SQLite database, so
+it can be shared by all the processes of an evaluation (e.g. the workers of
+`evaluate_agent`) and by later runs. Each process opens its own connection;
+the database is in WAL mode, so readers do not block the writer.
+
+The cache is bounded by `max_entries` and/or `max_bytes` (the size of the
+stored responses). When it grows past them, the least recently used
+responses are evicted.
+
+By default only requests with temperature 0 are cached, since a cached
+response would otherwise replace a fresh sample.
+
+Enable it for `call_model` with `set_default_cache(ResponseCache(path))`, or by
+setting the environment variable LLFBENCH_LLM_CACHE to the path of the
+database. A response read from the cache has info['cached'] = True.
+
+"""
+
+
+class ResponseCache:
+    """ A disk-backed LRU cache of the (response, info) returned by `call_model`. """
+
+    def __init__(self,
+                 path: str,
+                 max_entries: Union[int, None] = None,
+                 max_bytes: Union[int, None] = None,
+                 all_temperatures: bool = False,
+                 timeout: float = 30.0):
+        """
+            Args:
+                path: The path of the SQLite database, created if missing.
+
+                max_entries: The maximum number of responses kept. None means
+                no limit.
+
+                max_bytes: The maximum total size of the responses kept (in
+                bytes of their JSON encoding). None means no limit.
+
+                all_temperatures: Whether to cache requests with a nonzero
+                temperature too.
+
+                timeout: How long (s) to wait for another process holding a
+                lock on the database.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.all_temperatures = all_temperatures
+        self.timeout = timeout
+        self.hits, self.misses = 0, 0  # of this process
+        self._local = threading.local()  # a connection per thread and process
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                               'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                               'size INTEGER NOT NULL, last_access REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection cannot be used across fork, so each process opens its own.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    def __getstate__(self):
+        # Connections are per process; a copy (e.g. in a worker) opens its own.
+        state = vars(self).copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self._local = threading.local()
+
+    def accepts(self, temperature: float) -> bool:
+        """ Whether requests with this temperature are cached. """
+        return self.all_temperatures or temperature == 0
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: Union[int, None]) -> str:
+        request = json.dumps([model, messages, temperature, max_tokens], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Union[Tuple[str, Dict[str, Any]], None]:
+        """ Return the cached (response, info) of a key, or None on a miss. """
+        connection = self._connection()
+        row = connection.execute('SELECT value FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            connection.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+        except sqlite3.OperationalError:  # locked by writers for longer than the timeout; the order is only a hint
+            pass
+        response, info = json.loads(row[0])
+        info['cached'] = True
+        return response, info
+
+    def put(self, key: str, response: str, info: Union[Dict[str, Any], None]) -> bool:
+        """ Cache the (response, info) of a key. Returns False if it cannot be
+            encoded as JSON, or if the database cannot be written (e.g. it
+            stays locked by other writers for longer than the timeout), in
+            which case it is not cached: the response, which was paid for, is
+            still returned to the caller. """
+        try:
+            value = json.dumps([response, info])
+        except (TypeError, ValueError):
+            return False
+        connection = self._connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')  # a single writer at a time, across processes
+            try:
+                connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                                   (key, value, len(value), time.time()))
+                self._evict(connection)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        except sqlite3.OperationalError as e:
+            print(f"Cannot cache the response in {self.path}: {e}")
+            return False
+        return True
+
+    def _evict(self, connection: sqlite3.Connection):
+        """ Delete the least recently used responses beyond the bounds. """
+        if self.max_entries is None and self.max_bytes is None:
+            return
+        entries, size = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        if (self.max_entries is None or entries <= self.max_entries) and (self.max_bytes is None or size <= self.max_bytes):
+            return
+        evicted = []
+        for key, value_size in connection.execute('SELECT key, size FROM responses ORDER BY last_access'):
+            if (self.max_entries is None or entries <= self.max_entries) and (self.max_bytes is None or size <= self.max_bytes):
+                break
+            evicted.append((key,))
+            entries, size = entries - 1, size - value_size
+        connection.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """ The hits and misses of this process, and the entries and the size
+            (bytes) of the cache. """
+        entries, size = self._connection().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        lookups = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses, hit_rate=self.hits / lookups if lookups else 0.0,
+                    entries=entries, bytes=size)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM responses')
+        self.hits, self.misses = 0, 0
+
+
+_DEFAULT_CACHE = None
+
+
+def set_default_cache(cache: Union[ResponseCache, None]):
+    """ Set the cache used by `call_model` when none is given. None disables it. """
+    global _DEFAULT_CACHE
+    _DEFAULT_CACHE = cache
+
+
+def get_default_cache() -> Union[ResponseCache, None]:
+    return _DEFAULT_CACHE
+
+
+if os.environ.get('LLFBENCH_LLM_CACHE'):
+    set_default_cache(ResponseCache(os.environ['LLFBENCH_LLM_CACHE']))
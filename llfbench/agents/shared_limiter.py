@@ -0,0 +1,174 @@
+import os
+import time
+import struct
+import random
+import tempfile
+from typing import Dict, Union
+try:
+    import fcntl
+except ImportError:  # not a Unix
+    fcntl = None
+
+"""
+
+A rate limiter shared by all the processes on a host, e.g. the workers of
+`evaluate_agent(n_workers > 1)` or of a process pool, so that they pace their
+requests to a deployment together instead of each retrying on its own.
+
+The state of the limiter, its token buckets of requests and tokens per minute
+and the time until which all requests are paused, is kept in a small file in
+shared memory (/dev/shm where it exists) and read and written under an
+exclusive lock (flock) of that file. Processes that use the same `name` share
+the same limiter; each of them should configure it with the same quota.
+
+`call_model` acquires a request (and an estimate of its tokens) from the
+limiter before each request. When the backend throttles a request anyway
+(429), it pauses the limiter for all the processes for the Retry-After delay,
+so that they resume together at the allowed rate rather than stampeding.
+
+Set the default limiter of `call_model` with `set_default_limiter`, or with the
+environment variable LLFBENCH_RATE_LIMIT=<requests per minute>[,<tokens per
+minute>], which the workers of an evaluation inherit.
+
+"""
+
+# requests level, tokens level, last refill, paused until
+_STATE = struct.Struct('<4d')
+
+
+class SharedRateLimiter:
+    """ Token buckets of requests and tokens per minute, shared by all the
+        processes that open the same name. """
+
+    def __init__(self,
+                 name: str = 'default',
+                 requests_per_minute: Union[float, None] = None,
+                 tokens_per_minute: Union[float, None] = None,
+                 requests_burst: Union[float, None] = None,
+                 tokens_burst: Union[float, None] = None,
+                 directory: Union[str, None] = None):
+        """
+            Args:
+                name: The name of the limiter on this host.
+
+                requests_per_minute, tokens_per_minute: The quota of the
+                deployment. None means no limit.
+
+                requests_burst, tokens_burst: The capacity of the buckets. By
+                default, the units of 10 s.
+
+                directory: Where the state file is kept. By default /dev/shm,
+                or the temporary directory.
+        """
+        assert fcntl is not None, "SharedRateLimiter requires a Unix (fcntl)."
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_burst = self._burst(requests_per_minute, requests_burst)
+        self.tokens_burst = self._burst(tokens_per_minute, tokens_burst)
+        if directory is None:
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        self.path = os.path.join(directory, f'llfbench-limiter-{name}')
+        self._fd, self._pid = None, None
+        self.rng = random.Random()
+
+    @staticmethod
+    def _burst(per_minute, burst):
+        if per_minute is None:
+            return float('inf')
+        return max(1.0, per_minute / 6.0) if burst is None else burst
+
+    def __getstate__(self):
+        state = vars(self).copy()
+        state['_fd'] = state['_pid'] = None  # a copy (e.g. in a worker) opens its own
+        return state
+
+    def _open(self) -> int:
+        if self._pid != os.getpid():
+            self._fd, self._pid = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600), os.getpid()
+        return self._fd
+
+    def _update(self, update):
+        """ Apply update(state, now) -> (state, result) to the shared state,
+            refilled to now, under the lock, and return the result. """
+        fd = self._open()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            now = time.time()
+            data = os.pread(fd, _STATE.size, 0)
+            if len(data) < _STATE.size:  # a new limiter, with full buckets
+                requests, tokens, last, paused_until = self.requests_burst, self.tokens_burst, now, 0.0
+            else:
+                requests, tokens, last, paused_until = _STATE.unpack(data)
+            elapsed = max(0.0, now - last)
+            if self.requests_per_minute is not None:
+                requests = min(self.requests_burst, requests + elapsed * self.requests_per_minute / 60)
+            if self.tokens_per_minute is not None:
+                tokens = min(self.tokens_burst, tokens + elapsed * self.tokens_per_minute / 60)
+            (requests, tokens, paused_until), result = update((requests, tokens, paused_until), now)
+            # Keep the levels finite, so that a limiter opened later with a quota refills them.
+            os.pwrite(fd, _STATE.pack(min(requests, 1e18), min(tokens, 1e18), now, paused_until), 0)
+            return result
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def acquire(self, tokens: float = 0.0) -> float:
+        """ Wait until a request of `tokens` tokens is allowed, and take it.
+            Returns the time (s) waited. """
+        def take(state, now):
+            requests, available, paused_until = state
+            if paused_until > now:
+                return state, paused_until - now
+            needed_tokens = min(tokens, self.tokens_burst)
+            wait = 0.0
+            if self.requests_per_minute is not None and requests < 1:
+                wait = (1 - requests) * 60 / self.requests_per_minute
+            if self.tokens_per_minute is not None and available < needed_tokens:
+                wait = max(wait, (needed_tokens - available) * 60 / self.tokens_per_minute)
+            if wait > 0:
+                return state, wait
+            return (requests - 1, available - tokens, paused_until), 0.0
+
+        start = time.time()
+        while True:
+            wait = self._update(take)
+            if wait == 0:
+                return time.time() - start
+            time.sleep(wait * (1 + 0.1 * self.rng.random()))  # so that the waiters do not wake up together
+
+    def charge(self, tokens: float):
+        """ Take (or give back, if negative) tokens without waiting, e.g. to
+            correct the estimate of a request by its usage. """
+        self._update(lambda state, now: ((state[0], min(self.tokens_burst, state[1] - tokens), state[2]), None))
+
+    def pause(self, seconds: float):
+        """ Hold the requests of all the processes for `seconds`, e.g. after the
+            backend throttled one. """
+        self._update(lambda state, now: ((state[0], state[1], max(state[2], now + seconds)), None))
+
+    def state(self) -> Dict[str, float]:
+        """ The levels of the buckets and the remaining pause (s). """
+        return self._update(lambda state, now: (state, dict(requests=state[0], tokens=state[1],
+                                                             paused=max(0.0, state[2] - now))))
+
+    def reset(self):
+        """ Refill the buckets and end the pause. """
+        self._update(lambda state, now: ((self.requests_burst, self.tokens_burst, 0.0), None))
+
+
+_DEFAULT_LIMITER = None
+
+
+def set_default_limiter(limiter: Union[SharedRateLimiter, None]):
+    """ Set the limiter used by `call_model` when none is given. None disables it. """
+    global _DEFAULT_LIMITER
+    _DEFAULT_LIMITER = limiter
+
+
+def get_default_limiter() -> Union[SharedRateLimiter, None]:
+    return _DEFAULT_LIMITER
+
+
+if os.environ.get('LLFBENCH_RATE_LIMIT'):
+    _quota = [float(x) for x in os.environ['LLFBENCH_RATE_LIMIT'].split(',')]
+    set_default_limiter(SharedRateLimiter(requests_per_minute=_quota[0], tokens_per_minute=_quota[1] if len(_quota) > 1 else None))
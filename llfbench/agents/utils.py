@@ -1,6 +1,7 @@
 import random
 import numpy as np
 from urllib.error import HTTPError
+from llfbench.agents.failures import LLMCallError, LLMFatalError
 
 # print with colors (modified from Huihan's lflf)
 def print_color(message, color=None, logger=None):
@@ -78,18 +79,26 @@ def set_seed(seed, env=None):
     #    env.reset(seed)
 
 def rollout(agent, env, *, horizon, return_full_information=False, log_data=False, seed=None, sparse_reward=False):
-    """ A basic agent evaluation loop. """
+    """ A basic agent evaluation loop. An episode whose agent fails to call
+        the LLM ends there, with the failure in data['failure']. """
 
     observation, info = env.reset()
     agent.reset(observation['instruction'])
 
     sum_of_rewards = 0.0
-    data = dict(observations=[observation['observation']], actions=[], rewards=[], dones=[], truncated=[], infos=[])
+    data = dict(observations=[observation['observation']], actions=[], rewards=[], dones=[], truncated=[], infos=[],
+                failure=None)
 
     #print("Initial Observation", observation['observation'])
     for i in range(horizon):
         try:
             action = agent.act(observation['observation'], observation['feedback'])
+        except LLMFatalError:  # no call can succeed in this process
+            raise
+        except LLMCallError as e:  # only this episode fails
+            print_color(f'Episode failed: {e}', 'red')
+            data['failure'] = e.asdict()
+            break
         except (RuntimeError) as e:
             assert "Google GenAI exception" in str(e)  # traj fails
             break
@@ -125,7 +134,8 @@ def rollout(agent, env, *, horizon, return_full_information=False, log_data=Fals
 
 def evaluate_agent(agent, env, *, horizon, n_episodes, return_full_information=False, log_data=False,
                    n_workers=1, seed=None, sparse_reward=False):
-    """ Evaluate an agent with n_episodes rollouts. """
+    """ Evaluate an agent with n_episodes rollouts. The score of an episode
+        whose LLM call failed is NaN (use np.nanmean to average the others). """
 
     env.reset(seed=seed)
 
@@ -144,8 +154,12 @@ def evaluate_agent(agent, env, *, horizon, n_episodes, return_full_information=F
     else:
         results = [_rollout() for _ in range(n_episodes)]
 
+    failures = sum(data['failure'] is not None for _, data in results)
+    if failures > 0:
+        print_color(f'{failures} of {n_episodes} episodes failed to call the LLM.', 'red')
+
     # Extract the scores and data
-    scores = [score for score, _ in results]
+    scores = [np.nan if data['failure'] is not None else score for score, data in results]
     scores = np.array(scores)
     data = [data for _, data in results]
     return (scores, data) if log_data else scores
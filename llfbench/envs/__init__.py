@@ -1,13 +1,10 @@
-import importlib
 from llfbench.envs import gridworld
 from llfbench.envs import bandits
 from llfbench.envs import optimization
 from llfbench.envs import reco
 from llfbench.envs import poem
 from llfbench.envs import highway
-
-if importlib.util.find_spec('metaworld'):
-    from llfbench.envs import metaworld
-
-if importlib.util.find_spec('alfworld'):
-    from llfbench.envs import alfworld
+# Registering the envs of a family does not import its dependencies; making
+# one raises if they are not installed (see EnvSpec.available).
+from llfbench.envs import metaworld
+from llfbench.envs import alfworld
@@ -0,0 +1,205 @@
+import re
+import numpy as np
+import gymnasium as gym
+from typing import Any, Dict, List, Sequence, Union
+
+"""
+
+Parsers of text actions.
+
+An agent that only writes text (e.g. an LLM) answers with a string, which is
+parsed into an action of the action space of the env:
+
+    Discrete: an integer, e.g. '2'.
+    Box: a number or a (nested) list of numbers of the shape of the space,
+         e.g. '[0.1, -0.2, 0.3, 1]'. Brackets may be square or round and the
+         numbers may be separated by commas or spaces.
+    Text: the string itself.
+
+The text is matched against regexes compiled once per parser; it is never
+evaluated as python code. A text that cannot be parsed raises an
+ActionParseError, which explains what was expected so that it can be returned
+to the agent as feedback.
+
+"""
+
+_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[-+]?(?:inf|nan)'
+_NUMBER_RE = re.compile(_NUMBER, re.IGNORECASE)
+_INTEGER_RE = re.compile(r'\s*([-+]?\d+)\s*')
+# A flat list of numbers, which is the common case of a Box action. Each run
+# of whitespace can be matched in only one way, so that a text which does not
+# match fails in linear time instead of backtracking exponentially.
+_NUMBERS = rf'(?:{_NUMBER})(?:(?:\s*,\s*|\s+)(?:{_NUMBER}))*(?:\s*,)?'
+_FLAT_LIST_RE = re.compile(rf'\s*(?:\[\s*{_NUMBERS}\s*\]|\(\s*{_NUMBERS}\s*\)|{_NUMBERS})\s*', re.IGNORECASE)
+_TOKEN_RE = re.compile(rf'\s*(?:(?P<open>[\[(])|(?P<close>[\])])|(?P<comma>,)|(?P<number>{_NUMBER}))', re.IGNORECASE)
+
+
+class ActionParseError(ValueError):
+    """ The text of an action cannot be parsed into the action space. """
+
+    def __init__(self, action: str, reason: str, expected: str, position: Union[int, None] = None):
+        """
+            Args:
+                action: The text of the action.
+
+                reason: Why the text cannot be parsed.
+
+                expected: A description of a valid action.
+
+                position: The position in the text where parsing failed, if
+                known.
+        """
+        self.action = action
+        self.reason = reason
+        self.expected = expected
+        self.position = position
+        super().__init__(self.feedback)
+
+    @property
+    def feedback(self) -> str:
+        """ The error as feedback to the agent. """
+        where = '' if self.position is None else f' at position {self.position}'
+        return f'Cannot parse action {self.action!r}{where}: {self.reason}. Expected {self.expected}.'
+
+    def asdict(self) -> Dict[str, Any]:
+        return dict(action=self.action, reason=self.reason, expected=self.expected, position=self.position)
+
+
+class ActionParser:
+    """ Parse the text of an action into an action of `space`. """
+
+    def __init__(self, space: gym.Space):
+        self.space = space
+
+    @property
+    def expected(self) -> str:
+        """ A description of a valid action. """
+        raise NotImplementedError
+
+    def parse(self, text: str) -> Any:
+        """ Return the action, or raise ActionParseError. """
+        raise NotImplementedError
+
+    def parse_batch(self, texts: Sequence[str]) -> List[Union[Any, ActionParseError]]:
+        """ Parse the actions of several envs (e.g. of a vector env). The
+            result of a text that cannot be parsed is its ActionParseError
+            instead of an action. """
+        results = []
+        for text in texts:
+            try:
+                results.append(self.parse(text))
+            except ActionParseError as error:
+                results.append(error)
+        return results
+
+    def _check_type(self, text):
+        if not isinstance(text, str):
+            raise ActionParseError(repr(text), f'the action must be a string, not {type(text).__name__}', self.expected)
+
+
+class DiscreteParser(ActionParser):
+
+    @property
+    def expected(self) -> str:
+        low = int(self.space.start)
+        return f'an integer from {low} to {low + int(self.space.n) - 1}'
+
+    def parse(self, text: str) -> int:
+        self._check_type(text)
+        match = _INTEGER_RE.fullmatch(text)
+        if match is None:
+            raise ActionParseError(text, 'it is not an integer', self.expected)
+        action = int(match.group(1))
+        if not self.space.contains(action):
+            raise ActionParseError(text, 'the integer is out of range', self.expected)
+        return action
+
+
+class BoxParser(ActionParser):
+
+    @property
+    def expected(self) -> str:
+        shape = self.space.shape
+        if len(shape) == 0:
+            return 'a number'
+        if len(shape) == 1:
+            example = ', '.join(['0.0'] * shape[0])
+            return f'a list of {shape[0]} numbers, e.g. [{example}]'
+        return f'a nested list of numbers of shape {shape}'
+
+    def parse(self, text: str) -> np.ndarray:
+        self._check_type(text)
+        if len(self.space.shape) <= 1 and _FLAT_LIST_RE.fullmatch(text):
+            values = [float(v) for v in _NUMBER_RE.findall(text)]
+            values = values[0] if len(self.space.shape) == 0 and len(values) == 1 else values
+        else:
+            values = self._parse_nested(text)
+        try:
+            action = np.array(values, dtype=self.space.dtype)
+        except (ValueError, TypeError) as e:  # e.g. lists of different lengths, or nan as an integer
+            raise ActionParseError(text, f'the numbers do not form an array ({e})', self.expected) from e
+        if action.shape != self.space.shape:
+            raise ActionParseError(text, f'the shape is {action.shape} instead of {self.space.shape}', self.expected)
+        return action
+
+    def _parse_nested(self, text: str) -> Union[float, list]:
+        """ Parse a (nested) list of numbers with a recursive descent over the tokens. """
+        tokens, position = [], 0
+        text_end = len(text.rstrip())
+        while position < text_end:
+            match = _TOKEN_RE.match(text, position)
+            if match is None:
+                raise ActionParseError(text, 'unexpected character', self.expected, position=len(text) - len(text[position:].lstrip()))
+            tokens.append((match.lastgroup, match.group(match.lastgroup), match.end()))
+            position = match.end()
+        if not tokens:
+            raise ActionParseError(text, 'the action is empty', self.expected)
+
+        def parse_value(i, depth=0):
+            kind, value, end = tokens[i]
+            if kind == 'number':
+                return float(value), i + 1
+            if kind != 'open':
+                raise ActionParseError(text, f'unexpected {value!r}', self.expected, position=end - 1)
+            if depth == max(1, len(self.space.shape)):  # deeper lists cannot have the shape of the space
+                raise ActionParseError(text, 'the lists are nested too deeply', self.expected, position=end - 1)
+            values, i = [], i + 1
+            while i < len(tokens) and tokens[i][0] != 'close':
+                value, i = parse_value(i, depth + 1)
+                values.append(value)
+                if i < len(tokens) and tokens[i][0] == 'comma':
+                    i += 1
+            if i == len(tokens):
+                raise ActionParseError(text, 'a bracket is not closed', self.expected)
+            return values, i + 1
+
+        value, i = parse_value(0)
+        if i != len(tokens):
+            raise ActionParseError(text, 'unexpected text after the action', self.expected, position=tokens[i][2] - len(tokens[i][1]))
+        return value
+
+
+class TextParser(ActionParser):
+
+    @property
+    def expected(self) -> str:
+        return 'a string'
+
+    def parse(self, text: str) -> str:
+        self._check_type(text)
+        return text
+
+
+PARSERS = {
+    gym.spaces.Discrete: DiscreteParser,
+    gym.spaces.Box: BoxParser,
+    gym.spaces.Text: TextParser,
+}
+
+
+def make_parser(space: gym.Space) -> ActionParser:
+    """ Return the parser of the text actions of `space`. """
+    for space_type, parser in PARSERS.items():
+        if isinstance(space, space_type):
+            return parser(space)
+    raise NotImplementedError(f'Parsing text actions of {type(space).__name__} spaces is not supported.')
@@ -1,6 +1,4 @@
-from gymnasium.envs.registration import register
-from llfbench.envs.alfworld.alfworld import Alfworld
-from llfbench.envs.alfworld.wrapper import AlfworldWrapper
+from llfbench.envs.specs import register_env
 
 
 
@@ -16,14 +14,23 @@ def make_env(env_name,
     assert env_name.startswith("alfworld"), f"alfworld environment {env_name} must start with alfworld"
     """ Make the original env and wrap it with the LLFWrapper. """
     assert visual == False, "alfworld environments have no visual observations"
+    from llfbench.envs.alfworld.alfworld import Alfworld
+    from llfbench.envs.alfworld.wrapper import AlfworldWrapper
     env = Alfworld(instruction_type=instruction_type, feedback_type=feedback_type)
     return AlfworldWrapper(env, instruction_type=instruction_type, feedback_type=feedback_type)
 
 
 for env_name in ENVIRONMENTS:
     # default version (backwards compatibility)
-    register(
+    register_env(
         id=f"llf-{env_name}",
         entry_point='llfbench.envs.alfworld:make_env',
-        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False)
+        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False),
+        family='alfworld',
+        instruction_types=('b',),
+        feedback_types=('r', 'hn', 'hp', 'fn', 'fp'),
+        reward_range=(-float('inf'), float('inf')),
+        action_space='text',
+        make_cost='high',  # sets up TextWorld and may download the alfworld data
+        requires=('alfworld',),
     )
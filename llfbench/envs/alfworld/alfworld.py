@@ -1,8 +1,8 @@
 import os
 import sys
-import random
 import string
 import gymnasium as gym
+from gymnasium.utils import seeding
 
 from llfbench.envs.alfworld.prompts import *
 from llfbench.envs.llf_env import Feedback
@@ -53,6 +53,7 @@ class Alfworld(gym.Env):
         self.env = self.env.init_env(batch_size=1)
 
         self.format = None
+        self.defer = None  # set by the wrapper, for the feedback
         self.instruction_type = instruction_type
         self.feedback_type = feedback_type
         self.already_won = False
@@ -71,6 +72,7 @@ class Alfworld(gym.Env):
 
     def seed(self, seed):
         self.env.seed(seed)
+        self._np_random, seed = seeding.np_random(seed)
 
 
     def load_config(self):
@@ -169,7 +171,7 @@ class Alfworld(gym.Env):
         feedback = Feedback()
 
         if "r" in feedback_type:
-            feedback.r = self.format(reward_descp, reward=reward)
+            feedback.r = self.defer(reward_descp, reward=reward)
 
         if "hn" in feedback_type:
 
@@ -177,33 +179,33 @@ class Alfworld(gym.Env):
             past_opt_action = self._get_expert_action(past_info)
 
             if self.already_won:
-                feedback.hn = self.format(hn_no_op)
+                feedback.hn = self.defer(hn_no_op)
             elif past_opt_action is None:
-                feedback.hn = self.format(no_feedback)
+                feedback.hn = self.defer(no_feedback)
             else:
                 bad_actions = list(past_admissible_actions)
                 bad_actions.remove(past_opt_action)
 
-                avoid_action = random.choice(bad_actions)
+                avoid_action = bad_actions[self.np_random.integers(len(bad_actions))]
 
                 if action == avoid_action:
-                    feedback.hn = self.format(mistake_bad_action_descp, avoid_action=avoid_action)
+                    feedback.hn = self.defer(mistake_bad_action_descp, avoid_action=avoid_action)
                 else:
-                    feedback.hn = self.format(correct_bad_action_descp, avoid_action=avoid_action)
+                    feedback.hn = self.defer(correct_bad_action_descp, avoid_action=avoid_action)
 
         if "hp" in feedback_type:
 
             past_opt_action = self._get_expert_action(past_info)
 
             if self.already_won:
-                feedback.hp = self.format(hp_no_op)
+                feedback.hp = self.defer(hp_no_op)
             elif past_opt_action is None:
-                feedback.hp = self.format(no_feedback)
+                feedback.hp = self.defer(no_feedback)
             else:
                 if past_opt_action == action.lower().strip():
-                    feedback.hp = self.format(correct_good_action_descp, past_opt_action=past_opt_action)
+                    feedback.hp = self.defer(correct_good_action_descp, past_opt_action=past_opt_action)
                 else:
-                    feedback.hp = self.format(mistake_good_action_descp, past_opt_action=past_opt_action)
+                    feedback.hp = self.defer(mistake_good_action_descp, past_opt_action=past_opt_action)
 
         if "fn" in feedback_type:
 
@@ -211,27 +213,27 @@ class Alfworld(gym.Env):
             opt_action = self._get_expert_action(info)
 
             if self.already_won:
-                feedback.fn = self.format(fn_no_op)
+                feedback.fn = self.defer(fn_no_op)
             elif opt_action is None:
-                feedback.fn = self.format(no_feedback)
+                feedback.fn = self.defer(no_feedback)
             else:
                 bad_actions = list(admissible_actions)
                 bad_actions.remove(opt_action)
 
-                avoid_action = random.choice(bad_actions)
+                avoid_action = bad_actions[self.np_random.integers(len(bad_actions))]
 
-                feedback.fn = self.format(avoid_bad_action_descp, avoid_action=avoid_action)
+                feedback.fn = self.defer(avoid_bad_action_descp, avoid_action=avoid_action)
 
         if "fp" in feedback_type:
 
             opt_action = self._get_expert_action(info)
 
             if self.already_won:
-                feedback.fp = self.format(fp_no_op)
+                feedback.fp = self.defer(fp_no_op)
             elif opt_action is None:
-                feedback.fp = self.format(no_feedback)
+                feedback.fp = self.defer(no_feedback)
             else:
-                feedback.fp = self.format(follow_opt_action_descp, opt_action=opt_action)
+                feedback.fp = self.defer(follow_opt_action_descp, opt_action=opt_action)
         return feedback
 
     def step(self, action):
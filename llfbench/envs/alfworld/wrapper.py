@@ -16,11 +16,13 @@ class AlfworldWrapper(LLFWrapper):
     # fn: future negative
     # fp: future positive
     FEEDBACK_TYPES = ('r', 'hn', 'hp', 'fn', 'fp')
+    BLOCKING = True  # TextWorld engine
 
     def __init__(self, env, instruction_type, feedback_type):
         super().__init__(env, instruction_type, feedback_type)
 
         self.alfworld_env.format = self.format
+        self.alfworld_env.defer = self.defer
         self.alfworld_env.instruction_type = instruction_type
         self.alfworld_env.feedback_type = feedback_type
 
@@ -30,8 +32,9 @@ class AlfworldWrapper(LLFWrapper):
 
         # Reset the instruction and feedback type of the base environment based on the settings in the wrapper
         self.alfworld_env.format = self.format
+        self.alfworld_env.defer = self.defer
         self.alfworld_env.instruction_type = self.instruction_type
-        self.alfworld_env.feedback_type = self._feedback_type
+        self._request_feedback(self.alfworld_env)
         return self.env.reset(seed=seed, options=options)
 
     def _step(self, action: Any) -> Tuple[Dict[str, Any], float, bool, bool,  Dict[str, Any]]:
@@ -41,9 +44,18 @@ class AlfworldWrapper(LLFWrapper):
 
         # Reset the instruction and feedback type of the base environment based on the settings in the wrapper
         self.alfworld_env.format = self.format
+        self.alfworld_env.defer = self.defer
         self.alfworld_env.instruction_type = self.instruction_type
-        self.alfworld_env.feedback_type = self._feedback_type
-        return self.env.step(action)
+        self._request_feedback(self.alfworld_env)
+        return self._env_step(action)
+
+    def _get_env_state(self):
+        # The TextWorld game runs in a separate engine whose state cannot be
+        # read, and the env holds handles to it which cannot be copied.
+        raise NotImplementedError('Alfworld does not support get_state.')
+
+    def _set_env_state(self, state):
+        raise NotImplementedError('Alfworld does not support set_state.')
 
     @property
     def alfworld_env(self):
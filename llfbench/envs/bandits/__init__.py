@@ -1,9 +1,4 @@
-import gym as old_gym
-import gymnasium as gym
-from gymnasium.envs.registration import register
-from llfbench.utils import generate_combinations_dict
-from llfbench.envs.bandits.wrapper import BanditGymWrapper
-import gym_bandits  # this is needed so that gym_bandits is registered
+from llfbench.envs.specs import register_env
 
 
 ENVIRONMENTS = (
@@ -24,6 +19,9 @@ def make_env(env_name,
              visual=False):
     assert visual == False, "bandit environments have no visual observations"
     """ Make the original env and wrap it with the LLFWrapper. """
+    import gym as old_gym
+    import gym_bandits  # this is needed so that gym_bandits is registered
+    from llfbench.envs.bandits.wrapper import BanditGymWrapper
     env = old_gym.make(env_name)  # env_name is the original env name of gym_bandits
     # we don't pass arguments here, because _reset in BanditGymWrapper calls __init__ of the env without arguments.
     return BanditGymWrapper(env, instruction_type=instruction_type, feedback_type=feedback_type)
@@ -31,8 +29,15 @@ def make_env(env_name,
 
 for env_name in ENVIRONMENTS:
     # default version (backwards compatibility)
-    register(
+    register_env(
         id=f"llf-bandits-{env_name}",
         entry_point='llfbench.envs.bandits:make_env',
-        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False)
+        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False),
+        family='bandits',
+        instruction_types=('b', 'p', 'c'),
+        feedback_types=('r', 'hp', 'hn', 'fp', 'fn'),
+        reward_range=(-100, 100),
+        action_space='discrete',
+        make_cost='low',
+        requires=('gym_bandits',),
     )
\ No newline at end of file
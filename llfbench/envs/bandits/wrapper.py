@@ -1,11 +1,37 @@
 from typing import SupportsFloat
+import copy
+import functools
 import gym as old_gym
 import numpy as np
 from llfbench.envs.env_wrappers import TerminalFreeWrapper, RandomActionOrderWrapper, EnvCompatibility
 from llfbench.envs.llf_env import LLFWrapper, Feedback
+from llfbench.envs.utils import get_rng_state, set_rng_state
 from llfbench.envs.bandits.prompts import *
 
 
+# The arms (p_dist, r_dist) of `n` bandits of the gym_bandits envs whose arms
+# are random, drawn from a Generator as their __init__ draws them.
+RANDOM_ARMS = {
+    'BanditTenArmedRandomFixed': lambda rng, n: (rng.uniform(size=n), np.full(n, 1)),
+    'BanditTenArmedRandomRandom': lambda rng, n: (rng.uniform(size=n), rng.uniform(size=n)),
+    'BanditTenArmedUniformDistributedReward': lambda rng, n: (np.full(n, 1), rng.uniform(size=n)),
+    'BanditTenArmedGaussian': lambda rng, n: (np.full(n, 1), [[rng.normal(0, 1), 1] for _ in range(n)]),
+}
+
+
+def bandit_step(bandit_env, action):
+    """ The step of a gym_bandits BanditEnv, with the payout drawn from the
+        np_random of the env instead of the global np.random. """
+    assert bandit_env.action_space.contains(action)
+    reward = 0
+    if bandit_env.np_random.uniform() < bandit_env.p_dist[action]:
+        if not isinstance(bandit_env.r_dist[action], list):
+            reward = bandit_env.r_dist[action]
+        else:
+            reward = bandit_env.np_random.normal(bandit_env.r_dist[action][0], bandit_env.r_dist[action][1])
+    return [0], reward, True, bandit_env.info
+
+
 class BanditGymWrapper(LLFWrapper):
 
     """ This is a wrapper for gym_bandits. """
@@ -16,6 +42,12 @@ class BanditGymWrapper(LLFWrapper):
     def __init__(self, env, instruction_type, feedback_type):
         env = TerminalFreeWrapper(RandomActionOrderWrapper(EnvCompatibility(env)))
         super().__init__(env, instruction_type, feedback_type)
+        # Resolved once, instead of looking them up through the chain of wrappers in every step.
+        self.__action_order = self.env.env  # RandomActionOrderWrapper
+        self.__bandit_env = self._raw_env(self.env)
+        # BanditEnv.step draws the payout from the global np.random; draw it
+        # from the np_random of the bandit env, which seed() seeds, instead.
+        self.__bandit_env.step = functools.partial(bandit_step, self.__bandit_env)
 
     @property
     def reward_range(self):
@@ -23,38 +55,50 @@ class BanditGymWrapper(LLFWrapper):
 
     def _reset(self, seed=None, options=None):
         options = options or {}
-        self._bandit_env.__init__(**options)  # gym_bandits implement the reset at the init for some reason.
+        bandit_env = self._bandit_env
+        draw_arms = RANDOM_ARMS.get(type(bandit_env).__name__)
+        if draw_arms is None:  # fixed arms
+            bandit_env.__init__(**options)  # gym_bandits implement the reset at the init for some reason.
+        else:
+            # Their __init__ draws the arms from the global np.random; draw
+            # them from the stream of this env instead.
+            p_dist, r_dist = draw_arms(self._rng, options.get('bandits', len(bandit_env.p_dist)))
+            super(type(bandit_env), bandit_env).__init__(p_dist=p_dist, r_dist=r_dist)  # BanditEnv
         self.seed(seed)
+        if seed is None:
+            # The __init__ above reseeds the np_random of the bandit env from
+            # the OS; continue the stream of this env instead.
+            bandit_env._seed(int(self._rng.integers(2**31)))
         self.env.reset()  # bandit env has no observation
         docstring =  self._bandit_env.__doc__
         n_actions = self.env.action_space.n
         instruction = docstring +'\n' + self.format(b_instruction, low=0, high=n_actions-1)
         if self.instruction_type=='p':  # Give info of a bad action.
-            bad_action = np.random.choice(np.delete(np.arange(self.env.action_space.n), self._best_arm))
+            bad_action = self._rng.choice(np.delete(np.arange(self.env.action_space.n), self._best_arm))
             instruction += '\n'+self.format(p_instruction, bad_action=bad_action, reward=self._expected_reward(bad_action))
         if self.instruction_type=='c':
             instruction += '\n'+self.format(c_instruction, best_arm=self._best_arm)
         return dict(instruction=instruction, observation=None, feedback=None), {'success':False}
 
     def _step(self, action):
-        observation, reward, terminated, truncated, info = self.env.step(action)
+        observation, reward, terminated, truncated, info = self._env_step(action)
         feedback = Feedback()
         feedback_type = self._feedback_type
 
         if 'r' in feedback_type:  # reward feedback
-            feedback.r = self.format(r_feedback, reward=reward)  # base reward feedback
+            feedback.r = self.defer(r_feedback, reward=reward)  # base reward feedback
         if 'hp' in feedback_type:  # hindsight positive: explaination on why something is correct
             if action == self._best_arm:
-                feedback.hp = self.format(hp_feedback)
+                feedback.hp = self.defer(hp_feedback)
         if 'hn' in feedback_type:  # hindsight negative: explaination on why something is incorrect
             if action != self._best_arm:
-                feedback.hn = self.format(hn_feedback)
+                feedback.hn = self.defer(hn_feedback)
         assert feedback.hn is None or feedback.hp is None, 'Cannot have both hp and hn feedback'
         if 'fp' in feedback_type:  # future positive: suggestion of things to do
-            feedback.fp = self.format(fp_feedback, best_arm=self._best_arm, reward=self._expected_reward(self._best_arm))
+            feedback.fp = self.defer(fp_feedback, best_arm=self._best_arm, reward=self._expected_reward(self._best_arm))
         if 'fn' in feedback_type:  # future negative: suggestion of things to avoid
-            bad_action = np.random.choice(np.delete(np.arange(self.env.action_space.n), self._best_arm))
-            feedback.fn = self.format(fn_feedback, bad_action=bad_action, reward=self._expected_reward(bad_action))
+            bad_action = self._rng.choice(np.delete(np.arange(self.env.action_space.n), self._best_arm))
+            feedback.fn = self.defer(fn_feedback, bad_action=bad_action, reward=self._expected_reward(bad_action))
         observation = dict(instruction=None, observation=None, feedback=feedback)
 
         info['success'] = action==self._best_arm
@@ -62,8 +106,11 @@ class BanditGymWrapper(LLFWrapper):
         return observation, float(reward), terminated, truncated, info
 
     @property
-    def _bandit_env(self): # This is hardcoded for gym_bandits
-        env = self.env
+    def _bandit_env(self):
+        return self.__bandit_env
+
+    @staticmethod
+    def _raw_env(env): # This is hardcoded for gym_bandits
         while True:
             if hasattr(env, 'env'):
                 env = env.env
@@ -72,24 +119,43 @@ class BanditGymWrapper(LLFWrapper):
                 break
         return env # this is the raw env
 
+    def _get_env_state(self):
+        # The arms are drawn when the bandit env is (re)initialized in _reset,
+        # so the state is the reward distributions and the order of the arms.
+        bandit_env = self._bandit_env
+        return dict(action_order=self.__action_order.get_state(),
+                    p_dist=copy.deepcopy(bandit_env.p_dist),
+                    r_dist=copy.deepcopy(bandit_env.r_dist),
+                    np_random=get_rng_state(bandit_env.np_random))
+
+    def _set_env_state(self, state):
+        bandit_env = self._bandit_env
+        self.__action_order.set_state(state['action_order'])
+        bandit_env.p_dist = copy.deepcopy(state['p_dist'])
+        bandit_env.r_dist = copy.deepcopy(state['r_dist'])
+        set_rng_state(bandit_env.np_random, state['np_random'])
+
     def seed(self, seed=None):  # This to fix the seeding issue for gym_bandits
         self._bandit_env._seed(seed)
+        if seed is not None:
+            self.__action_order.seed(seed)
 
     @property
     def __reward_fun(self):
         # NOTE: This is based on the internal action space before
         # RandomActionOrderWrapper. Use it with caution.
-        if not isinstance(self.r_dist[0], list):
-            r_dist = self.env.r_dist
+        bandit_env = self._bandit_env
+        if not isinstance(bandit_env.r_dist[0], list):
+            r_dist = bandit_env.r_dist
         else:
-            r_dist = np.array([mean for mean, scale in self.env.r_dist])
-        return np.array(self.env.p_dist) * np.array(r_dist)
+            r_dist = np.array([mean for mean, scale in bandit_env.r_dist])
+        return np.array(bandit_env.p_dist) * np.array(r_dist)
 
     def _expected_reward(self, idx):  # external action space
-        idx = self.internal_action(idx)
+        idx = self.__action_order.internal_action(idx)
         return self.__reward_fun[idx]
 
     @property
     def _best_arm(self):  # external action space
         idx = self.__reward_fun.argmax()
-        return self.external_action(idx)
+        return self.__action_order.external_action(idx)
@@ -1,5 +1,4 @@
 import gymnasium as gym
-import copy
 import numpy as np
 import random
 import traceback
@@ -7,6 +6,10 @@ import string
 import gym as old_gym
 from typing import Any, Optional
 from gymnasium.wrappers.compatibility import LegacyEnv
+from gymnasium.utils.step_api_compatibility import convert_to_terminated_truncated_step_api
+from llfbench.envs.utils import get_rng_state, set_rng_state
+from llfbench.envs.oracle import OracleEngine
+from llfbench.envs.action_parser import ActionParseError, make_parser
 
 
 def space_compatibility(old_space: old_gym.Space) -> gym.Space:
@@ -55,6 +58,12 @@ class EnvCompatibility(gym.wrappers.EnvCompatibility):
     def __getattr__(self, name: str) -> Any:  # The wrapped env should behave like the original env.
         return getattr(self.env, name)
 
+    def fuse_step(self, inner_step):
+        # See llfbench.envs.llf_env.fused_step.
+        if self.render_mode == 'human':
+            return self.step  # renders after each step
+        return lambda action: convert_to_terminated_truncated_step_api(inner_step(action))
+
     def __getstate__(self):
         return vars(self)
 
@@ -65,40 +74,35 @@ class TextWrapper(gym.Wrapper):
     # This is a wrapper that can be applied on top of LLFWrapper to turn into a text-based env.
     RMIN = 0.0  # TODO maybe get this from the env
 
+    def __init__(self, env):
+        super().__init__(env)
+        self.action_parser = make_parser(self.env.action_space)  # raises NotImplementedError for unsupported spaces
+
     def _parse_action(self, action):
         # parse action from string to internal action space
-        # TODO
-        if isinstance(self.env.action_space, gym.spaces.Discrete):
-            action = int(action)
-        elif isinstance(self.env.action_space, gym.spaces.Box):
-            locals_dict = {}
-            exec("action = np.array({})".format(action), globals(), locals_dict)
-            action = locals_dict['action']
-        elif isinstance(self.env.action_space, gym.spaces.Text):
-            pass
-        else:
-            raise NotImplementedError
-        return action
+        return self.action_parser.parse(action)
 
     def _parse_observation(self, observation):
         # Maybe parse the observation dict to string?
         # TODO
         return observation
 
+    def _failed_step(self, feedback, info):
+        observation = dict(instruction=None, observation=None, feedback=feedback)
+        info['success'] = False
+        return observation, self.RMIN, False, False, info
+
     def step(self, action):
         assert type(action) == str
         try:
-            action = self._parse_action(action)
-            observation, reward, done, tuncated, info =  self.env.step(action)
+            parsed_action = self._parse_action(action)
+        except ActionParseError as e:  # Treat the parse error as feedback
+            return self._failed_step(e.feedback, {'parse_error': e.asdict()})
+        try:
+            observation, reward, done, tuncated, info =  self.env.step(parsed_action)
         except Exception as e:  # Treat the exception as feedback
-            if e == NotImplementedError:
-                raise NotImplementedError
             feedback = f"Cannot parse action {action}.\n{traceback.format_exc()}"
-            observation = dict(instruction=None, observation=None, feedback=feedback)
-            reward = self.RMIN
-            done = False
-            tuncated = False
-            info = {'success':False}
+            return self._failed_step(feedback, {})
         return self._parse_observation(observation), reward, done, tuncated, info
 
 
@@ -108,22 +112,49 @@ class TerminalFreeWrapper(gym.Wrapper):
         observation, reward, terminated, truncated, info = self.env.step(action)
         return observation, reward, False, False, info
 
+    def fuse_step(self, inner_step):
+        # See llfbench.envs.llf_env.fused_step.
+        def step(action):
+            observation, reward, terminated, truncated, info = inner_step(action)
+            return observation, reward, False, False, info
+        return step
+
 class RandomActionOrderWrapper(gym.Wrapper):
 
     def __init__(self, env):
         assert isinstance(env.action_space, gym.spaces.Discrete)
         super().__init__(env)
         self.__action_table = None
+        self._rng = np.random.default_rng()
+
+    def seed(self, seed=None):
+        # Seed the random order of the actions.
+        self._rng = np.random.default_rng(seed)
 
     def reset(self, *, seed=None, options=None):
+        if seed is not None:
+            self.seed(seed)
         self.__action_table = [i for i in range(self.env.action_space.n)]
-        np.random.shuffle(self.__action_table)
+        self._rng.shuffle(self.__action_table)
         return self.env.reset(seed=seed, options=options)
 
     def step(self, action):
         action = self.internal_action(action)
         return self.env.step(action)
 
+    def fuse_step(self, inner_step):
+        # See llfbench.envs.llf_env.fused_step.
+        return lambda action: inner_step(self.internal_action(action))
+
+    def get_state(self):
+        """ Return the order of the actions and the state of the rng. """
+        return dict(action_table=None if self.__action_table is None else list(self.__action_table),
+                    rng=get_rng_state(self._rng))
+
+    def set_state(self, state):
+        self.__action_table = None if state['action_table'] is None else list(state['action_table'])
+        set_rng_state(self._rng, state['rng'])
+
     def internal_action(self, action):
         # map action from the external action space to the internal action space
         return self.__action_table[action]
@@ -135,26 +166,33 @@ class RandomActionOrderWrapper(gym.Wrapper):
 
 class FullInformationWrapper(gym.Wrapper):
     """
-        This wrapper assumes env supports pickle serialization.
+        Add the results of every action from the current state (the oracle
+        info) to the info of reset and step, under the key 'oracle_info'.
+
+        The env must be made by `llfbench.make`, have a Discrete action space,
+        and support `get_state`. The actions are evaluated by an OracleEngine,
+        in this process if num_workers is 0 or otherwise in a pool of
+        num_workers processes, each with a copy of the env made by `env_fn`.
     """
-    def __init__(self, env):
+    def __init__(self, env, env_fn=None, num_workers=0):
         assert isinstance(env.action_space, gym.spaces.Discrete)
         super().__init__(env)
+        self.oracle_engine = OracleEngine(env_fn, num_workers=num_workers)
 
     def oracle_info(self):
-        full_information = dict()
-        for i in range(self.env.action_space.n):
-            env = copy.deepcopy(self.env)
-            observation, reward, terminal, info = env.step(i)
-            full_information[i] = dict(
-                observation=observation,
-                reward=reward,
-                terminal=terminal,
-                feedback=info['feedback'],
-            )
-        return full_information
+        results = self.oracle_engine.evaluate(self.env, range(self.env.action_space.n))
+        return dict(enumerate(results))
+
+    def reset(self, *, seed=None, options=None):
+        observation, info = self.env.reset(seed=seed, options=options)
+        info['oracle_info'] = self.oracle_info()
+        return observation, info
 
     def step(self, action):
         observation, reward, terminated, truncated, info = self.env.step(action)
         info['oracle_info'] = self.oracle_info()
         return observation, reward, terminated, truncated, info
+
+    def close(self):
+        self.oracle_engine.close()
+        return super().close()
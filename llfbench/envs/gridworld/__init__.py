@@ -1,6 +1,4 @@
-from gymnasium.envs.registration import register
-from llfbench.envs.gridworld.gridworld import Gridworld
-from llfbench.envs.gridworld.wrapper import GridworldWrapper
+from llfbench.envs.specs import register_env
 
 
 ENVIRONMENTS = (
@@ -14,6 +12,8 @@ def make_env(env_name,
              visual=False):
     assert visual == False, "The gridworld environment has no visual observations"
     """ Make the original env and wrap it with the LLFWrapper. """
+    from llfbench.envs.gridworld.gridworld import Gridworld
+    from llfbench.envs.gridworld.wrapper import GridworldWrapper
     env = Gridworld(instruction_type=instruction_type, feedback_type=feedback_type)
     # we don't pass arguments here, because _reset in BanditGymWrapper calls __init__ of the env without arguments.
     return GridworldWrapper(env, instruction_type=instruction_type, feedback_type=feedback_type)
@@ -21,8 +21,14 @@ def make_env(env_name,
 
 for env_name in ENVIRONMENTS:
     # default version (backwards compatibility)
-    register(
+    register_env(
         id=f"llf-{env_name}",
         entry_point='llfbench.envs.gridworld:make_env',
-        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False)
+        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False),
+        family='gridworld',
+        instruction_types=('b', 'p', 'c'),
+        feedback_types=('r', 'hn', 'hp', 'fn', 'fp'),
+        reward_range=(0.0, 1.0),
+        action_space='discrete',
+        make_cost='low',
     )
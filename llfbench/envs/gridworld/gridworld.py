@@ -1,13 +1,14 @@
 import sys
-import random
 import string
 import gymnasium as gym
+from gymnasium.utils import seeding
 
 from collections import deque
 from llfbench.envs.gridworld import prompts
 from llfbench.envs.gridworld.room import Room
 from llfbench.envs.gridworld.scene import Scene
 from llfbench.envs.llf_env import Feedback
+from llfbench.envs.utils import get_rng_state, set_rng_state
 
 
 class Gridworld(gym.Env):
@@ -34,6 +35,7 @@ class Gridworld(gym.Env):
         self.reward_range = (0, 1.0)
 
         self.format = None
+        self.defer = None  # set by the wrapper, for the feedback
         self.instruction_type = instruction_type
         self.feedback_type = feedback_type
 
@@ -52,7 +54,26 @@ class Gridworld(gym.Env):
         self.goal_prev_visited = False
 
     def seed(self, seed=None):
-        random.seed(seed)
+        self._np_random, seed = seeding.np_random(seed)
+        return [seed]
+
+    def get_state(self):
+        """ Return the state of the current episode. The scene is not modified
+            after it is made, so it is referenced instead of copied. """
+        return dict(np_random=get_rng_state(self.np_random),
+                    instruction=self.instruction,
+                    current_timestep=self.current_timestep,
+                    current_scene=self.current_scene,
+                    current_room=self.current_room,
+                    goal_prev_visited=self.goal_prev_visited)
+
+    def set_state(self, state):
+        set_rng_state(self.np_random, state['np_random'])
+        self.instruction = state['instruction']
+        self.current_timestep = state['current_timestep']
+        self.current_scene = state['current_scene']
+        self.current_room = state['current_room']
+        self.goal_prev_visited = state['goal_prev_visited']
 
     def make_scene(self):
 
@@ -60,10 +81,11 @@ class Gridworld(gym.Env):
         # We start by creating a room
         # We add between 1-4 edges, we create new rooms and add them to the queue
 
+        rng = self.np_random
         scene = Scene()
         queue = deque()
 
-        room = scene.create_random_empty_room(pos=(0, 0))
+        room = scene.create_random_empty_room(pos=(0, 0), rng=rng)
         queue.append(room)
 
         available_objects = list(Room.OBJECTS)
@@ -80,14 +102,14 @@ class Gridworld(gym.Env):
                 # All directions from this room has been connected
                 continue
 
-            num_dir = random.randint(1, len(available_directions) - 1)
-            chosen_directions = random.sample(available_directions, k=num_dir)
+            num_dir = rng.integers(1, len(available_directions))
+            chosen_directions = [available_directions[i] for i in rng.choice(len(available_directions), size=num_dir, replace=False)]
 
             for i, dir_to in enumerate(chosen_directions):
 
                 # TODO Connect the new room not just to where it spawned from but also other rooms to create a graph
                 new_pos = scene.get_relative_pos(room, dir_to, length=1)
-                ngbr_room = scene.create_random_empty_room(pos=new_pos)
+                ngbr_room = scene.create_random_empty_room(pos=new_pos, rng=rng)
                 scene.add_door(room=room,
                                dir_to=dir_to,
                                other_room=ngbr_room)
@@ -97,11 +119,11 @@ class Gridworld(gym.Env):
                     break
 
         indices = list(range(0, scene.num_rooms()))
-        random.shuffle(indices)
+        rng.shuffle(indices)
 
         for i in indices:
-            if len(available_objects) > 0 and random.random() < 0.25:
-                obj = random.choice(available_objects)
+            if len(available_objects) > 0 and rng.random() < 0.25:
+                obj = available_objects[rng.integers(len(available_objects))]
                 room = scene.get_room(i)
                 room.add_object(obj=obj)
                 available_objects.remove(obj)
@@ -109,7 +131,7 @@ class Gridworld(gym.Env):
         # Add start room
         rooms = scene.get_rooms()
 
-        goal_room = random.choice(rooms)
+        goal_room = rooms[rng.integers(len(rooms))]
         goal_room.add_goal()
         scene.get_add_goal_room(goal_room=goal_room)
 
@@ -123,7 +145,7 @@ class Gridworld(gym.Env):
         if len(rooms) == 0:
             rooms = [ngbr_room for ngbr_room, path in scene.bfs_path.items() if ngbr_room != goal_room]
 
-        start_room = random.choice(rooms)
+        start_room = rooms[rng.integers(len(rooms))]
         scene.get_add_start_room(start_room=start_room)
 
         return scene
@@ -199,7 +221,7 @@ class Gridworld(gym.Env):
                                    f"room {room.get_name()} which has treasure.")
 
         if partial:
-            r = 0.4 + random.random() * 0.2
+            r = 0.4 + self.np_random.random() * 0.2
             partial_len = int(len(path_descps) * r)
             opt_path_desc = " ".join(path_descps[:partial_len])
         else:
@@ -271,12 +293,12 @@ class Gridworld(gym.Env):
         feedback = Feedback()
 
         if "r" in feedback_type:      # Reward described in text
-            feedback.r = self.format(prompts.reward_descp, reward=reward)
+            feedback.r = self.defer(prompts.reward_descp, reward=reward)
 
         if "hn" in feedback_type:     # Hindsight negative
 
             if self.goal_prev_visited:
-                feedback.hp = self.format(prompts.hn_no_op)
+                feedback.hp = self.defer(prompts.hn_no_op)
 
             else:
                 # This implies we have not reached the goal neither before or nor in this stage
@@ -286,17 +308,17 @@ class Gridworld(gym.Env):
 
                 all_wrong_directions = list(Scene.DIRECTIONS)
                 all_wrong_directions.remove(old_gold_action)
-                avoid_action = random.choice(all_wrong_directions)
+                avoid_action = all_wrong_directions[self.np_random.integers(len(all_wrong_directions))]
 
                 if avoid_action != Scene.DIRECTIONS[action]:
-                    feedback.hn = self.format(prompts.hn_success_descp, avoid_action=avoid_action)
+                    feedback.hn = self.defer(prompts.hn_success_descp, avoid_action=avoid_action)
                 else:
-                    feedback.hn = self.format(prompts.hn_fail_descp, avoid_action=avoid_action)
+                    feedback.hn = self.defer(prompts.hn_fail_descp, avoid_action=avoid_action)
 
         if "hp" in feedback_type:     # Hindsight positive
 
             if self.goal_prev_visited:
-                feedback.hp = self.format(prompts.hp_no_op)
+                feedback.hp = self.defer(prompts.hp_no_op)
 
             else:
                 # This implies we have not reached the goal neither before or nor in this stage
@@ -306,14 +328,14 @@ class Gridworld(gym.Env):
 
                 if old_gold_action != Scene.DIRECTIONS[action]:
                     # Case 1: If the agent takes an action that resulted in no transition
-                    feedback.hp = self.format(prompts.hp_fail_descp, old_gold_action=old_gold_action, room=old_room)
+                    feedback.hp = self.defer(prompts.hp_fail_descp, old_gold_action=old_gold_action, room=old_room)
                 else:
-                    feedback.hp = self.format(prompts.hp_succ_descp, old_gold_action=old_gold_action, room=old_room)
+                    feedback.hp = self.defer(prompts.hp_succ_descp, old_gold_action=old_gold_action, room=old_room)
 
         if "fn" in feedback_type:      # Future negative
 
             if reward == 1.0 or self.goal_prev_visited:
-                feedback.fn = self.format(prompts.fn_no_op)
+                feedback.fn = self.defer(prompts.fn_no_op)
 
             else:
                 # This implies we have not reached the goal neither before or nor in this stage
@@ -323,14 +345,14 @@ class Gridworld(gym.Env):
                 all_directions = list(Scene.DIRECTIONS)
                 all_directions.remove(gold_action)
 
-                avoid_action = random.choice(all_directions)
+                avoid_action = all_directions[self.np_random.integers(len(all_directions))]
 
-                feedback.fn = self.format(prompts.fn, avoid_action=avoid_action, new_room=self.current_room.get_name())
+                feedback.fn = self.defer(prompts.fn, avoid_action=avoid_action, new_room=self.current_room.get_name())
 
         if "fp" in feedback_type:      # Future positive
 
             if reward == 1.0 or self.goal_prev_visited:
-                feedback.fp = self.format(prompts.fp_no_op)
+                feedback.fp = self.defer(prompts.fp_no_op)
 
             else:
                 # This implies we have not reached the goal neither before or nor in this stage
@@ -338,6 +360,6 @@ class Gridworld(gym.Env):
 
                 gold_action = self.current_scene.get_gold_action(self.current_room)
 
-                feedback.fp = self.format(prompts.fp, gold_action=gold_action, new_room=self.current_room.get_name())
+                feedback.fp = self.defer(prompts.fp, gold_action=gold_action, new_room=self.current_room.get_name())
 
         return feedback
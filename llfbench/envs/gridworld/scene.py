@@ -1,5 +1,3 @@
-import random
-
 from collections import deque
 from llfbench.envs.gridworld.room import Room
 
@@ -55,9 +53,9 @@ class Scene:
                      for dir_to, ngbr_room in self.doors[room].items()])
         return s
 
-    def create_random_empty_room(self, pos):
+    def create_random_empty_room(self, pos, rng):
 
-        room_type = random.choice(Room.ROOM_TYPES)
+        room_type = Room.ROOM_TYPES[rng.integers(len(Room.ROOM_TYPES))]
 
         if room_type not in self.room_ctr:
             self.room_ctr[room_type] = 0
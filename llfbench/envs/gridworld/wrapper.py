@@ -21,6 +21,7 @@ class GridworldWrapper(LLFWrapper):
         super().__init__(env, instruction_type, feedback_type)
 
         self.env.format = self.format
+        self.env.defer = self.defer
         self.env.instruction_type = instruction_type
         self.env.feedback_type = feedback_type
 
@@ -30,8 +31,9 @@ class GridworldWrapper(LLFWrapper):
 
         # Reset the instruction and feedback type of the base environment based on the settings in the wrapper
         self.env.format = self.format
+        self.env.defer = self.defer
         self.env.instruction_type = self.instruction_type
-        self.env.feedback_type = self._feedback_type
+        self._request_feedback(self.env)
         return self.env.reset(seed=seed, options=options)
 
     def _step(self, action: Any) -> Tuple[Dict[str, Any], float, bool, bool,  Dict[str, Any]]:
@@ -41,9 +43,16 @@ class GridworldWrapper(LLFWrapper):
 
         # Reset the instruction and feedback type of the base environment based on the settings in the wrapper
         self.env.format = self.format
+        self.env.defer = self.defer
         self.env.instruction_type = self.instruction_type
-        self.env.feedback_type = self._feedback_type
-        return self.env.step(action)
+        self._request_feedback(self.env)
+        return self._env_step(action)
+
+    def _get_env_state(self):
+        return self.env.get_state()
+
+    def _set_env_state(self, state):
+        self.env.set_state(state)
 
     @property
     def reward_range(self):
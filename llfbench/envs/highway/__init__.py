@@ -1,7 +1,5 @@
 import gymnasium as gym
-from gymnasium.envs.registration import register
-from llfbench.utils import generate_combinations_dict
-from llfbench.envs.highway.wrapper import HighwayWrapper
+from llfbench.envs.specs import register_env
 
 ENVIRONMENTS = (
     'parking-v0',
@@ -14,13 +12,22 @@ def make_env(env_name,
              visual=False):
     assert visual == False, "The highway environment has no visual observations"
     """ Make the original env and wrap it with the LLFWrapper. """
+    import highway_env  # this is needed so that highway_env is registered
+    from llfbench.envs.highway.wrapper import HighwayWrapper
     env = gym.make(env_name)
     return HighwayWrapper(env, instruction_type=instruction_type, feedback_type=feedback_type)
 
 for env_name in ENVIRONMENTS:
     # default version (backwards compatibility)
-    register(
+    register_env(
         id=f"llf-highway-{env_name}",
         entry_point='llfbench.envs.highway:make_env',
-        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False)
+        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False),
+        family='highway',
+        instruction_types=('b',),
+        feedback_types=('r', 'hp', 'hn'),
+        reward_range=(-6, 0.0),  # for the default config (collision_reward=-5, controlled_vehicles=1)
+        action_space='box',
+        make_cost='low',
+        requires=('highway_env',),
     )
\ No newline at end of file
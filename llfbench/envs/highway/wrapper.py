@@ -30,19 +30,19 @@ class HighwayWrapper(LLFWrapper):
 
     def _step(self, action):
         #processed_action = self.extract_action(action)
-        observation, reward, terminated, truncated, info = self.env.step(action)
+        observation, reward, terminated, truncated, info = self._env_step(action)
         reward = float(reward)
         feedback = Feedback()
         feedback_type = self._feedback_type
         if 'r' in feedback_type: # reward feedback
-            feedback.r = self.format(r_feedback, reward=reward) # base reward feedback
+            feedback.r = self.defer(r_feedback, reward=reward) # base reward feedback
         if 'hp' in feedback_type: # hindsight positive: explanation on why something is correct
             if reward >= -self.env.config["success_goal_reward"]:
-                feedback.hp = self.format(hp_feedback)
+                feedback.hp = self.defer(hp_feedback)
         if 'hn' in feedback_type:  # hindsight negative: explanation on why something is incorrect
             crashed = any(vehicle.crashed for vehicle in self.env.controlled_vehicles)
             if crashed:
-                feedback.hn = self.format(hn_feedback)
+                feedback.hn = self.defer(hn_feedback)
         text_observation = self.textualize_observation(observation)
         return_observation = dict(instruction=None, observation=observation, feedback=feedback)
 
@@ -1,9 +1,13 @@
 import gymnasium as gym
 import numpy as np
 from typing import Dict, Any, Tuple, Union, List, Callable, Set
-from llfbench.envs.utils import format
-import parse
+from llfbench.envs.utils import format, defer, DeferredText, get_rng_state, set_rng_state
+from llfbench.envs.templates import compile_template, TemplateSet
+from llfbench.envs.timing import TIMER
 import sys, string
+import asyncio
+import functools
+import copy
 
 """
 
@@ -29,40 +33,113 @@ An example env name is: gridworld-b-fn-v0
 
 """
 
-from dataclasses import dataclass, asdict
+def _feedback_field(name: str) -> property:
+    slot = '_' + name
+
+    def get(self) -> Union[str, None]:
+        value = getattr(self, slot)
+        return value.render() if type(value) is DeferredText else value
+
+    def set(self, value: Union[str, DeferredText, None]):
+        setattr(self, slot, value)
+
+    return property(get, set, doc=f'The {name} feedback, rendered if it is deferred.')
+
 
-@dataclass
 class Feedback:
-    r: Union[str,None] = None
-    hp: Union[str,None] = None
-    hn: Union[str,None] = None
-    fp: Union[str,None] = None
-    fn: Union[str,None] = None
+    """ The didactic feedback of a step, one field per feedback type.
+
+        A field is None, a string, or a DeferredText (see `LLFWrapper.defer`)
+        which is rendered when the field is read. `structured` returns the
+        fields without rendering them.
+    """
+
+    FIELDS = ('r', 'hp', 'hn', 'fp', 'fn')
+
+    __slots__ = ('_r', '_hp', '_hn', '_fp', '_fn')
+
+    r = _feedback_field('r')
+    hp = _feedback_field('hp')
+    hn = _feedback_field('hn')
+    fp = _feedback_field('fp')
+    fn = _feedback_field('fn')
 
     def __init__(self, r=None, hp=None, hn=None, fp=None, fn=None):
-        self.r = r
-        self.hp = hp
-        self.hn = hn
-        self.fp = fp
-        self.fn = fn
+        self._r = r
+        self._hp = hp
+        self._hn = hn
+        self._fp = fp
+        self._fn = fn
 
     def asdict(self):
         """
         get a python dictionary
         """
-        return asdict(self)
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def structured(self) -> List[Dict[str, Any]]:
+        """ The fields which are not None, without rendering them.
+
+            A deferred field is dict(type, template, args), where the template
+            identifies the paraphrase and args are its format arguments. A
+            field given as a string is dict(type, template=None, args=None, text).
+        """
+        fields = []
+        for k in self.FIELDS:
+            value = getattr(self, '_' + k)
+            if type(value) is DeferredText:
+                fields.append(dict(type=k, template=value.template, args=dict(value.kwargs)))
+            elif value is not None:
+                fields.append(dict(type=k, template=None, args=None, text=value))
+        return fields
 
     def __setitem__(self, k, v):
         setattr(self, k, v)
 
     def __getitem__(self, k):
-        return eval(f"self.{k}")
+        assert k in self.FIELDS, f'{k} is not a feedback type.'
+        return getattr(self, k)
 
     def __delitem__(self, k):
         self[k] = None
 
     def __contains__(self, item):
-        return item in self.__dict__
+        return item in self.FIELDS
+
+    def __eq__(self, other):
+        if not isinstance(other, Feedback):
+            return NotImplemented
+        return self.asdict() == other.asdict()
+
+    def __repr__(self):
+        return 'Feedback(' + ', '.join(f'{k}={v!r}' for k, v in self.asdict().items()) + ')'
+
+def fused_step(env: gym.Env) -> Callable[[Any], Tuple[Any, float, bool, bool, Dict[str, Any]]]:
+    """ Return a function that steps `env` like `env.step`, with the chain of
+        wrappers under it resolved once. A step then calls the base env
+        directly, instead of going through the `step` and attribute lookups
+        of every wrapper.
+
+        A wrapper takes part by implementing `fuse_step(inner_step)`, which
+        returns its step given the fused step of the env it wraps. The chain
+        is resolved down to the first env which does not implement it.
+    """
+    fuse_step = getattr(type(env), 'fuse_step', None)
+    if fuse_step is None:
+        return env.step
+    return fuse_step(env, fused_step(env.env))
+
+def _copy_containers(value: Any) -> Any:
+    """ Copy the dicts, tuples and Feedback objects in a result of `_env_step`
+        (which `_step` may change, e.g. by deleting info['feedback']), but not
+        the other objects in them. """
+    if type(value) is dict:
+        return {k: _copy_containers(v) for k, v in value.items()}
+    if type(value) is tuple:
+        return tuple(_copy_containers(v) for v in value)
+    if type(value) is Feedback:
+        return Feedback(*(getattr(value, '_' + k) for k in Feedback.FIELDS))
+    return value
 
 class LLFWrapper(gym.Wrapper):
     """
@@ -95,7 +172,9 @@ class LLFWrapper(gym.Wrapper):
 
         Implment methods (_reset and _step) and update the supported
         INSTRUCTION_TYPES and FEEDBACK_TYPES. See the convension above for the
-        explnation of these types.
+        explnation of these types. In _step, step the wrapped env with
+        _env_step. Optionally implement _get_env_state and _set_env_state to
+        make get_state and set_state cheap.
     """
 
     # These are the instruction and feedback types that are supported by this environment.
@@ -108,6 +187,11 @@ class LLFWrapper(gym.Wrapper):
     # fp: future positive
     # fn: future negative
 
+    # Whether reset and step block for long (heavy simulation or I/O). If so,
+    # `AsyncWrapper.areset` and `astep` run them in an executor instead of the
+    # event loop.
+    BLOCKING = False
+
     def __init__(self, env: gym.Env, instruction_type: str, feedback_type: Union[str, Set[str], List[str], Tuple[str]]):
         """
             Initialize the wrapper.
@@ -129,6 +213,12 @@ class LLFWrapper(gym.Wrapper):
         self.set_instruction_type(instruction_type) # This is the external api.
         self.set_feedback_type(feedback_type)  # This is the external api.
         self.set_paraphrase_method('random')
+        self._rng = np.random.default_rng()  # for paraphrasing and sampling feedback types; seeded by reset.
+        self.set_verbalize(True)
+        self.set_fanout(None)
+        self._fanout_steps = None  # see _fanout_step
+        self._requested_feedback = None  # see _request_feedback
+        self._fused_env, self._fused_env_step = None, None  # see _env_step
         self.observation_space = gym.spaces.Dict({"observation": self.env.observation_space,
                                                   "feedback": gym.spaces.Text(sys.maxsize, charset=string.printable),
                                                   "instruction": gym.spaces.Text(sys.maxsize, charset=string.printable)})
@@ -188,13 +278,26 @@ class LLFWrapper(gym.Wrapper):
         if feedback_type == 'a': # using auto
             feedback_type = set(self.FEEDBACK_TYPES)  # need to compute all
         if feedback_type == 'm': # using mixture  # TODO a better name
-            feedback_type = set([np.random.choice(list(set(self.FEEDBACK_TYPES)))])  # str
+            # sample from the tuple (not a set) so the result does not depend on the hash seed of the process.
+            feedback_type = set([self.FEEDBACK_TYPES[self._rng.integers(len(self.FEEDBACK_TYPES))]])  # str
         assert isinstance(feedback_type, set), 'internal feedback_type must be a set.'
         # At this point, it should be a subset of FEEDBACK_TYPES.
         for f in feedback_type:
             assert f in self.FEEDBACK_TYPES, f'Feedback type {f} is not supported.'
         return feedback_type
 
+    def _request_feedback(self, env: Any) -> Set[str]:
+        """ Sample the feedback types of the current step and set them as
+            `env.feedback_type`, so that an env which computes the feedback
+            computes only the requested types.
+
+            Call this once per step and use the returned set in the rest of
+            _step: each read of self._feedback_type samples anew under 'm'.
+        """
+        feedback_type = self._feedback_type
+        env.feedback_type = self._requested_feedback = feedback_type
+        return feedback_type
+
     @property
     def paraphrase_method(self) -> Union[None, int]:
         return self._paraphrase_method
@@ -214,10 +317,25 @@ class LLFWrapper(gym.Wrapper):
 
     def format(self, prompts: List[str], **kwargs) -> str:
         """ A helper method for selecting from a set of paraphrased prompts."""
+        if TIMER.enabled:
+            return self._timed('paraphrase', self._format, prompts, **kwargs)
+        return self._format(prompts, **kwargs)
+
+    def _format(self, prompts: List[str], **kwargs) -> str:
         if callable(self.paraphrase_method):
             return self.paraphrase_method(prompts, **kwargs)  # This essentially overrides `format` method.
         else:
-            return format(prompts, self.paraphrase_method, **kwargs)
+            return format(prompts, self.paraphrase_method, rng=self._rng, **kwargs)
+
+    def defer(self, prompts: List[str], **kwargs) -> Union[DeferredText, str]:
+        """ The same as `format`, but the selected prompt is formatted only when
+            it is read. Use this for the fields of a Feedback, which may never
+            be rendered (e.g. when only their structured form is used). """
+        if callable(self.paraphrase_method):
+            return self.format(prompts, **kwargs)  # the callable formats the text itself
+        if TIMER.enabled:
+            return self._timed('paraphrase', defer, prompts, self.paraphrase_method, self._rng, **kwargs)
+        return defer(prompts, self.paraphrase_method, rng=self._rng, **kwargs)
 
     def reformat(self, original: Union[str, None], prompts: List[str], template=None) -> str:
         """ A helper method for reformatting a string using a template.
@@ -245,15 +363,22 @@ class LLFWrapper(gym.Wrapper):
         """
         if original is None:
             return original
-        template = template or prompts[0]
-        parsed = parse.search(template, original)
-        if parsed is None:
-            paraphrased = original
-        else:
-            old = template.format(**parsed.named)
-            new = self.format(prompts, **parsed.named)
-            paraphrased = original.replace(old, new)
-        return paraphrased
+        template = compile_template(template or prompts[0])  # compiled once per template
+        if TIMER.enabled:
+            return self._timed('paraphrase', template.reformat, original, prompts, self.format)
+        return template.reformat(original, prompts, self.format)
+
+    def reformat_all(self, original: Union[str, None], templates: TemplateSet) -> str:
+        """ Reformat a string with a set of templates in a single regex pass.
+
+            This is the same as calling `reformat` with each (template, prompts)
+            in `templates` one after another, provided that the templates
+            cannot both match (e.g. the positive and the negative versions of
+            a reward feedback).
+        """
+        if TIMER.enabled:
+            return self._timed('paraphrase', templates.reformat, original, self.format)
+        return templates.reformat(original, self.format)
 
     def obs_check(self, observation: Dict[str, Any]):
         """ This is a sanity check for the observation dict."""
@@ -265,7 +390,7 @@ class LLFWrapper(gym.Wrapper):
     def reset(self, *, seed : Union[int,None] = None, options : Union[Dict[str, Any],None] = None) -> Tuple[Union[str, Dict[str, str]], Dict[str, Any]]:
         """ Reset the environment and return the initial observation."""
         if seed is not None:
-            np.random.seed(seed)  # for paraphrasing
+            self._rng = np.random.default_rng(seed)  # each env has its own random stream.
         observation, info = self._reset(seed=seed, options=options)
         self.obs_check(observation)
         assert observation['feedback'] is None, "The feedback must be None in the initial observation."
@@ -273,6 +398,69 @@ class LLFWrapper(gym.Wrapper):
         assert info['success'] is False, "The info['success'] must be False in the initial observation."
         return observation, info
 
+    def get_state(self) -> Dict[str, Any]:
+        """ Return a snapshot of the env, which can be restored by `set_state`.
+
+            This lets an agent branch from the same state (e.g. to evaluate
+            counterfactual actions or to run a tree search) without copying the
+            whole env. The snapshot covers this wrapper and the envs it wraps;
+            wrappers applied on top of it (e.g. TimeLimit) are not included.
+        """
+        return dict(rng=get_rng_state(self._rng), env=self._get_env_state())
+
+    def set_state(self, state: Dict[str, Any]):
+        """ Restore a snapshot returned by `get_state`. The same snapshot can be
+            restored any number of times. """
+        set_rng_state(self._rng, state['rng'])
+        self._set_env_state(state['env'])
+
+    def _get_env_state(self) -> Any:
+        """ Return the state of the wrapped env. Override this in the subclass
+            to return a compact state (e.g. the counters of the current episode)
+            instead of a copy of the whole env. """
+        return copy.deepcopy(self.env)
+
+    def _set_env_state(self, state: Any):
+        """ Restore the state returned by `_get_env_state`. """
+        self.env = copy.deepcopy(state)  # copy, so that the state can be restored again.
+
+    def set_verbalize(self, verbalize: bool):
+        """ Whether `step` returns the feedback as a string (the default) or
+            as the Feedback object, whose deferred fields are rendered only if
+            they are read. The latter is for pipelines which use the
+            structured form of the feedback (`Feedback.structured`) and may
+            never need the text. """
+        self._verbalize = verbalize
+
+    def set_fanout(self, configs: Union[List[Dict[str, Any]], None]):
+        """ Render the feedback of each step under several configurations.
+
+            Args:
+                configs: A list of dicts with the keys 'feedback_type' and
+                'paraphrase_method' (see `set_feedback_type` and
+                `set_paraphrase_method`); a missing key takes the setting of
+                this wrapper. None turns the fan-out off.
+
+            When on, `step` steps the wrapped env once, computing all the
+            feedback types, and observation['feedback'] is a tuple with the
+            feedback of each config, as if the step had been taken under
+            that config. See `_fanout_step`.
+        """
+        if configs is None:
+            self._fanout = None
+            return
+        feedback_type, paraphrase_method = self.feedback_type, self.paraphrase_method
+        fanout = []
+        try:
+            for config in configs:  # validated by the setters
+                self.set_feedback_type(config.get('feedback_type', feedback_type))
+                self.set_paraphrase_method(config.get('paraphrase_method', paraphrase_method))
+                fanout.append((self.feedback_type, self.paraphrase_method))
+        finally:
+            self.set_feedback_type(feedback_type)
+            self.set_paraphrase_method(paraphrase_method)
+        self._fanout = tuple(fanout)
+
     def _reset(self, *, seed : Union[int,None] = None, options : Union[Dict[str, Any],None] = None) -> Tuple[Union[str, Dict[str, str]], Dict[str, Any]]:
         """ Implement this in the subclass.
 
@@ -287,13 +475,149 @@ class LLFWrapper(gym.Wrapper):
 
     def step(self, action: Any) -> Tuple[Dict[str, Any], float, bool, bool,  Dict[str, Any]]:
         """ Step the environment and return the observation, reward, terminal, and info."""
+        if self._fanout is not None:
+            return self._fanout_step(action)
+        if TIMER.enabled:
+            return self._timed_step(action)
         observation, reward, terminal, truncated, info = self._step(action)
         self.obs_check(observation)
-        if observation['feedback'] is not None:
+        if observation['feedback'] is not None and self._verbalize:
             observation['feedback'] = self._verbalize_feedback(observation['feedback'])
         assert 'success' in info, "The info must contain a key 'success'."
         return observation, reward, terminal, truncated, info
 
+    def _timed(self, stage: str, fn: Callable, *args, **kwargs):
+        TIMER.start(stage)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            TIMER.stop()
+
+    def _timed_step(self, action: Any) -> Tuple[Dict[str, Any], float, bool, bool,  Dict[str, Any]]:
+        """ `step` with the time of each stage (see llfbench.envs.timing) in info['timing']. """
+        outer = TIMER.start_step()
+        try:
+            observation, reward, terminal, truncated, info = self._timed('feedback', self._step, action)
+            self._timed('obs_check', self.obs_check, observation)
+            if observation['feedback'] is not None and self._verbalize:
+                observation['feedback'] = self._timed('verbalize', self._verbalize_feedback, observation['feedback'])
+        finally:
+            timing = TIMER.stop_step(type(self).__name__, outer)
+        assert 'success' in info, "The info must contain a key 'success'."
+        info['timing'] = timing
+        return observation, reward, terminal, truncated, info
+
+    def _env_step(self, action: Any) -> Tuple[Any, float, bool, bool, Dict[str, Any]]:
+        """ Step the wrapped env. Use this in `_step`, so that the time of the
+            wrapped env is told apart from the time of computing the feedback.
+
+            The wrapped env is stepped through `fused_step`, which is resolved
+            again whenever self.env is replaced (e.g. by _set_env_state).
+        """
+        if self._fanout_steps is not None:
+            return self._fanout_steps(action)
+        if self._fused_env is not self.env:
+            self._fused_env, self._fused_env_step = self.env, fused_step(self.env)
+        if TIMER.enabled:
+            return self._timed('env_step', self._fused_env_step, action)
+        return self._fused_env_step(action)
+
+    def _fanout_step(self, action: Any) -> Tuple[Dict[str, Any], float, bool, bool,  Dict[str, Any]]:
+        """ `step` under each config of `set_fanout`, stepping the wrapped env once.
+
+            `_step` is run once with all the feedback types, which steps the
+            wrapped env, and the results of `_env_step` are recorded. Then,
+            for each config, this wrapper and its rng are restored to their
+            state before the step, and `_step` is run again with the feedback
+            type and the paraphrase method of the config, with `_env_step`
+            returning copies of the recorded results. So only the feedback is
+            computed again. Wrappers whose `_step` changes their attributes in
+            place (instead of assigning them), or changes the results of
+            `_env_step` other than their dicts, tuples and Feedback objects,
+            do not support this.
+
+            When the feedback is computed by the wrapped env (see
+            `_request_feedback`), it is computed with all the types: its
+            fields are then limited to the types requested by the config, and
+            its deferred fields are paraphrased again under the config.
+
+            The observation, reward, terminal, truncated and info are those of
+            the first run; so is the rng after the step, which is why a config
+            may not give the same feedback as running the trajectory under it
+            (e.g. the feedback types sampled by 'm').
+        """
+        feedback_type, paraphrase_method = self.feedback_type, self.paraphrase_method
+        before, rng_state = vars(self).copy(), get_rng_state(self._rng)
+        recorded = []
+
+        def record(action):
+            self._fanout_steps = None
+            try:
+                result = self._env_step(action)
+            finally:
+                self._fanout_steps = record
+            recorded.append(_copy_containers(result))
+            return result
+
+        try:
+            self.set_feedback_type('a')
+            self._fanout_steps = record
+            observation, reward, terminal, truncated, info = self._step(action)
+            self._fanout_steps = None
+            after, rng_after = vars(self).copy(), get_rng_state(self._rng)
+
+            feedbacks = []
+            for config_feedback_type, config_paraphrase_method in self._fanout:
+                vars(self).update(before)
+                set_rng_state(self._rng, rng_state)
+                self.set_feedback_type(config_feedback_type)
+                self.set_paraphrase_method(config_paraphrase_method)
+                replayed = iter([_copy_containers(result) for result in recorded])
+                self._fanout_steps = lambda action: next(replayed)
+                self._requested_feedback = None
+                config_observation = self._step(action)[0]
+                self._fanout_steps = None
+                self.obs_check(config_observation)
+                feedback = config_observation['feedback']
+                if feedback is not None and self._requested_feedback is not None:
+                    feedback = self._limit_feedback(feedback, self._requested_feedback)
+                if feedback is not None and self._verbalize:
+                    feedback = self._verbalize_feedback(feedback)
+                feedbacks.append(feedback)
+
+            vars(self).update(after)
+            set_rng_state(self._rng, rng_after)
+        finally:
+            self._fanout_steps = None
+            self.set_feedback_type(feedback_type)
+            self.set_paraphrase_method(paraphrase_method)
+        self.obs_check(observation)
+        observation['feedback'] = tuple(feedbacks)
+        assert 'success' in info, "The info must contain a key 'success'."
+        return observation, reward, terminal, truncated, info
+
+    def _limit_feedback(self, feedback: Feedback, feedback_type: Set[str]) -> Feedback:
+        """ The fields of `feedback` in `feedback_type`, with the deferred ones
+            paraphrased again with the current paraphrase method. """
+        limited = Feedback()
+        for k in Feedback.FIELDS:
+            if k not in feedback_type:
+                continue
+            value = getattr(feedback, '_' + k)
+            if type(value) is DeferredText:
+                if callable(self.paraphrase_method):
+                    value = self.paraphrase_method(value.prompts, **value.kwargs)
+                else:
+                    value = defer(value.prompts, self.paraphrase_method, rng=self._rng, **value.kwargs)
+            limited[k] = value
+        return limited
+
+    def __getstate__(self):
+        # The fused step refers to the wrapped env, so a copy resolves its own.
+        state = vars(self).copy()
+        state['_fused_env'], state['_fused_env_step'] = None, None
+        return state
+
     def _step(self, action: Any) -> Tuple[Union[str, Dict[str, Any]], float, bool, bool, Dict[str, Any]]:
         """ Implement this in the subclass.
             Use self._feedback_type (which is a set) to determine the feedback.
@@ -317,18 +641,50 @@ class LLFWrapper(gym.Wrapper):
     def _verbalize_feedback(self, feedback_dict: Feedback) -> str:
         """ Implement this in the subclass to get the desired feedback string.
         """
-
-        feedback = []
-        for k, v in feedback_dict.asdict().items():
+        # Each feedback is followed by a space, unless it ends with a new line.
+        paragraph = []
+        for v in feedback_dict.asdict().values():
             if v is not None:
-                feedback.append(f'{str(v)}')
-
-        paragraph = ""
-        for f in feedback:
-            if f[-1] == '\n':
-                paragraph += f
-            else:
-                paragraph += f + ' '
-        paragraph = paragraph[:-1]
-        # return ' '.join(feedback)
-        return paragraph
+                v = str(v)
+                paragraph.append(v if v[-1:] == '\n' else v + ' ')
+        return ''.join(paragraph)[:-1]
+
+
+class AsyncWrapper(gym.Wrapper):
+    """ The outermost wrapper of the envs made by `llfbench.make`, which adds
+        the coroutines `areset` and `astep`.
+
+        They reset and step the whole chain of wrappers below it (e.g.
+        TimeLimit, OrderEnforcing and PassiveEnvChecker). Cheap envs are
+        stepped directly in the event loop. BLOCKING envs are stepped in the
+        executor, so that one event loop can keep many episodes in flight
+        without a thread per env.
+    """
+
+    def __init__(self, env: gym.Env, executor=None):
+        super().__init__(env)
+        llf_env = env
+        while not isinstance(llf_env, LLFWrapper):
+            llf_env = llf_env.env
+        self.blocking = llf_env.BLOCKING
+        self.set_executor(executor)
+
+    def set_executor(self, executor):
+        """ Set the executor used by `areset` and `astep` for BLOCKING envs.
+            None means the default executor of the running event loop.
+        """
+        self._executor = executor
+
+    async def _run_async(self, fn):
+        if not self.blocking:
+            return fn()  # cheap envs run inline in the event loop.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn)
+
+    async def areset(self, *, seed : Union[int,None] = None, options : Union[Dict[str, Any],None] = None) -> Tuple[Union[str, Dict[str, str]], Dict[str, Any]]:
+        """ The coroutine version of `reset`. """
+        return await self._run_async(functools.partial(self.env.reset, seed=seed, options=options))
+
+    async def astep(self, action: Any) -> Tuple[Dict[str, Any], float, bool, bool,  Dict[str, Any]]:
+        """ The coroutine version of `step`. """
+        return await self._run_async(functools.partial(self.env.step, action))
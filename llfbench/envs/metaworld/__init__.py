@@ -1,17 +1,62 @@
 import gymnasium as gym
-from gymnasium.envs.registration import register
-from llfbench.utils import generate_combinations_dict
-from llfbench.envs.metaworld.wrapper import MetaworldWrapper
-from collections import defaultdict
-import importlib
-import metaworld
-import random
-import time
+from llfbench.envs.specs import register_env
 from gymnasium.wrappers import TimeLimit
 import numpy as np
 
-BENCHMARK = metaworld.MT1
-ENVIRONMENTS = tuple(BENCHMARK.ENV_NAMES)
+# The env names of metaworld.MT1 (i.e. the v2 envs), listed here so that
+# registering them does not import metaworld.
+ENVIRONMENTS = (
+    'assembly-v2',
+    'basketball-v2',
+    'bin-picking-v2',
+    'box-close-v2',
+    'button-press-topdown-v2',
+    'button-press-topdown-wall-v2',
+    'button-press-v2',
+    'button-press-wall-v2',
+    'coffee-button-v2',
+    'coffee-pull-v2',
+    'coffee-push-v2',
+    'dial-turn-v2',
+    'disassemble-v2',
+    'door-close-v2',
+    'door-lock-v2',
+    'door-open-v2',
+    'door-unlock-v2',
+    'hand-insert-v2',
+    'drawer-close-v2',
+    'drawer-open-v2',
+    'faucet-open-v2',
+    'faucet-close-v2',
+    'hammer-v2',
+    'handle-press-side-v2',
+    'handle-press-v2',
+    'handle-pull-side-v2',
+    'handle-pull-v2',
+    'lever-pull-v2',
+    'pick-place-wall-v2',
+    'pick-out-of-hole-v2',
+    'pick-place-v2',
+    'plate-slide-v2',
+    'plate-slide-side-v2',
+    'plate-slide-back-v2',
+    'plate-slide-back-side-v2',
+    'peg-insert-side-v2',
+    'peg-unplug-side-v2',
+    'soccer-v2',
+    'stick-push-v2',
+    'stick-pull-v2',
+    'push-v2',
+    'push-wall-v2',
+    'push-back-v2',
+    'reach-v2',
+    'reach-wall-v2',
+    'shelf-place-v2',
+    'sweep-into-v2',
+    'sweep-v2',
+    'window-open-v2',
+    'window-close-v2',
+)
 #VISUAL = '-visual'
 
 def make_env(env_name,
@@ -21,7 +66,10 @@ def make_env(env_name,
              ):
 
     """ Make the original env and wrap it with the LLFWrapper. """
-    benchmark = BENCHMARK(env_name)
+    import metaworld
+    from llfbench.envs.metaworld.wrapper import MetaworldWrapper
+    assert env_name in metaworld.MT1.ENV_NAMES, f"{env_name} is not an env of metaworld.MT1 in the installed metaworld."
+    benchmark = metaworld.MT1(env_name)
     env = benchmark.train_classes[env_name](render_mode=None) #'rgb_array')
     env.camera_name = 'corner2'
     class Wrapper(gym.Wrapper):
@@ -32,6 +80,7 @@ def make_env(env_name,
             self.env.max_path_length = float('inf')
             # We remove the internal time limit. We will redefine the time limit in the wrapper.
             self._render_video = False
+            self._rng = np.random.default_rng()  # for sampling the task
             self.visual = visual
             if visual:
                 self.env.render_mode = 'rgb_array'
@@ -46,9 +95,8 @@ def make_env(env_name,
             return env_name
         def reset(self, *, seed=None, options=None):
             if seed is not None:
-                random.seed(seed)
-                np.random.seed(seed)
-            task = random.choice(benchmark.train_tasks)
+                self._rng = np.random.default_rng(seed)
+            task = benchmark.train_tasks[self._rng.integers(len(benchmark.train_tasks))]
             self.env.set_task(task)
             return self.env.reset(seed=seed, options=options)
     env = Wrapper(env)
@@ -57,8 +105,15 @@ def make_env(env_name,
 
 for env_name in ENVIRONMENTS:
     # default version (backward compatibility)
-    register(
+    register_env(
         id=f"llf-metaworld-{env_name}",
         entry_point='llfbench.envs.metaworld:make_env',
-        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False)
+        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False),
+        family='metaworld',
+        instruction_types=('b',),
+        feedback_types=('r', 'hp', 'hn', 'fp'),
+        reward_range=(0, 10),
+        action_space='box',
+        make_cost='high',  # builds the MT1 benchmark and the MuJoCo simulation
+        requires=('metaworld',),
     )
@@ -5,6 +5,7 @@ from llfbench.envs.metaworld.prompts import *
 from llfbench.envs.metaworld.gains import P_GAINS
 import metaworld
 import importlib
+import copy
 import json
 from textwrap import dedent, indent
 from metaworld.policies.policy import move
@@ -18,6 +19,7 @@ class MetaworldWrapper(LLFWrapper):
 
     INSTRUCTION_TYPES = ('b') #('b', 'p', 'c')
     FEEDBACK_TYPES = ('r', 'hp', 'hn', 'fp')
+    BLOCKING = True  # P-control runs many MuJoCo steps per step
 
     def __init__(self, env, instruction_type, feedback_type):
         super().__init__(env, instruction_type, feedback_type)
@@ -139,7 +141,7 @@ class MetaworldWrapper(LLFWrapper):
         video = []
         for _ in range(self.p_control_time_out):
             control = self.p_control(action)  # this controls the hand to move an absolute position
-            observation, reward, terminated, truncated, info = self.env.step(control)
+            observation, reward, terminated, truncated, info = self._env_step(control)
             self._current_observation = observation
             desired_pos = action[:3]
             video.append(self.env.render()[::-1] if self.env._render_video else None)
@@ -147,25 +149,27 @@ class MetaworldWrapper(LLFWrapper):
                 break
 
         feedback_type = self._feedback_type
-        # Some pre-computation of the feedback
-        expert_action = self.expert_action  # absolute or relative
-        # Target pos is in absolute position
-        if self.control_relative_position:
-            target_pos = expert_action.copy()
-            target_pos[:3] += self._current_pos
-        else:
-            target_pos = expert_action
-        moving_away = np.linalg.norm(target_pos[:3]-previous_pos) < np.linalg.norm(target_pos[:3]-self._current_pos)
-        if target_pos[3] > 0.5 and action[3] < 0.5:  # the gripper should be closed instead.
-            gripper_feedback = self.format(close_gripper_feedback)
-        elif target_pos[3] < 0.5 and action[3] > 0.5:  #the gripper should be open instead.
-            gripper_feedback = self.format(open_gripper_feedback)
-        else:
-            gripper_feedback = None
+        # Some pre-computation of the feedback, only for the types that need it
+        if {'hp', 'hn', 'fp'} & feedback_type:
+            expert_action = self.expert_action  # absolute or relative
+            # Target pos is in absolute position
+            if self.control_relative_position:
+                target_pos = expert_action.copy()
+                target_pos[:3] += self._current_pos
+            else:
+                target_pos = expert_action
+        if {'hp', 'hn'} & feedback_type:
+            moving_away = np.linalg.norm(target_pos[:3]-previous_pos) < np.linalg.norm(target_pos[:3]-self._current_pos)
+            if target_pos[3] > 0.5 and action[3] < 0.5:  # the gripper should be closed instead.
+                gripper_feedback = self.format(close_gripper_feedback)
+            elif target_pos[3] < 0.5 and action[3] > 0.5:  #the gripper should be open instead.
+                gripper_feedback = self.format(open_gripper_feedback)
+            else:
+                gripper_feedback = None
         # Compute feedback
         feedback = Feedback()
         if 'r' in  feedback_type:
-            feedback.r = self.format(r_feedback, reward=reward)
+            feedback.r = self.defer(r_feedback, reward=reward)
         if 'hp' in feedback_type:  # moved closer to the expert goal
             _feedback = self.format(hp_feedback) if not moving_away else None
             if gripper_feedback is not None:
@@ -185,7 +189,7 @@ class MetaworldWrapper(LLFWrapper):
                     _feedback = gripper_feedback
             feedback.hn = _feedback
         if 'fp' in feedback_type:  # suggest the expert goal
-            feedback.fp = self.format(fp_feedback, expert_action=self.textualize_expert_action(target_pos))
+            feedback.fp = self.defer(fp_feedback, expert_action=self.textualize_expert_action(target_pos))
         observation = self._format_obs(observation)
         info['success'] = bool(info['success'])
         info['video'] = video if self.env._render_video else None
@@ -201,6 +205,24 @@ class MetaworldWrapper(LLFWrapper):
         info['video'] = [self.env.render()[::-1]] if self.env._render_video else None
         return dict(instruction=instruction, observation=observation, feedback=None), info
 
+    # The attributes of the MuJoCo env that change in an episode, besides the
+    # simulation state. Not every env of metaworld has all of them.
+    _MW_STATE_ATTRIBUTES = ('curr_path_length', '_last_stable_obs', '_prev_obs', '_target_pos')
+
+    def _get_env_state(self):
+        # qpos, qvel and the mocap pose instead of a copy of the MuJoCo model.
+        attributes = {name: copy.deepcopy(getattr(self.mw_env, name))
+                      for name in self._MW_STATE_ATTRIBUTES if hasattr(self.mw_env, name)}
+        return dict(sim=copy.deepcopy(self.mw_env.get_env_state()),
+                    attributes=attributes,
+                    current_observation=copy.deepcopy(self._current_observation))
+
+    def _set_env_state(self, state):
+        self.mw_env.set_env_state(state['sim'])
+        for name, value in state['attributes'].items():
+            setattr(self.mw_env, name, copy.deepcopy(value))
+        self._current_observation = copy.deepcopy(state['current_observation'])
+
     def _format_obs(self, observation):
         text = self.textualize_observation(observation)
         image = (self.env.render()[::-1] if self.env.visual else None)
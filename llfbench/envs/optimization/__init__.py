@@ -1,6 +1,4 @@
-import numpy as np
-from gymnasium.envs.registration import register
-from llfbench.envs.optimization.wrapper import LossLandscapeGymWrapper
+from llfbench.envs.specs import register_env
 
 ENVIRONMENTS = (
     'Booth',
@@ -14,6 +12,18 @@ ENVIRONMENTS = (
     'ThreeHumpCamel'
 )
 
+# The reward ranges of the loss functions over their domains.
+REWARD_RANGES = {
+    'Booth': (-2594.0, 0.0),
+    'McCormick': (-44.098473, 1.9133),
+    'Rosenbrock': (-11106.0, 0.0),
+    'SixHumpCamel': (-55.733333333333334, 1.0316),
+    'Bohachevsky': (-29999.998, 0.0),
+    'RotatedHyperEllipsoid': (-12884.901888, 0.0),
+    'Matyas': (-100.0, 0.0),
+    'ThreeHumpCamel': (-2047.9166666666665, 0.0),
+}
+
 def make_env(env_name,
              instruction_type='b',
              feedback_type='r',
@@ -22,13 +32,21 @@ def make_env(env_name,
     assert visual == False, "optimization environments have no visual observations"
     """ Make the original env and wrap it with the LLFWrapper. """
     import importlib
+    from llfbench.envs.optimization.wrapper import LossLandscapeGymWrapper
     LossCls = getattr(importlib.import_module("llfbench.envs.optimization.loss_descent"), env_name)
     env = LossCls(**kwargs)  # `feedback` doesn't matter here, as we will override it.
     return LossLandscapeGymWrapper(env, instruction_type=instruction_type, feedback_type=feedback_type)
 
 for env_name in ENVIRONMENTS:
-    register(
+    register_env(
         id=f"llf-optimization-{env_name}-v0",
         entry_point='llfbench.envs.optimization:make_env',
-        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False)
+        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False),
+        family='optimization',
+        instruction_types=('b',),
+        feedback_types=('r', 'hp', 'hn', 'fp', 'fn'),
+        reward_range=REWARD_RANGES[env_name],
+        action_space='text',
+        make_cost='low',
+        requires=('jax',),
     )
\ No newline at end of file
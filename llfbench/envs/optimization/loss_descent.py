@@ -8,6 +8,7 @@ from textwrap import dedent, indent
 
 from gym.utils import seeding
 from llfbench.envs.llf_env import Feedback
+from llfbench.envs.utils import get_rng_state, set_rng_state
 import string
 
 class LossLandscapeBase(gym.Env):
@@ -43,6 +44,10 @@ class LossLandscapeBase(gym.Env):
 
         self.horizon = horizon
 
+        # The didactic feedback types computed by step; the LLF wrapper sets
+        # this to the types requested in each step.
+        self.feedback_type = {'r', 'hp', 'hn', 'fp', 'fn'}
+
         self._seed = self.seed(seed)
 
         self.reward_range = (self.get_min_reward(), -self.min_y)
@@ -113,6 +118,19 @@ class LossLandscapeBase(gym.Env):
             self.seed()
         return self._np_random  # type: ignore  ## self.seed() call guarantees right type.
 
+    def get_state(self):
+        """ Return the state of the current episode. """
+        return dict(np_random=get_rng_state(self.np_random),
+                    prev_x=None if self.prev_x is None else self.prev_x.copy(),
+                    left_attempts=self.left_attempts,
+                    called_reset=self.called_reset)
+
+    def set_state(self, state):
+        set_rng_state(self.np_random, state['np_random'])
+        self.prev_x = None if state['prev_x'] is None else state['prev_x'].copy()
+        self.left_attempts = state['left_attempts']
+        self.called_reset = state['called_reset']
+
     def text_extract(self, text):
         # return np.array([x1, x2]), agent decides to stop
         for stop_word in self.stop_keywords:
@@ -190,7 +208,7 @@ class LossLandscapeBase(gym.Env):
             feedback += f"You chose {action}. Output a {x1_direction} number than the first number {x[0]} to minimize y.\n"
             feedback += f"You chose {action}. Output a {x2_direction} number than the second number {x[1]} to minimize y."
 
-        # this should be full each time
+        # only the types in self.feedback_type are computed
         # hp', 'hn', 'fp', 'fn'
 
         """
@@ -199,44 +217,47 @@ class LossLandscapeBase(gym.Env):
         - (fp) future positive: suggestion of things (future action) to do
         - (fn) future negative: suggestion of things (future action) to avoid
         """
-        change_x = x - self.prev_x  # change in x
-        change_x1, change_x2 = change_x[0], change_x[1]
-        prev_dx = self.grad_func(self.prev_x)
-        prev_dx1, prev_dx2 = prev_dx[0], prev_dx[1]
-        prev_x1_direction = 'Increasing' if change_x1 > 0 else 'Decreasing'  # take the opposite of gradient
-        prev_x2_direction = 'Increasing' if change_x2 > 0 else 'Decreasing'
-
-        if np.sign(change_x1) == np.sign(-prev_dx1):
-            didactic_feedback['hp'] += f"You chose {action} from {self.prev_x}. {prev_x1_direction} the first number {self.prev_x[0]} does minimize y.\n"
-        else:
-            didactic_feedback['hn'] += f"You chose {action} from {self.prev_x}. {prev_x1_direction} the first number {self.prev_x[0]} does not minimize y.\n"
+        if {'hp', 'hn'} & self.feedback_type:
+            change_x = x - self.prev_x  # change in x
+            change_x1, change_x2 = change_x[0], change_x[1]
+            prev_dx = self.grad_func(self.prev_x)
+            prev_dx1, prev_dx2 = prev_dx[0], prev_dx[1]
+            prev_x1_direction = 'Increasing' if change_x1 > 0 else 'Decreasing'  # take the opposite of gradient
+            prev_x2_direction = 'Increasing' if change_x2 > 0 else 'Decreasing'
+
+            if np.sign(change_x1) == np.sign(-prev_dx1):
+                didactic_feedback['hp'] += f"You chose {action} from {self.prev_x}. {prev_x1_direction} the first number {self.prev_x[0]} does minimize y.\n"
+            else:
+                didactic_feedback['hn'] += f"You chose {action} from {self.prev_x}. {prev_x1_direction} the first number {self.prev_x[0]} does not minimize y.\n"
 
-        if np.sign(change_x2) == np.sign(-prev_dx2):
-            didactic_feedback['hp'] += f"You chose {action} from {self.prev_x}. {prev_x2_direction} the second number {self.prev_x[1]} does minimize y."
-        else:
-            didactic_feedback['hn'] += f"You chose {action} from {self.prev_x}. {prev_x2_direction} the second number {self.prev_x[1]} does not minimize y."
+            if np.sign(change_x2) == np.sign(-prev_dx2):
+                didactic_feedback['hp'] += f"You chose {action} from {self.prev_x}. {prev_x2_direction} the second number {self.prev_x[1]} does minimize y."
+            else:
+                didactic_feedback['hn'] += f"You chose {action} from {self.prev_x}. {prev_x2_direction} the second number {self.prev_x[1]} does not minimize y."
 
-        dx = self.grad_func(x)
-        dx1, dx2 = dx[0], dx[1]
-        x1_direction = 'smaller' if dx1 > 0 else 'larger'  # take the opposite of gradient
-        x2_direction = 'smaller' if dx2 > 0 else 'larger'
-        if dx1 != 0:
-            didactic_feedback['fp'] += f"You chose {action}. Choose a {x1_direction} number than {x[0]} to minimize y.\n"
-        if dx2 != 0:
-            didactic_feedback['fp'] += f"You chose {action}. Choose a {x2_direction} number than {x[1]} to minimize y.\n"
+        if {'fp', 'fn'} & self.feedback_type:
+            if self.feedback == 0:  # otherwise computed above
+                dx = self.grad_func(x)
+            dx1, dx2 = dx[0], dx[1]
+            x1_direction = 'smaller' if dx1 > 0 else 'larger'  # take the opposite of gradient
+            x2_direction = 'smaller' if dx2 > 0 else 'larger'
+            if dx1 != 0:
+                didactic_feedback['fp'] += f"You chose {action}. Choose a {x1_direction} number than {x[0]} to minimize y.\n"
+            if dx2 != 0:
+                didactic_feedback['fp'] += f"You chose {action}. Choose a {x2_direction} number than {x[1]} to minimize y.\n"
 
-        flipped_x1_direction = 'smaller' if dx1 < 0 else 'larger'  # take the opposite of gradient
-        flipped_x2_direction = 'smaller' if dx2 < 0 else 'larger'
+            flipped_x1_direction = 'smaller' if dx1 < 0 else 'larger'  # take the opposite of gradient
+            flipped_x2_direction = 'smaller' if dx2 < 0 else 'larger'
 
-        if dx1 != 0:
-            didactic_feedback['fn'] += f"You chose {action}. Do not choose a {flipped_x1_direction} number than {x[0]} to minimize y."
-        if dx2 != 0:
-            didactic_feedback['fn'] += f"You chose {action}. Do not choose a {flipped_x2_direction} number than {x[1]} to minimize y."
+            if dx1 != 0:
+                didactic_feedback['fn'] += f"You chose {action}. Do not choose a {flipped_x1_direction} number than {x[0]} to minimize y."
+            if dx2 != 0:
+                didactic_feedback['fn'] += f"You chose {action}. Do not choose a {flipped_x2_direction} number than {x[1]} to minimize y."
 
         self.prev_x = x
         self.left_attempts -= 1
 
-        r = np.clip(float(-loss), self.get_min_reward(), -self.min_y)
+        r = np.clip(float(-loss), self.reward_range[0], -self.min_y)  # reward_range[0] is get_min_reward()
 
         return obs, r, False, {'feedback': didactic_feedback, 'original_feedback': feedback, "success": False}
 
@@ -2,6 +2,8 @@ from llfbench.envs.env_wrappers import TerminalFreeWrapper, EnvCompatibility
 from llfbench.envs.llf_env import LLFWrapper, Feedback
 # from llfbench.envs.loss_landscape.loss_descent import
 from llfbench.envs.optimization.prompts import *
+from llfbench.envs.optimization import prompts
+from llfbench.envs.templates import TemplateSet, compile_prompts
 
 """
 The original env produces support for both
@@ -11,6 +13,10 @@ The original env produces support for both
 This wrapper will only produce didactic feedback
 """
 
+compile_prompts(prompts)
+r_feedback_templates = TemplateSet([(r_feedback_pos_template, r_feedback_pos),
+                                    (r_feedback_neg_template, r_feedback_neg)])
+
 
 class LossLandscapeGymWrapper(LLFWrapper):
     INSTRUCTION_TYPES = ('b')
@@ -28,7 +34,8 @@ class LossLandscapeGymWrapper(LLFWrapper):
         return dict(instruction=instruction, observation=obs, feedback=None), info
 
     def _step(self, action):
-        observation, reward, terminated, truncated, info = self.env.step(action)
+        feedback_types = self._request_feedback(self._loss_env)
+        observation, reward, terminated, truncated, info = self._env_step(action)
         reward /= 100  # the loss can get quite large, so we scale it down by a fixed ratio
         didactic_feedback = info['feedback']
         del info['feedback']
@@ -39,10 +46,9 @@ class LossLandscapeGymWrapper(LLFWrapper):
 
         paraphrased_feedback = Feedback()
 
-        for feedback_type in self._feedback_type:
+        for feedback_type in feedback_types:
             if feedback_type == 'r':
-                feedback = self.reformat(didactic_feedback[feedback_type], r_feedback_pos, template=r_feedback_pos_template)
-                feedback = self.reformat(feedback, r_feedback_neg, template=r_feedback_neg_template)
+                feedback = self.reformat_all(didactic_feedback[feedback_type], r_feedback_templates)
                 paraphrased_feedback.r = feedback
             elif feedback_type in didactic_feedback and didactic_feedback[feedback_type] != "":
                 temp_dim1 = eval("{}_feedback_dim1_template".format(feedback_type))
@@ -65,6 +71,12 @@ class LossLandscapeGymWrapper(LLFWrapper):
         observation = dict(instruction=None, observation=observation, feedback=paraphrased_feedback)
         return observation, reward, terminated, truncated, info
 
+    def _get_env_state(self):
+        return self._loss_env.get_state()
+
+    def _set_env_state(self, state):
+        self._loss_env.set_state(state)
+
     @property
     def _loss_env(self):
         return self.env.env.env
@@ -0,0 +1,115 @@
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import gymnasium as gym
+from gymnasium.vector.utils import CloudpickleWrapper
+from typing import Any, Callable, Dict, List, Sequence, Union
+from llfbench.envs.llf_env import LLFWrapper
+
+"""
+
+Counterfactual (oracle) evaluation of the actions of an LLF env.
+
+The engine takes a snapshot of an env (see `LLFWrapper.get_state`) and returns
+what each of the given actions would have produced from it: the observation,
+the reward and the verbalized feedback. The env itself is left in the state
+of the snapshot.
+
+With `num_workers=0` the actions are tried one after another on the env
+itself, restoring the snapshot before each of them. With `num_workers>0` the
+actions are split across a pool of processes, each holding its own copy of
+the env made by `env_fn`, and only the snapshot and the actions are sent to
+the workers. Then evaluating all the actions costs about as much as
+`len(actions) / num_workers` steps.
+
+"""
+
+
+def get_llf_wrapper(env: gym.Env) -> LLFWrapper:
+    """ Return the LLFWrapper of an env made by `llfbench.make`. """
+    while not isinstance(env, LLFWrapper):
+        assert hasattr(env, 'env'), 'The env is not wrapped by an LLFWrapper.'
+        env = env.env
+    return env
+
+
+def evaluate_actions(env: LLFWrapper, state: Dict[str, Any], actions: Sequence[Any]) -> List[Dict[str, Any]]:
+    """ Step `env` with each of `actions` from `state`. The env is left in
+        the state of the last action. """
+    results = []
+    for action in actions:
+        env.set_state(state)
+        observation, reward, terminated, truncated, info = env.step(action)
+        results.append(dict(observation=observation,
+                            reward=reward,
+                            terminated=terminated,
+                            truncated=truncated,
+                            feedback=observation['feedback'],
+                            success=info['success']))
+    return results
+
+
+# The env of a worker process of OracleEngine.
+_worker_env = None
+
+
+def _init_worker(env_fn: CloudpickleWrapper):
+    global _worker_env
+    _worker_env = get_llf_wrapper(env_fn())
+
+
+def _evaluate_in_worker(state: Dict[str, Any], actions: Sequence[Any]) -> List[Dict[str, Any]]:
+    return evaluate_actions(_worker_env, state, actions)
+
+
+class OracleEngine:
+    """ Evaluate a set of actions of an LLF env from a snapshot of its state. """
+
+    def __init__(self, env_fn: Union[Callable[[], gym.Env], None] = None, num_workers: int = 0, context: Union[str, None] = None):
+        """
+            Args:
+                env_fn: A function that makes a copy of the env, configured
+                the same way (e.g. instruction and feedback types). It is
+                needed only when num_workers > 0.
+
+                num_workers: The number of worker processes. If 0, the actions
+                are evaluated in this process.
+
+                context: The multiprocessing start method of the workers.
+        """
+        assert num_workers >= 0, 'num_workers must be non-negative.'
+        assert num_workers == 0 or env_fn is not None, 'env_fn is needed to start the workers.'
+        self.num_workers = num_workers
+        self._pool = None
+        if num_workers > 0:
+            self._pool = ProcessPoolExecutor(max_workers=num_workers,
+                                             mp_context=mp.get_context(context),
+                                             initializer=_init_worker,
+                                             initargs=(CloudpickleWrapper(env_fn),))
+
+    def evaluate(self, env: gym.Env, actions: Sequence[Any]) -> List[Dict[str, Any]]:
+        """ Return the results of each of `actions` from the current state of
+            `env`. The env is left in its current state.
+
+            Each result is a dict with keys: 'observation', 'reward',
+            'terminated', 'truncated', 'feedback' and 'success'.
+        """
+        env = get_llf_wrapper(env)
+        actions = list(actions)
+        state = env.get_state()
+        if self._pool is None:
+            results = evaluate_actions(env, state, actions)
+        else:
+            # One chunk of actions per worker, so the state is sent only once to each of them.
+            chunks = [actions[i::self.num_workers] for i in range(self.num_workers)]
+            futures = [self._pool.submit(_evaluate_in_worker, state, chunk) for chunk in chunks if len(chunk) > 0]
+            chunk_results = [future.result() for future in futures]
+            results = [None] * len(actions)
+            for i, chunk_result in enumerate(chunk_results):
+                results[i::self.num_workers] = chunk_result
+        env.set_state(state)
+        return results
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -1,7 +1,4 @@
-import numpy as np
-from gymnasium.envs.registration import register
-from llfbench.utils import generate_combinations_dict
-from llfbench.envs.poem.wrapper import PoemGymWrapper
+from llfbench.envs.specs import register_env
 
 ENVIRONMENTS = (
     'Haiku',
@@ -18,6 +15,7 @@ def make_env(env_name,
     assert visual == False, "poem environments have no visual observations"
     """ Make the original env and wrap it with the LLFWrapper. """
     import importlib
+    from llfbench.envs.poem.wrapper import PoemGymWrapper
     PoemCls = getattr(importlib.import_module("llfbench.envs.poem.formal_poems"), env_name)
     env = PoemCls(**kwargs)  # `feedback` doesn't matter here, as we will override it.
     return PoemGymWrapper(env, instruction_type=instruction_type, feedback_type=feedback_type)
@@ -25,8 +23,15 @@ def make_env(env_name,
 
 for env_name in ENVIRONMENTS:
     # default version (backwards compatibility)
-    register(
+    register_env(
         id=f"llf-poem-{env_name}-v0",
         entry_point='llfbench.envs.poem:make_env',
-        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False)
+        kwargs=dict(env_name=env_name, feedback_type='a', instruction_type='b', visual=False),
+        family='poem',
+        instruction_types=('b',),
+        feedback_types=('r', 'hp', 'hn', 'fp', 'fn'),
+        reward_range=(-1.0, 0.0),
+        action_space='text',
+        make_cost='medium',  # loads the CMU pronouncing dictionary
+        requires=('cmudict', 'syllables'),
     )
\ No newline at end of file
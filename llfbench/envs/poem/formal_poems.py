@@ -1,3 +1,4 @@
+import copy
 import random
 import re
 from string import punctuation
@@ -12,10 +13,16 @@ from gym.utils import seeding
 
 from llfbench.utils.parser_utils import SimpleGuidanceParser
 from llfbench.envs.llf_env import Feedback
+from llfbench.envs.utils import get_rng_state, set_rng_state
 
 
 class PoemUtil:
     # designed as a Mixin class
+
+    # The attributes that may change across episodes, i.e. the state of the
+    # env besides its random number generator. See get_state.
+    STATE_ATTRIBUTES = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)  # forwards all unused arguments
         self.cmudict = cmudict.dict()
@@ -74,6 +81,18 @@ class PoemUtil:
     def seed(self, seed):
         pass
 
+    def get_state(self):
+        """ Return the state of the current episode. The cmudict is fixed, so
+            only the STATE_ATTRIBUTES and the random number generator are kept. """
+        state = {name: copy.copy(getattr(self, name)) for name in self.STATE_ATTRIBUTES}
+        state['np_random'] = get_rng_state(self._np_random)
+        return state
+
+    def set_state(self, state):
+        set_rng_state(self._np_random, state['np_random'])
+        for name in self.STATE_ATTRIBUTES:
+            setattr(self, name, copy.copy(state[name]))
+
 
 class PoemExtractor(object):
     # use LLM to extract the poem
@@ -317,6 +336,8 @@ class Tanka(Haiku):
 
 
 class LineSyllableConstrainedPoem(Haiku):
+    STATE_ATTRIBUTES = ('syllable_req', 'syllable_req_str', 'assignment')
+
     def __init__(self, syllable_req=[7, 7, 7], feedback=0, use_extractor=False,
                  seed=None):
         # We can extend this to add "theme" of the poem
@@ -355,6 +376,8 @@ class LineSyllableConstrainedPoem(Haiku):
 
 
 class SyllableConstrainedPoem(PoemUtil, gym.Env):
+    STATE_ATTRIBUTES = ('syllable', 'assignment')
+
     def __init__(self, syllable=7, feedback=0, use_extractor=False, seed=None):
 
         super().__init__()
@@ -3,6 +3,12 @@ from llfbench.envs.env_wrappers import TerminalFreeWrapper, EnvCompatibility
 from llfbench.envs.llf_env import LLFWrapper, Feedback
 from llfbench.envs.poem.formal_poems import Haiku, Tanka, LineSyllableConstrainedPoem, SyllableConstrainedPoem
 from llfbench.envs.poem.prompts import *
+from llfbench.envs.poem import prompts
+from llfbench.envs.templates import TemplateSet, compile_prompts
+
+compile_prompts(prompts)
+r_feedback_templates = TemplateSet([(r_feedback_pos[0], r_feedback_pos),
+                                    (r_feedback_neg[0], r_feedback_neg)])
 
 class PoemGymWrapper(LLFWrapper):
 
@@ -34,7 +40,7 @@ class PoemGymWrapper(LLFWrapper):
         return dict(instruction=instruction, observation=None, feedback=None), info
 
     def _step(self, action):
-        observation, reward, terminated, truncated, info = self.env.step(action)
+        observation, reward, terminated, truncated, info = self._env_step(action)
         reward -= 1.0  # so that early stopping due to success would give the right return
         didactic_feedback = info['feedback']
         del info['feedback']
@@ -44,8 +50,7 @@ class PoemGymWrapper(LLFWrapper):
         for feedback_type in self._feedback_type:
             feedback = didactic_feedback[feedback_type]
             if feedback_type == 'r':
-                feedback = self.reformat(feedback, r_feedback_pos)
-                feedback = self.reformat(feedback, r_feedback_neg)
+                feedback = self.reformat_all(feedback, r_feedback_templates)
             elif feedback_type == 'hn':
                 feedback = self.reformat(feedback, line_number_hn_feedback)
                 feedback = self.reformat(feedback, syllable_hn_feedback)
@@ -82,6 +87,12 @@ class PoemGymWrapper(LLFWrapper):
                 feedback.append(line)
         return ' '.join(feedback)
 
+    def _get_env_state(self):
+        return self._poem_env.get_state()
+
+    def _set_env_state(self, state):
+        self._poem_env.set_state(state)
+
     @property
     def _poem_env(self):
         return self.env.env.env
\ No newline at end of file
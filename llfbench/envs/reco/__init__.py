@@ -1,6 +1,4 @@
-from gymnasium.envs.registration import register
-from llfbench.utils import generate_combinations_dict
-from llfbench.envs.reco.wrapper import MovieRecGymWrapper
+from llfbench.envs.specs import register_env
 
 environments = [
     'movie'
@@ -14,12 +12,20 @@ def make_env(env_name,
     assert visual == False, "The recommendation environment has no visual observations"
     """ Make the original env and wrap it with the LLFWrapper. """
     import importlib
+    from llfbench.envs.reco.wrapper import MovieRecGymWrapper
     MovieCls = getattr(importlib.import_module("llfbench.envs.reco.movie_rec"), 'MovieRec')
     env = MovieCls(instruction_type=instruction_type, **kwargs)  # `feedback` doesn't matter here, as we will override it.
     return MovieRecGymWrapper(env, instruction_type=instruction_type, feedback_type=feedback_type)
 
-register(
+register_env(
     id=f"llf-reco-{environments[0]}-v0",
     entry_point='llfbench.envs.reco:make_env',
-    kwargs=dict(env_name=environments[0], feedback_type='a', instruction_type='b', visual=False)
+    kwargs=dict(env_name=environments[0], feedback_type='a', instruction_type='b', visual=False),
+    family='reco',
+    instruction_types=('b', 'c'),
+    feedback_types=('r', 'hp', 'hn', 'fp', 'fn'),
+    reward_range=(-1, 0),
+    action_space='text',
+    make_cost='medium',  # loads the cached movie data; uncached titles are looked up on OMDB
+    requires=('requests',),
 )
\ No newline at end of file
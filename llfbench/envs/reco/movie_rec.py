@@ -7,7 +7,6 @@ import pickle
 import string
 
 import datetime
-import random
 from collections import Counter
 
 import numpy as np
@@ -19,6 +18,7 @@ from textwrap import dedent, indent
 
 from llfbench.utils.parser_utils import SimpleGuidanceParser
 from llfbench.envs.llf_env import Feedback
+from llfbench.envs.utils import get_rng_state, set_rng_state
 
 from dataclasses import dataclass
 
@@ -244,10 +244,14 @@ class RecommendationQueryGenerator:
         end_phrases = ["", " Where should I start?", " Please point me in the right direction.",
                        " Any pointers?", " Got any ideas?"]
 
-        base_query = random.choice(expressions) if sampled_start_exp_idx is None else expressions[sampled_start_exp_idx]
+        if sampled_start_exp_idx is None:
+            sampled_start_exp_idx = self._np_random.integers(len(expressions))
+        base_query = expressions[sampled_start_exp_idx]
         sampled_start_exp_idx = expressions.index(base_query)
 
-        end_phrase = random.choice(end_phrases) if sampled_end_exp_idx is None else end_phrases[sampled_end_exp_idx]
+        if sampled_end_exp_idx is None:
+            sampled_end_exp_idx = self._np_random.integers(len(end_phrases))
+        end_phrase = end_phrases[sampled_end_exp_idx]
 
         # Ensure the genre has the right article (a/an)
         if "a good {genre}" in base_query:
@@ -294,6 +298,10 @@ class MovieRec(gym.Env):
 
         self.is_first_order_feedback = self.feedback_level == 1
 
+        # The didactic feedback types computed by step; the LLF wrapper sets
+        # this to the types requested in each step.
+        self.feedback_type = {'r', 'hp', 'hn', 'fp', 'fn'}
+
         self.reward_range = (0, 1)
 
         file_path = os.path.dirname(os.path.abspath(__file__))
@@ -312,24 +320,37 @@ class MovieRec(gym.Env):
     def seed(self, seed=None):
         """Seed the PRNG of this space and possibly the PRNGs of subspaces."""
         self.query_generator = RecommendationQueryGenerator(seed=seed)
-        random.seed(seed)
         self._np_random, seed = seeding.np_random(seed)
         return [seed]
 
+    def get_state(self):
+        """ Return the state of the current episode. The movie data is fixed,
+            so only the order of the shuffled movies is kept. """
+        return dict(np_random=get_rng_state(self._np_random),
+                    query_np_random=get_rng_state(self.query_generator._np_random),
+                    profile=copy.deepcopy(self.profile),
+                    partial_profile=copy.deepcopy(self.partial_profile),
+                    cached_movie_data_shuffled=list(self.cached_movie_data_shuffled))
+
+    def set_state(self, state):
+        set_rng_state(self._np_random, state['np_random'])
+        set_rng_state(self.query_generator._np_random, state['query_np_random'])
+        self.profile = copy.deepcopy(state['profile'])
+        self.partial_profile = copy.deepcopy(state['partial_profile'])
+        self.cached_movie_data_shuffled = list(state['cached_movie_data_shuffled'])
+
     def generate_request_query(self, profile):
         return self.query_generator.generate_query(**profile)
 
     def reset(self, **kwargs):
         if 'seed' in kwargs:
             self._seed = self.seed(kwargs['seed'])
-            self.query_generator = RecommendationQueryGenerator(seed=kwargs['seed'])
-            random.seed(self._seed)
 
         rand_profile, partial_profile = self.query_generator.generate_random_profile()
         self.profile = rand_profile
         self.partial_profile = partial_profile
 
-        random.shuffle(self.cached_movie_data_shuffled)
+        self._np_random.shuffle(self.cached_movie_data_shuffled)
 
         # Profile:
         # {'type_': 'TV show',
@@ -510,31 +531,32 @@ class MovieRec(gym.Env):
                 feedback += f" {item[0]} is from {item[1]}."
             feedback += f" I want {self.profile['type_']}s from the {correct_years}."
 
-        if len(success_items) > 0:
+        if 'hp' in self.feedback_type and len(success_items) > 0:
             hp = f"These recommendations are indeed from the {correct_years}:"
             for item in success_items:
                 hp += f" {item[0]} is from {item[1]},"
             didactic_feedback.hp = hp
 
-        if len(error_items) > 0:
+        if 'hn' in self.feedback_type and len(error_items) > 0:
             hn = f"These recommendations are not from the {correct_years}:"
             for item in error_items:
                 hn += f" {item[0]} is from {item[1]},"
             didactic_feedback.hn = hn
 
-        ex_success_items, ex_error_items = self.sample_success_by_year(profile_years)
-        ex_success_items, ex_error_items = list(set(ex_success_items)), list(set(ex_error_items))
+        if {'fp', 'fn'} & self.feedback_type:
+            ex_success_items, ex_error_items = self.sample_success_by_year(profile_years)
+            ex_success_items, ex_error_items = list(set(ex_success_items)), list(set(ex_error_items))
 
-        fp = f"Recommend {self.profile['type_']}s that are from {correct_years}, like "
-        fp += self._list_to_string([i[0] for i in ex_success_items], last_separator=' and ')
-        fp += '.'
+            fp = f"Recommend {self.profile['type_']}s that are from {correct_years}, like "
+            fp += self._list_to_string([i[0] for i in ex_success_items], last_separator=' and ')
+            fp += '.'
 
-        didactic_feedback.fp = fp if len(ex_success_items) > 0 else None
+            didactic_feedback.fp = fp if len(ex_success_items) > 0 else None
 
-        fn = f"Do not make recommendations that are not from {correct_years}, like "
-        fn += self._list_to_string([i[0] for i in ex_error_items], last_separator=' or ')
-        fn += '.'
-        didactic_feedback.fn = fn if len(ex_error_items) > 0 else None
+            fn = f"Do not make recommendations that are not from {correct_years}, like "
+            fn += self._list_to_string([i[0] for i in ex_error_items], last_separator=' or ')
+            fn += '.'
+            didactic_feedback.fn = fn if len(ex_error_items) > 0 else None
 
         return False, feedback, didactic_feedback, {"unsatisfied": [item[0] for item in error_items]}
 
@@ -562,29 +584,30 @@ class MovieRec(gym.Env):
                 feedback += f" {item[0]} is {self._list_to_string(item[1])}."
             feedback += f" I want {self.profile['type_']}s that are {self._list_to_string(profile_genres, last_separator=' and ')}."
 
-        if len(success_items) > 0:
+        if 'hp' in self.feedback_type and len(success_items) > 0:
             hp = f"These recommendations are indeed {self._list_to_string(profile_genres, last_separator=' and ')}:"
             for item in success_items:
                 hp += f" {item[0]} is {self._list_to_string(item[1])},"
             didactic_feedback.hp = hp
 
-        if len(error_items) > 0:
+        if 'hn' in self.feedback_type and len(error_items) > 0:
             hn = f"These recommendations are not {self._list_to_string(profile_genres, last_separator=' and ')}:"
             for item in error_items:
                 hn += f" {item[0]} is {self._list_to_string(item[1])},"
             didactic_feedback.hn = hn
 
-        ex_success_items, ex_error_items = self.sample_success_by_genres(profile_genres)
+        if {'fp', 'fn'} & self.feedback_type:
+            ex_success_items, ex_error_items = self.sample_success_by_genres(profile_genres)
 
-        fp = f"Make recommendations that are {self._list_to_string(profile_genres, last_separator=' and ')}, like "
-        fp += self._list_to_string([i[0] for i in ex_success_items], last_separator=' and ')
-        fp += '.'
-        didactic_feedback.fp = fp if len(ex_success_items) > 0 else None
+            fp = f"Make recommendations that are {self._list_to_string(profile_genres, last_separator=' and ')}, like "
+            fp += self._list_to_string([i[0] for i in ex_success_items], last_separator=' and ')
+            fp += '.'
+            didactic_feedback.fp = fp if len(ex_success_items) > 0 else None
 
-        fn = f"Do not make recommendations that are not {self._list_to_string(profile_genres, last_separator=' and ')}, not like "
-        fn += self._list_to_string([i[0] for i in ex_error_items], last_separator=' or ')
-        fn += '.'
-        didactic_feedback.fn = fn if len(ex_error_items) > 0 else None
+            fn = f"Do not make recommendations that are not {self._list_to_string(profile_genres, last_separator=' and ')}, not like "
+            fn += self._list_to_string([i[0] for i in ex_error_items], last_separator=' or ')
+            fn += '.'
+            didactic_feedback.fn = fn if len(ex_error_items) > 0 else None
 
         return False, feedback, didactic_feedback, {"unsatisfied": [item[0] for item in error_items]}
 
@@ -633,28 +656,29 @@ class MovieRec(gym.Env):
             didactic_feedback = Feedback(
                 r=f"The recommendations are not all {profile_type}s.")
 
-            if len(success_items) > 0:
+            if 'hp' in self.feedback_type and len(success_items) > 0:
                 hp = f"These recommendations are indeed all {profile_type}s:"
                 for item in success_items:
                     hp += f" {item[0]},"
                 didactic_feedback.hp = hp
 
-            if len(error_items) > 0:
+            if 'hn' in self.feedback_type and len(error_items) > 0:
                 hn = f"These recommendations are not all {profile_type}s:"
                 for item in error_items:
                     hn += f" {item[0]} is a {item[1]},"
                 didactic_feedback.hn = hn
 
-            ex_success_items, ex_error_items = self.sample_success_by_type(profile_type)
-            fp = f"Recommend {profile_type}s, like "
-            fp += self._list_to_string([i[0] for i in ex_success_items], last_separator=' and ')
-            fp += '.'
-            didactic_feedback.fp = fp if len(ex_success_items) > 0 else None
+            if {'fp', 'fn'} & self.feedback_type:
+                ex_success_items, ex_error_items = self.sample_success_by_type(profile_type)
+                fp = f"Recommend {profile_type}s, like "
+                fp += self._list_to_string([i[0] for i in ex_success_items], last_separator=' and ')
+                fp += '.'
+                didactic_feedback.fp = fp if len(ex_success_items) > 0 else None
 
-            fn = f"Do not make recommendations that are not {profile_type}s, like "
-            fn += self._list_to_string([i[0] for i in ex_error_items], last_separator=' or ')
-            fn += '.'
-            didactic_feedback.fn = fn if len(ex_error_items) > 0 else None
+                fn = f"Do not make recommendations that are not {profile_type}s, like "
+                fn += self._list_to_string([i[0] for i in ex_error_items], last_separator=' or ')
+                fn += '.'
+                didactic_feedback.fn = fn if len(ex_error_items) > 0 else None
 
             return False, feedback, didactic_feedback, {"unsatisfied": [item[0] for item in error_items]}
 
@@ -696,29 +720,30 @@ class MovieRec(gym.Env):
             didactic_feedback = Feedback(
                 r=f"The recommendations are not all {profile_age_restriction}.")
 
-            if len(success_items) > 0:
+            if 'hp' in self.feedback_type and len(success_items) > 0:
                 hp = f"These recommendations are indeed {profile_age_restriction}:"
                 for item in success_items:
                     hp += f" {item},"
                 didactic_feedback.hp = hp
 
-            if len(error_items) > 0:
+            if 'hn' in self.feedback_type and len(error_items) > 0:
                 hn = f"These recommendations are not {profile_age_restriction}:"
                 for item in error_items:
                     hn += f" {item},"
                 didactic_feedback.hn = hn
 
-            ex_success_items, ex_error_items = self.sample_success_by_age_restriction(profile_age_restriction)
+            if {'fp', 'fn'} & self.feedback_type:
+                ex_success_items, ex_error_items = self.sample_success_by_age_restriction(profile_age_restriction)
 
-            fp = f"Recommend {self.profile['type_']}s that are {profile_age_restriction}, like "
-            fp += self._list_to_string(ex_success_items, last_separator=' and ')
-            fp += '.'
-            didactic_feedback.fp = fp if len(ex_success_items) > 0 else None
+                fp = f"Recommend {self.profile['type_']}s that are {profile_age_restriction}, like "
+                fp += self._list_to_string(ex_success_items, last_separator=' and ')
+                fp += '.'
+                didactic_feedback.fp = fp if len(ex_success_items) > 0 else None
 
-            fn = f"Do not recommend {self.profile['type_']}s that are not {profile_age_restriction}, like "
-            fn += self._list_to_string(ex_error_items, last_separator=' or ')
-            fn += '.'
-            didactic_feedback.fn = fn if len(ex_error_items) > 0 else None
+                fn = f"Do not recommend {self.profile['type_']}s that are not {profile_age_restriction}, like "
+                fn += self._list_to_string(ex_error_items, last_separator=' or ')
+                fn += '.'
+                didactic_feedback.fn = fn if len(ex_error_items) > 0 else None
 
             return False, feedback, didactic_feedback, {'unsatisfied': error_items}
 
@@ -743,13 +768,13 @@ class MovieRec(gym.Env):
             didactic_feedback = Feedback(
                 r=f"I can't find some of the recommendations on the internet.")
 
-            if len(success_items) > 0:
+            if 'hp' in self.feedback_type and len(success_items) > 0:
                 hp = f"I can find these recommendations on the internet:"
                 for item in success_items:
                     hp += f" {item},"
                 didactic_feedback.hp = hp if len(success_items) > 0 else None
 
-            if len(error_items) > 0:
+            if 'hn' in self.feedback_type and len(error_items) > 0:
                 hn = f"I can't find these recommendations on the internet:"
                 for item in error_items:
                     hn += f" {item},"
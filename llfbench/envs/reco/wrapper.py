@@ -2,10 +2,21 @@ from llfbench.envs.env_wrappers import TerminalFreeWrapper, EnvCompatibility
 from llfbench.envs.llf_env import LLFWrapper, Feedback
 from llfbench.envs.reco.prompts import *
 from llfbench.envs.reco.movie_rec import MovieRec
+from llfbench.envs.reco import prompts
+from llfbench.envs.templates import TemplateSet, compile_prompts
+
+attribute_list = ["hallucination", "type", "genre", "year", "child_friendly"]
+
+compile_prompts(prompts)
+# The positive and the negative reward feedback of an attribute are reformatted in one pass.
+r_templates = {attribute: TemplateSet([(eval(f"{attribute}_r_pos_template"), eval(f"{attribute}_r_pos")),
+                                       (eval(f"{attribute}_r_neg_template"), eval(f"{attribute}_r_neg"))])
+               for attribute in attribute_list}
 
 class MovieRecGymWrapper(LLFWrapper):
     INSTRUCTION_TYPES = ('b', 'c')  # , 'p', 'c')
     FEEDBACK_TYPES = ('r', 'hp', 'hn', 'fp', 'fn')
+    BLOCKING = True  # OMDB lookups of uncached titles
 
     def __init__(self, env, instruction_type, feedback_type):
         super().__init__(TerminalFreeWrapper(EnvCompatibility(env)), instruction_type, feedback_type)
@@ -23,32 +34,25 @@ class MovieRecGymWrapper(LLFWrapper):
         return dict(instruction=instruction, observation=obs, feedback=None), info
 
     def _step(self, action):
-        observation, reward, terminated, truncated, info = self.env.step(action)
+        feedback_types = self._request_feedback(self._movie_rec_env)
+        observation, reward, terminated, truncated, info = self._env_step(action)
         reward -= 1.0  # so that early stopping due to success would give the right return
         didactic_feedback = info['feedback']
         del info['original_feedback']
         del info['feedback']
 
-        attribute_list = ["hallucination", "type", "genre", "year", "child_friendly"]
-
         paraphrased_feedback = Feedback(r="", hp="", hn="", fp="", fn="")
 
         for attribute in attribute_list:
             if attribute not in didactic_feedback:
                 continue
 
-            for feedback_type in self._feedback_type:
+            for feedback_type in feedback_types:
                 if didactic_feedback[attribute][feedback_type] is None:
                     continue
 
                 if feedback_type == 'r':
-                    r_pos_temp = eval(f"{attribute}_r_pos_template")
-                    r_pos = eval(f"{attribute}_r_pos")
-                    feedback = self.reformat(didactic_feedback[attribute][feedback_type], r_pos, template=r_pos_temp)
-
-                    r_neg_temp = eval(f"{attribute}_r_neg_template")
-                    r_neg = eval(f"{attribute}_r_neg")
-                    feedback = self.reformat(feedback, r_neg, template=r_neg_temp)
+                    feedback = self.reformat_all(didactic_feedback[attribute][feedback_type], r_templates[attribute])
 
                     paraphrased_feedback.r += feedback + '\n'
 
@@ -74,6 +78,12 @@ class MovieRecGymWrapper(LLFWrapper):
         observation = dict(instruction=None, observation=observation, feedback=paraphrased_feedback)
         return observation, reward, terminated, truncated, info
 
+    def _get_env_state(self):
+        return self._movie_rec_env.get_state()
+
+    def _set_env_state(self, state):
+        self._movie_rec_env.set_state(state)
+
     @property
     def _movie_rec_env(self):
         return self.env.env.env
@@ -0,0 +1,330 @@
+import os
+import io
+import mmap
+import gzip
+import json
+import base64
+import importlib.util
+import numpy as np
+import gymnasium as gym
+from typing import Any, Dict, Iterator, List, Sequence, Union
+
+"""
+
+Streaming recording of LLF trajectories.
+
+RecordingWrapper writes every reset and step of an env to disk as it happens,
+so that the memory used by recording does not grow with the number of steps or
+episodes. A record is a dict with keys
+
+    episode, t, instruction, observation, action, feedback, reward,
+    terminated, truncated, success
+
+plus the values of the selected `info_keys` (none by default, since infos can
+hold large items such as video frames). The record of a reset has t=0 and no
+action, feedback or reward; it also has the seed and options of the reset, so
+that the episode can be simulated again (see ReplayEnv).
+
+The records are buffered into chunks of `chunk_size` records. Each chunk is
+written as JSON lines compressed independently (with zstd if the `zstandard`
+package is installed, or gzip otherwise) and appended to the data file. Then
+one line describing the chunk (its offset, length, codec and episodes) is
+appended to the index file `<path>.index`. A chunk is visible to readers only
+once its index line is written, so a file that is being written, or whose
+writer crashed, can still be read up to its last complete chunk. The first
+line of the index is a header describing the recorded env: its id and its
+action and observation spaces, so that a replay does not need to make it.
+
+Numpy arrays (e.g. the observations of highway or metaworld) are stored
+exactly, as base64 of their bytes with their dtype and shape.
+
+"""
+
+CODECS = ('gzip', 'zstd')
+
+
+def default_codec() -> str:
+    return 'zstd' if importlib.util.find_spec('zstandard') else 'gzip'
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().compress(data)
+    assert codec == 'gzip', f'codec must be one of {CODECS}.'
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    assert codec == 'gzip', f'codec must be one of {CODECS}.'
+    return gzip.decompress(data)
+
+
+def encode(value: Any) -> Any:
+    """ Turn a value into a JSON-serializable value, which `decode` turns back. """
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': base64.b64encode(np.ascontiguousarray(value).tobytes()).decode('ascii'),
+                'dtype': value.dtype.str,
+                'shape': list(value.shape)}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    if hasattr(value, 'asdict'):  # e.g. a Feedback which is not verbalized
+        return encode(value.asdict())
+    return value
+
+
+def decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if '__ndarray__' in value:
+            array = np.frombuffer(base64.b64decode(value['__ndarray__']), dtype=np.dtype(value['dtype']))
+            return array.reshape(value['shape']).copy()  # writable
+        return {k: decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+def encode_space(space: gym.Space) -> Union[Dict[str, Any], None]:
+    """ Describe a space as a JSON-serializable dict, which `decode_space`
+        turns back into the space, or None if the space is not supported. """
+    if isinstance(space, gym.spaces.Discrete):
+        return dict(type='Discrete', n=int(space.n), start=int(space.start))
+    if isinstance(space, gym.spaces.Box):
+        return dict(type='Box', low=encode(space.low), high=encode(space.high), dtype=space.dtype.str)
+    if isinstance(space, gym.spaces.Text):
+        return dict(type='Text', min_length=space.min_length, max_length=space.max_length, charset=space.characters)
+    if isinstance(space, gym.spaces.Dict):
+        spaces = {key: encode_space(subspace) for key, subspace in space.spaces.items()}
+        return None if None in spaces.values() else dict(type='Dict', spaces=spaces)
+    if isinstance(space, gym.spaces.Tuple):
+        spaces = [encode_space(subspace) for subspace in space.spaces]
+        return None if None in spaces else dict(type='Tuple', spaces=spaces)
+    return None
+
+
+def decode_space(value: Dict[str, Any]) -> gym.Space:
+    kind = value['type']
+    if kind == 'Discrete':
+        return gym.spaces.Discrete(value['n'], start=value['start'])
+    if kind == 'Box':
+        low, high = decode(value['low']), decode(value['high'])
+        return gym.spaces.Box(low, high, shape=low.shape, dtype=np.dtype(value['dtype']))
+    if kind == 'Text':
+        return gym.spaces.Text(value['max_length'], min_length=value['min_length'], charset=value['charset'])
+    if kind == 'Dict':
+        return gym.spaces.Dict({key: decode_space(subspace) for key, subspace in value['spaces'].items()})
+    assert kind == 'Tuple', f'Unknown space {kind}.'
+    return gym.spaces.Tuple([decode_space(subspace) for subspace in value['spaces']])
+
+
+class TrajectoryWriter:
+    """ Append records to a chunked, compressed trajectory file. A record
+        is a dict which has an integer 'episode'. """
+
+    def __init__(self, path: str, chunk_size: int = 256, codec: Union[str, None] = None,
+                 header: Union[Dict[str, Any], None] = None):
+        """
+            Args:
+                path: The data file. The index is written to `path + '.index'`.
+                If the file exists, the records are appended to it.
+
+                chunk_size: The number of records buffered before a chunk is
+                written.
+
+                codec: 'zstd' or 'gzip'. If None, zstd is used if available.
+
+                header: A JSON-serializable dict describing the recording,
+                written at the start of a new index.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.codec = codec or default_codec()
+        assert self.codec in CODECS, f'codec must be one of {CODECS}.'
+        self._buffer, self._episodes = [], []
+        chunks = read_index(path) if os.path.exists(path + '.index') else []
+        # The last episode written to the file, so that appended episodes continue the numbering.
+        self.last_episode = max([chunk['last_episode'] for chunk in chunks], default=-1)
+        self._data_file = open(path, 'ab')
+        if os.path.exists(path + '.index'):
+            truncate_partial_line(path + '.index')  # drop the line of a chunk whose index was not finished
+        self._index_file = open(path + '.index', 'a')
+        if header is not None and self._index_file.tell() == 0:
+            self._index_file.write(json.dumps(dict(header=header)) + '\n')
+            self._index_file.flush()
+        self._offset = sum(chunk['length'] for chunk in chunks)
+        self._data_file.truncate(self._offset)  # drop the bytes of a chunk whose index was not written
+
+    def write(self, record: Dict[str, Any]):
+        self._buffer.append(json.dumps(encode(record)))
+        self._episodes.append(record['episode'])
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """ Write the buffered records as a chunk. """
+        if not self._buffer:
+            return
+        data = compress(('\n'.join(self._buffer) + '\n').encode('utf-8'), self.codec)
+        self._data_file.write(data)
+        self._data_file.flush()
+        chunk = dict(offset=self._offset, length=len(data), codec=self.codec, num_records=len(self._buffer),
+                     first_episode=self._episodes[0], last_episode=self._episodes[-1])
+        self._index_file.write(json.dumps(chunk) + '\n')
+        self._index_file.flush()
+        self._offset += len(data)
+        self.last_episode = max(self.last_episode, self._episodes[-1])
+        self._buffer, self._episodes = [], []
+
+    def close(self):
+        if self._data_file.closed:
+            return
+        self.flush()
+        self._data_file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def truncate_partial_line(path: str):
+    """ Truncate a file after its last newline, dropping a line being written. """
+    with open(path, 'rb+') as f:
+        f.truncate(f.read().rfind(b'\n') + 1)
+
+
+def read_index(path: str) -> List[Dict[str, Any]]:
+    """ Return the descriptions of the complete chunks of a trajectory file. """
+    chunks = []
+    with open(path + '.index') as f:
+        for line in f:
+            if line.endswith('\n'):  # skip a line being written
+                chunk = json.loads(line)
+                if 'header' not in chunk:
+                    chunks.append(chunk)
+    return chunks
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """ Return the header of a trajectory file, or {} if it has none. """
+    with open(path + '.index') as f:
+        line = f.readline()
+    if not line.endswith('\n'):
+        return {}
+    return json.loads(line).get('header', {})
+
+
+class TrajectoryReader:
+    """ Read the records of a trajectory file, one chunk at a time. The data
+        file is memory-mapped, so reading a chunk does not copy the file. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header = read_header(path)
+        self.chunks = read_index(path)
+        self._file, self._mmap = None, None
+        if sum(chunk['length'] for chunk in self.chunks) > 0:
+            self._file = open(path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return sum(chunk['num_records'] for chunk in self.chunks)
+
+    def read_chunk(self, i: int) -> List[Dict[str, Any]]:
+        chunk = self.chunks[i]
+        data = decompress(self._mmap[chunk['offset']:chunk['offset'] + chunk['length']], chunk['codec'])
+        return [decode(json.loads(line)) for line in io.StringIO(data.decode('utf-8'))]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._file, self._mmap = None, None
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self.chunks)):
+            yield from self.read_chunk(i)
+
+    def episodes(self) -> Iterator[List[Dict[str, Any]]]:
+        """ Yield the records of each episode. Only one episode (and chunk) is
+            held in memory at a time. """
+        episode = []
+        for record in self.records():
+            if episode and record['episode'] != episode[-1]['episode']:
+                yield episode
+                episode = []
+            episode.append(record)
+        if episode:
+            yield episode
+
+
+class RecordingWrapper(gym.Wrapper):
+    """ Record the resets and steps of an LLF env to a trajectory file.
+
+        The wrapper should be applied on top of the env made by
+        `llfbench.make` (or on top of TextWrapper, to record the text actions
+        of the agent).
+    """
+
+    def __init__(self, env: gym.Env, path: str, *, chunk_size: int = 256, codec: Union[str, None] = None,
+                 info_keys: Sequence[str] = ()):
+        """
+            Args:
+                path: The trajectory file. Records are appended if it exists.
+
+                chunk_size: The number of records in a chunk.
+
+                codec: 'zstd' or 'gzip'. If None, zstd is used if available.
+
+                info_keys: The keys of info to record, besides 'success'.
+        """
+        super().__init__(env)
+        header = dict(env_id=None if env.spec is None else env.spec.id,
+                      action_space=encode_space(env.action_space),
+                      observation_space=encode_space(env.observation_space))
+        self.writer = TrajectoryWriter(path, chunk_size=chunk_size, codec=codec, header=header)
+        self.info_keys = tuple(info_keys)
+        self._episode = self.writer.last_episode
+        self._t = 0
+
+    def _record(self, observation, action, reward, terminated, truncated, info, **kwargs):
+        record = dict(episode=self._episode,
+                      t=self._t,
+                      instruction=observation['instruction'],
+                      observation=observation['observation'],
+                      action=action,
+                      feedback=observation['feedback'],
+                      reward=reward,
+                      terminated=terminated,
+                      truncated=truncated,
+                      success=info.get('success'),
+                      **kwargs)
+        for key in self.info_keys:
+            record[key] = info.get(key)
+        self.writer.write(record)
+
+    def reset(self, *, seed=None, options=None):
+        observation, info = self.env.reset(seed=seed, options=options)
+        self._episode += 1
+        self._t = 0
+        self._record(observation, None, None, False, False, info, seed=seed, options=options)
+        return observation, info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        self._t += 1
+        self._record(observation, action, reward, terminated, truncated, info)
+        return observation, reward, terminated, truncated, info
+
+    def close(self):
+        self.writer.close()
+        return super().close()
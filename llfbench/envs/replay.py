@@ -0,0 +1,152 @@
+import numpy as np
+import gymnasium as gym
+from typing import Any, Callable, Dict, List, Tuple, Union
+from llfbench.envs.recorder import TrajectoryReader, decode_space
+
+"""
+
+Replay of recorded LLF trajectories.
+
+ReplayEnv serves the episodes recorded by RecordingWrapper with the same
+reset and step interface as an LLF env. As long as the agent takes the
+recorded actions, the recorded instruction, observation, feedback and reward
+are returned without running the simulator. When the agent deviates from the
+recording (or steps past its end), the episode is simulated again by a live
+env made by `env_fn`: it is reset with the recorded seed and options, the
+recorded actions are replayed, and the agent's action is taken. The rest of
+the episode is then stepped on the live env. The action and observation
+spaces are read from the header of the recording, so that reading them does
+not make the live env either.
+
+Re-simulating gives the same results as the recording only if the episode was
+reset with a seed, since LLF envs are deterministic given the seed of reset.
+
+"""
+
+# The keys of a record which are not part of info.
+_RECORD_KEYS = ('episode', 't', 'instruction', 'observation', 'action', 'feedback', 'reward',
+                'terminated', 'truncated', 'success', 'seed', 'options')
+
+
+def same_action(a: Any, b: Any) -> bool:
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(np.asarray(a), np.asarray(b))
+    return a == b
+
+
+class ReplayEnv(gym.Env):
+    """ An LLF env that replays recorded episodes. """
+
+    def __init__(self, path: str, env_fn: Union[Callable[[], gym.Env], None] = None):
+        """
+            Args:
+                path: The trajectory file written by RecordingWrapper.
+
+                env_fn: A function that makes the env which was recorded
+                (configured the same way). It is called only when the agent
+                deviates from the recording. If None, deviating raises an
+                error.
+        """
+        self.reader = TrajectoryReader(path)
+        self.env_fn = env_fn
+        self._live_env = None
+        # The spaces of the recorded env; None if the recording has no header (e.g. an older one).
+        self._spaces = {name: None if self.reader.header.get(name) is None else decode_space(self.reader.header[name])
+                        for name in ('action_space', 'observation_space')}
+        # The chunks of each episode, so that an episode is read without reading the others.
+        self.episode_chunks = {}
+        for i, chunk in enumerate(self.reader.chunks):
+            for episode in range(chunk['first_episode'], chunk['last_episode'] + 1):
+                self.episode_chunks.setdefault(episode, []).append(i)
+        self.episode_ids = sorted(self.episode_chunks)
+        self._cached_chunk = (None, None)  # (index, records) of the last chunk read
+        self._next = 0  # the position in episode_ids of the next episode to reset to
+        self._records = None
+        self._t = 0
+        self._deviated = False
+
+    @property
+    def live_env(self) -> gym.Env:
+        """ The env used for re-simulation, made on first use. """
+        if self._live_env is None:
+            assert self.env_fn is not None, 'The agent deviated from the recording, but env_fn is not given to simulate it.'
+            self._live_env = self.env_fn()
+        return self._live_env
+
+    @property
+    def action_space(self) -> gym.Space:
+        return self._spaces['action_space'] or self.live_env.action_space
+
+    @property
+    def observation_space(self) -> gym.Space:
+        return self._spaces['observation_space'] or self.live_env.observation_space
+
+    def __len__(self):
+        """ The number of recorded episodes. """
+        return len(self.episode_ids)
+
+    def _read_chunk(self, i: int) -> List[Dict[str, Any]]:
+        if self._cached_chunk[0] != i:
+            self._cached_chunk = (i, self.reader.read_chunk(i))
+        return self._cached_chunk[1]
+
+    def read_episode(self, episode: int) -> List[Dict[str, Any]]:
+        """ Return the records of a recorded episode. """
+        assert episode in self.episode_chunks, f'Episode {episode} is not recorded.'
+        return [record for i in self.episode_chunks[episode] for record in self._read_chunk(i) if record['episode'] == episode]
+
+    @staticmethod
+    def _observation(record: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(instruction=record['instruction'], observation=record['observation'], feedback=record['feedback'])
+
+    @staticmethod
+    def _info(record: Dict[str, Any]) -> Dict[str, Any]:
+        info = {k: v for k, v in record.items() if k not in _RECORD_KEYS}
+        info['success'] = record['success']
+        info['replayed'] = True
+        return info
+
+    def reset(self, *, seed: Union[int, None] = None, options: Union[Dict[str, Any], None] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """ Start the next recorded episode, cycling through the recording.
+
+            The seed is ignored, since the episodes are recorded. Use
+            options={'episode': i} to start the recorded episode i.
+        """
+        if options is not None and 'episode' in options:
+            episode = options['episode']
+            self._next = self.episode_ids.index(episode) + 1
+        else:
+            assert len(self.episode_ids) > 0, 'There are no recorded episodes.'
+            episode = self.episode_ids[self._next % len(self.episode_ids)]
+            self._next += 1
+        self._records = self.read_episode(episode)
+        assert self._records[0]['t'] == 0, f'The reset of episode {episode} is not recorded.'
+        self._t = 0
+        self._deviated = False
+        return self._observation(self._records[0]), self._info(self._records[0])
+
+    def _simulate(self):
+        """ Bring the live env to the current step of the recorded episode. """
+        reset_record = self._records[0]
+        assert reset_record['seed'] is not None, 'The episode was recorded without a seed, so it cannot be simulated again.'
+        self.live_env.reset(seed=reset_record['seed'], options=reset_record['options'])
+        for record in self._records[1:self._t + 1]:
+            self.live_env.step(record['action'])
+
+    def step(self, action: Any) -> Tuple[Dict[str, Any], float, bool, bool, Dict[str, Any]]:
+        assert self._records is not None, 'Call reset before step.'
+        if not self._deviated:
+            if self._t + 1 < len(self._records) and same_action(action, self._records[self._t + 1]['action']):
+                self._t += 1
+                record = self._records[self._t]
+                return self._observation(record), record['reward'], record['terminated'], record['truncated'], self._info(record)
+            self._simulate()
+            self._deviated = True
+        observation, reward, terminated, truncated, info = self.live_env.step(action)
+        info['replayed'] = False
+        return observation, reward, terminated, truncated, info
+
+    def close(self):
+        self.reader.close()
+        if self._live_env is not None:
+            self._live_env.close()
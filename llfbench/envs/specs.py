@@ -0,0 +1,81 @@
+import importlib.util
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple, Union
+from gymnasium.envs.registration import register
+
+"""
+
+Static metadata of the registered LLF-Bench environments.
+
+Each family registers its envs with `register_env`, which registers the id to
+gymnasium and records an EnvSpec of the id. The spec can be read without
+making the env (which may import heavy dependencies, download data, or start
+a simulator), e.g. to enumerate configurations across all env ids.
+
+"""
+
+ACTION_SPACES = ('discrete', 'text', 'box')
+MAKE_COSTS = ('low', 'medium', 'high')
+
+
+@dataclass(frozen=True)
+class EnvSpec:
+    """
+        id: The env id, e.g. llf-gridworld-v0.
+
+        family: The family of the env, e.g. gridworld.
+
+        instruction_types: The supported INSTRUCTION_TYPES.
+
+        feedback_types: The supported FEEDBACK_TYPES.
+
+        reward_range: The reward range of the env.
+
+        action_space: The kind of action space: 'discrete', 'text' or 'box'.
+
+        make_cost: An estimate of the cost of making the env.
+            low: pure python, made in well under a second.
+            medium: loads data or calls a web service (about a second or more).
+            high: starts a simulator or may download a dataset.
+
+        requires: The third-party modules needed to make the env.
+    """
+    id: str
+    family: str
+    instruction_types: Tuple[str, ...]
+    feedback_types: Tuple[str, ...]
+    reward_range: Tuple[float, float]
+    action_space: str
+    make_cost: str
+    requires: Tuple[str, ...] = ()
+
+    @property
+    def available(self) -> bool:
+        """ Whether the modules needed to make the env are installed. """
+        return all(importlib.util.find_spec(module) is not None for module in self.requires)
+
+
+ENV_SPECS: Dict[str, EnvSpec] = {}
+
+
+def register_env(id: str, entry_point: str, kwargs: Dict[str, Any], *, family: str,
+                 instruction_types: Tuple[str, ...], feedback_types: Tuple[str, ...],
+                 reward_range: Tuple[float, float], action_space: str, make_cost: str,
+                 requires: Tuple[str, ...] = ()):
+    """ Register an env to gymnasium and record its spec. """
+    assert action_space in ACTION_SPACES, f'action_space must be one of {ACTION_SPACES}.'
+    assert make_cost in MAKE_COSTS, f'make_cost must be one of {MAKE_COSTS}.'
+    register(id=id, entry_point=entry_point, kwargs=kwargs)
+    ENV_SPECS[id] = EnvSpec(id=id,
+                            family=family,
+                            instruction_types=tuple(instruction_types),
+                            feedback_types=tuple(feedback_types),
+                            reward_range=tuple(reward_range),
+                            action_space=action_space,
+                            make_cost=make_cost,
+                            requires=tuple(requires))
+
+
+def get_spec(env_name: str) -> Union[EnvSpec, None]:
+    """ Return the spec of a registered env id, or None if it has no spec. """
+    return ENV_SPECS.get(env_name)
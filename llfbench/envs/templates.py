@@ -0,0 +1,155 @@
+import re
+import functools
+from types import ModuleType
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+"""
+
+Compiled templates for reformatting (paraphrasing) text.
+
+A template is a `str.format` string with named fields, e.g.
+
+    'I can find all the recommended {movie}s, nice!'
+
+Searching a template in a text finds the first substring that matches it and
+returns the values of its fields. The matching semantics are the same as
+`parse.search(template, text)`: a field matches the shortest non-empty text,
+the literal text is matched case-insensitively, and a field repeated in the
+template must match the same text. The difference is that the regex is
+compiled once per template instead of on every call.
+
+"""
+
+# This is the same as the field pattern of the `parse` library.
+_FIELD_RE = re.compile(r"({{|}}|{\w*(?:(?:\.\w+)|(?:\[[^\]]+\]))*(?::[^}]+)?})")
+_FLAGS = re.IGNORECASE | re.DOTALL
+
+
+def _to_regex(template: str, prefix: str = '') -> Tuple[str, List[str]]:
+    """ Translate a template into a regex. The field `name` becomes the group
+        `prefix + name`. Returns the regex and the field names. """
+    expression, fields = [], []
+    for part in _FIELD_RE.split(template):
+        if not part:
+            continue
+        elif part == '{{':
+            expression.append(r'\{')
+        elif part == '}}':
+            expression.append(r'\}')
+        elif part[0] == '{' and part[-1] == '}':
+            name = part[1:-1]
+            assert name.isidentifier(), f'Only named fields without format specification are supported, but got {part} in {template}.'
+            if name in fields:
+                expression.append(f'(?P={prefix}{name})')
+            else:
+                fields.append(name)
+                expression.append(f'(?P<{prefix}{name}>.+?)')
+        else:
+            expression.append(re.escape(part))
+    return ''.join(expression), fields
+
+
+class Template:
+    """ A template compiled into a regex. """
+
+    def __init__(self, template: str):
+        self.template = template
+        expression, self.fields = _to_regex(template)
+        self.regex = re.compile(expression, _FLAGS)
+
+    def search(self, text: str) -> Union[Dict[str, str], None]:
+        """ Return the fields of the first match of the template in `text`,
+            or None if there is no match. """
+        match = self.regex.search(text)
+        return None if match is None else match.groupdict()
+
+    def reformat(self, original: str, prompts: Sequence[str], format: Callable[..., str]) -> str:
+        """ Find the first match of the template in `original`, paraphrase it
+            with `format(prompts, **fields)`, and replace all the occurences
+            of the matched text with the paraphrase. """
+        fields = self.search(original)
+        if fields is None:
+            return original
+        old = self.template.format(**fields)
+        new = format(prompts, **fields)
+        return original.replace(old, new)
+
+    def __repr__(self):
+        return f'Template({self.template!r})'
+
+
+@functools.lru_cache(maxsize=None)
+def compile_template(template: str) -> Template:
+    """ Compile a template. Each template string is compiled only once. """
+    return Template(template)
+
+
+class TemplateSet:
+    """ A set of templates that are searched in a single regex pass.
+
+        `reformat` has the same effect as applying the templates one after
+        another with `Template.reformat`, when the templates do not overlap in
+        the text (e.g. the positive and the negative versions of a feedback,
+        only one of which can be present). Matches are found left to right
+        without overlaps, trying the templates in the given order at each
+        position.
+    """
+
+    def __init__(self, templates: Sequence[Tuple[str, Sequence[str]]]):
+        """
+            Args:
+                templates: A list of (template, prompts), where prompts are the
+                paraphrases of the template.
+        """
+        self.templates = [compile_template(template) for template, _ in templates]
+        self.prompts = [prompts for _, prompts in templates]
+        alternatives = []
+        for i, template in enumerate(self.templates):
+            expression, _ = _to_regex(template.template, prefix=f'_t{i}_')
+            alternatives.append(f'(?P<_t{i}>{expression})')
+        self.regex = re.compile('|'.join(alternatives), _FLAGS)
+
+    def search(self, text: str) -> Dict[int, Dict[str, str]]:
+        """ Return the fields of the first match of each template (indexed by
+            the position of the template in the set) found in `text`. """
+        found = {}
+        for match in self.regex.finditer(text):
+            i = int(match.lastgroup[2:])
+            if i not in found:
+                prefix = f'_t{i}_'
+                found[i] = {name: match.group(prefix + name) for name in self.templates[i].fields}
+                if len(found) == len(self.templates):
+                    break
+        return found
+
+    def reformat(self, original: Union[str, None], format: Callable[..., str]) -> Union[str, None]:
+        if original is None:
+            return original
+        found = self.search(original)
+        paraphrased = original
+        for i in sorted(found):  # paraphrase in the order of the templates
+            fields = found[i]
+            old = self.templates[i].template.format(**fields)
+            paraphrased = paraphrased.replace(old, format(self.prompts[i], **fields))
+        return paraphrased
+
+    def __len__(self):
+        return len(self.templates)
+
+
+def compile_prompts(module: ModuleType) -> Dict[str, Template]:
+    """ Compile the templates defined in a prompts module.
+
+        These are the `*_template` strings and the default template (i.e. the
+        first prompt) of each tuple of prompts. Returns a dict mapping the
+        variable names to the compiled templates.
+    """
+    compiled = {}
+    for name, value in vars(module).items():
+        if name.startswith('_'):
+            continue
+        if name.endswith('_template') and isinstance(value, str):
+            compiled[name] = compile_template(value)
+        elif isinstance(value, (tuple, list)) and len(value) > 0 and all(isinstance(v, str) for v in value):
+            compiled[name] = compile_template(value[0])
+    return compiled
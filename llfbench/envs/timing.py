@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from typing import Any, Dict, Union
+
+"""
+
+Opt-in timing of the stages of `LLFWrapper.step`.
+
+When enabled, each step of an LLF env is split into stages:
+
+    env_step: the step of the wrapped env (`LLFWrapper._env_step`). For
+        gridworld and alfworld, whose base envs compute the feedback, this
+        includes the feedback.
+    feedback: the rest of `_step`, i.e. computing the feedback.
+    paraphrase: `format`, `reformat` and `reformat_all`.
+    obs_check: `obs_check`.
+    verbalize: `_verbalize_feedback`.
+
+The time of a stage excludes the time of the stages nested in it, so the
+stages of a step add up to its total time. Besides wall time, the number of
+memory blocks allocated (net of the ones freed) in each stage is counted with
+`sys.getallocatedblocks`.
+
+The timing of each step is added to its info as info['timing'], and the
+totals per env (the class of its LLFWrapper) and stage are kept by the
+process-wide TIMER, which can be exported to a JSON file. When disabled, the
+only cost is checking `TIMER.enabled`.
+
+Enable it with `llfbench.envs.timing.enable()`, or by setting the environment
+variable LLFBENCH_TIMING to the path of the file to export to at exit.
+
+"""
+
+STAGES = ('env_step', 'feedback', 'paraphrase', 'obs_check', 'verbalize')
+
+
+class StepTimer:
+    """ Collect the time and allocations of nested stages. """
+
+    def __init__(self):
+        self.enabled = False
+        self.totals = {}  # env -> stage -> dict(count, time, blocks)
+        self._local = threading.local()  # a stack per thread, e.g. for envs stepped in an executor
+        self._lock = threading.Lock()
+
+    @property
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+            self._local.step = None
+        return self._local.stack
+
+    def start(self, name: str):
+        # [name, start time, start blocks, time of children, blocks of children]
+        self._stack.append([name, time.perf_counter(), sys.getallocatedblocks(), 0.0, 0])
+
+    def stop(self):
+        end, end_blocks = time.perf_counter(), sys.getallocatedblocks()
+        stack = self._stack
+        name, start, start_blocks, child_time, child_blocks = stack.pop()
+        elapsed, blocks = end - start, end_blocks - start_blocks
+        if stack:
+            stack[-1][3] += elapsed
+            stack[-1][4] += blocks
+        step = self._local.step
+        if step is not None:
+            stage = step.setdefault(name, dict(time=0.0, blocks=0))
+            stage['time'] += elapsed - child_time
+            stage['blocks'] += blocks - child_blocks
+
+    def start_step(self):
+        """ Start timing a step. Returns the timing of the outer step if this
+            step is nested in another one (which is restored by stop_step). """
+        self._stack  # initialize the thread-local state
+        outer, self._local.step = self._local.step, {}
+        return outer
+
+    def stop_step(self, env: str, outer: Union[Dict[str, Any], None] = None) -> Dict[str, Dict[str, float]]:
+        """ Stop timing a step and return the time and blocks of each stage. """
+        step, self._local.step = self._local.step, outer
+        with self._lock:
+            totals = self.totals.setdefault(env, {})
+            for name, stage in step.items():
+                total = totals.setdefault(name, dict(count=0, time=0.0, blocks=0))
+                total['count'] += 1
+                total['time'] += stage['time']
+                total['blocks'] += stage['blocks']
+        return step
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """ The mean time (ms) and blocks per step of each stage of each env. """
+        with self._lock:
+            return {env: {name: dict(count=total['count'],
+                                     total_time=total['time'],
+                                     mean_ms=total['time'] / total['count'] * 1e3,
+                                     mean_blocks=total['blocks'] / total['count'])
+                          for name, total in stages.items()}
+                    for env, stages in self.totals.items()}
+
+    def export(self, path: str):
+        """ Write the summary to a JSON file. """
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self.totals = {}
+
+
+TIMER = StepTimer()
+
+
+def enable(path: Union[str, None] = None):
+    """ Enable the timing. If path is given, the summary is exported to it at exit. """
+    TIMER.enabled = True
+    if path is not None:
+        atexit.register(TIMER.export, path)
+
+
+def disable():
+    TIMER.enabled = False
+
+
+if os.environ.get('LLFBENCH_TIMING'):
+    enable(os.environ['LLFBENCH_TIMING'])
@@ -1,8 +1,120 @@
 import numpy as np
+import string
+import builtins
+import functools
 
 from typing import Dict, Any, Tuple, Union, List, Callable
 
-def format(prompts : List[str], method : Union[str, int] = 'random', **kwargs : Dict[str,str]):
+
+class PromptTable:
+    """ The templates of a tuple of paraphrased prompts, pre-split for formatting.
+
+        Each template is split once into its literal text and fields (name,
+        format spec and conversion), so that formatting is a join instead of
+        parsing the template again, and gives the same text as `str.format`.
+        Templates without fields are stored already formatted. Templates with
+        other fields (attribute, index or positional fields, or nested specs)
+        are formatted with `str.format`.
+    """
+
+    CONVERSIONS = {'s': str, 'r': repr, 'a': ascii}
+
+    def __init__(self, prompts: Tuple[str, ...]):
+        self.prompts = prompts
+        self.templates = [self._split(prompt) for prompt in prompts]
+
+    @classmethod
+    def _split(cls, prompt: str) -> Union[str, List[Tuple[str, Union[str, None], str, Union[Callable, None]]], None]:
+        parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(prompt):
+            if field is not None and (not field.isidentifier() or '{' in spec or conversion not in (None, *cls.CONVERSIONS)):
+                return None  # use str.format
+            parts.append((literal, field, spec, None if conversion is None else cls.CONVERSIONS[conversion]))
+        if all(field is None for _, field, _, _ in parts):
+            return ''.join(literal for literal, _, _, _ in parts)
+        return parts
+
+    def __len__(self):
+        return len(self.prompts)
+
+    def render(self, idx: int, kwargs: Dict[str, Any]) -> str:
+        """ Format the idx-th template with kwargs. """
+        template = self.templates[idx]
+        if type(template) is str:
+            return template
+        if template is None:
+            return self.prompts[idx].format(**kwargs)
+        texts = []
+        for literal, field, spec, conversion in template:
+            texts.append(literal)
+            if field is not None:
+                value = kwargs[field]
+                if conversion is not None:
+                    value = conversion(value)
+                if type(value) is not str or spec:
+                    value = builtins.format(value, spec)  # `format` is the one of this module
+                texts.append(value)
+        return ''.join(texts)
+
+
+@functools.lru_cache(maxsize=1024)
+def _prompt_table(prompts: Tuple[str, ...]) -> PromptTable:
+    return PromptTable(prompts)
+
+
+def prompt_table(prompts: Union[Tuple[str, ...], List[str]]) -> PromptTable:
+    """ Return the (cached) PromptTable of a tuple of prompts. """
+    return _prompt_table(prompts if type(prompts) is tuple else tuple(prompts))
+
+
+class DeferredText:
+    """ A paraphrase whose template has been selected but not formatted yet.
+
+        The text is formatted by `render` (or `str`), so that text which is
+        never read is never formatted. `template` and `kwargs` are the
+        structured form of the text.
+    """
+
+    __slots__ = ('prompts', 'idx', 'kwargs')
+
+    def __init__(self, prompts: Tuple[str, ...], idx: int, kwargs: Dict[str, Any]):
+        self.prompts = prompts
+        self.idx = idx
+        self.kwargs = kwargs
+
+    @property
+    def template(self) -> str:
+        """ The selected template, which identifies the text up to its kwargs. """
+        return self.prompts[self.idx]
+
+    def render(self) -> str:
+        return prompt_table(self.prompts).render(self.idx, self.kwargs)
+
+    def __str__(self):
+        return self.render()
+
+    def __repr__(self):
+        return f'DeferredText({self.template!r}, {self.kwargs!r})'
+
+    def __eq__(self, other):
+        if isinstance(other, DeferredText):
+            return self.template == other.template and self.kwargs == other.kwargs
+        return NotImplemented
+
+
+def select(prompts : List[str], method : Union[str, int] = 'random', rng : Union[np.random.Generator, None] = None) -> Tuple[Tuple[str, ...], int]:
+    """ Select a template from a set of paraphrased prompts (see `format`).
+        Returns the prompts as a tuple and the index of the template. """
+    prompts = prompts if type(prompts) is tuple else tuple(prompts)
+    if method=='random':
+        idx = np.random.randint(len(prompts)) if rng is None else rng.integers(len(prompts))
+    else:
+        assert type(method)==int, "The method must be either 'random', 'llm', a callable, or an integer."
+        idx = method % len(prompts)
+    return prompts, int(idx)
+
+
+def format(prompts : List[str], method : Union[str, int] = 'random', rng : Union[np.random.Generator, None] = None, **kwargs : Dict[str,str]):
     """ A helper method for selecting from a set of paraphrased prompts.
 
         Args:
@@ -16,13 +128,34 @@ def format(prompts : List[str], method : Union[str, int] = 'random', **kwargs :
 
             If it is an integer, it is used as the index to select from the template in `prompts`.
 
+            rng: The random number generator used by 'random'. If None, the
+            global `np.random` is used.
+
             **kwargs: The keyword arguments to be used in formatting the template.
 
     """
+    prompts, idx = select(prompts, method, rng)
+    return prompt_table(prompts).render(idx, kwargs)
 
-    if method=='random':
-        return np.random.choice(prompts).format(**kwargs)
+
+def defer(prompts : List[str], method : Union[str, int] = 'random', rng : Union[np.random.Generator, None] = None, **kwargs : Dict[str,str]) -> DeferredText:
+    """ The same as `format`, but the selected template is formatted only
+        when the returned DeferredText is rendered. The template is selected
+        now, so this draws from `rng` exactly as `format` does. """
+    prompts, idx = select(prompts, method, rng)
+    return DeferredText(prompts, idx, kwargs)
+
+
+def get_rng_state(rng: Union[np.random.Generator, np.random.RandomState]) -> Dict[str, Any]:
+    """ Return the state of a numpy random number generator. """
+    if isinstance(rng, np.random.Generator):
+        return rng.bit_generator.state
+    return rng.get_state(legacy=False)
+
+
+def set_rng_state(rng: Union[np.random.Generator, np.random.RandomState], state: Dict[str, Any]):
+    """ Restore the state returned by `get_rng_state` in place. """
+    if isinstance(rng, np.random.Generator):
+        rng.bit_generator.state = state
     else:
-        assert type(method)==int, "The method must be either 'random', 'llm', a callable, or an integer."
-        idx = method
-        return prompts[idx % len(prompts)].format(**kwargs)
+        rng.set_state(state)
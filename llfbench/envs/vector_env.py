@@ -0,0 +1,306 @@
+import sys
+import traceback
+import multiprocessing as mp
+import numpy as np
+import gymnasium as gym
+from gymnasium.vector.utils import CloudpickleWrapper
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Union
+
+"""
+
+Vectorized LLF-Bench environments.
+
+An LLF env returns a Dict observation whose 'instruction' and 'feedback' are
+free-form text (and whose 'observation' may be text, an array, or a dict of
+them). These cannot be stacked into shared-memory arrays the way Gymnasium's
+AsyncVectorEnv expects, so the vector envs here batch each key of the
+observation dict into a tuple with one entry per sub-environment, e.g.
+
+    observations['feedback'] = (feedback_0, feedback_1, ..., feedback_{n-1})
+
+Rewards, terminations and truncations are numpy arrays and infos follow the
+Gymnasium convention of a dict of arrays with a boolean mask `_key` per key.
+
+When autoreset is enabled, a sub-environment that terminates or truncates is
+reset right away. The observation and info of its last step (which carry the
+last feedback) are stored in infos['final_observation'] and
+infos['final_info'], as in Gymnasium.
+
+"""
+
+
+def batch_space(space: gym.Space, n: int) -> gym.Space:
+    """ Batch the observation space of an LLF env into a Dict of Tuples. """
+    if isinstance(space, gym.spaces.Dict):
+        return gym.spaces.Dict({k: gym.spaces.Tuple([s] * n) for k, s in space.spaces.items()})
+    return gym.spaces.Tuple([space] * n)
+
+
+def batch_observations(observations: Sequence[Dict[str, Any]]) -> Dict[str, Tuple[Any, ...]]:
+    """ Turn a list of observation dicts into a dict of tuples. """
+    keys = observations[0].keys()
+    return {k: tuple(o[k] for o in observations) for k in keys}
+
+
+def _seeds(seed: Union[int, List[int], None], num_envs: int) -> List[Union[int, None]]:
+    if seed is None:
+        return [None] * num_envs
+    if isinstance(seed, int):
+        return [seed + i for i in range(num_envs)]
+    assert len(seed) == num_envs, f'Expected {num_envs} seeds but got {len(seed)}.'
+    return list(seed)
+
+
+def _step_with_autoreset(env: gym.Env, action: Any, autoreset: bool):
+    observation, reward, terminated, truncated, info = env.step(action)
+    if autoreset and (terminated or truncated):
+        final_observation, final_info = observation, info
+        observation, info = env.reset()
+        info['final_observation'] = final_observation
+        info['final_info'] = final_info
+    return observation, reward, terminated, truncated, info
+
+
+class LLFVectorEnv(gym.vector.VectorEnv):
+    """ Base class of the vectorized LLF envs. It implements the batching of
+        the results; subclasses decide how the sub-environments are run.
+    """
+
+    def __init__(self, num_envs: int, observation_space: gym.Space, action_space: gym.Space, autoreset: bool = True):
+        super().__init__(num_envs, observation_space, action_space)
+        self.observation_space = batch_space(observation_space, num_envs)
+        self.action_space = gym.spaces.Tuple([action_space] * num_envs)
+        self.autoreset = autoreset
+
+    def _batch_reset(self, results):
+        observations, infos = [], {}
+        for i, (observation, info) in enumerate(results):
+            observations.append(observation)
+            infos = self._add_info(infos, info, i)
+        return batch_observations(observations), infos
+
+    def _batch_step(self, results):
+        observations, infos = [], {}
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        terminateds = np.zeros(self.num_envs, dtype=np.bool_)
+        truncateds = np.zeros(self.num_envs, dtype=np.bool_)
+        for i, (observation, reward, terminated, truncated, info) in enumerate(results):
+            observations.append(observation)
+            rewards[i], terminateds[i], truncateds[i] = reward, terminated, truncated
+            infos = self._add_info(infos, info, i)
+        return batch_observations(observations), rewards, terminateds, truncateds, infos
+
+    def _add_info(self, infos, info, env_num):
+        # The values of a key may have different types across the
+        # sub-environments (e.g. 'expert_action' is None once the goal is
+        # reached), so fall back to an object array when a value does not fit.
+        for k, v in info.items():
+            try:
+                infos = super()._add_info(infos, {k: v}, env_num)
+            except (TypeError, ValueError):
+                infos[k] = infos[k].astype(object)
+                infos = super()._add_info(infos, {k: v}, env_num)
+        return infos
+
+    def _check_actions(self, actions):
+        assert len(actions) == self.num_envs, f'Expected {self.num_envs} actions but got {len(actions)}.'
+        return list(actions)
+
+
+class SyncLLFVectorEnv(LLFVectorEnv):
+    """ Step the sub-environments one after another in the current process. """
+
+    def __init__(self, env_fns: Sequence[Callable[[], gym.Env]], autoreset: bool = True):
+        self.envs = [env_fn() for env_fn in env_fns]
+        env = self.envs[0]
+        super().__init__(len(self.envs), env.observation_space, env.action_space, autoreset=autoreset)
+        self._actions = None
+
+    def reset_async(self, seed=None, options=None):
+        self._reset_kwargs = dict(seeds=_seeds(seed, self.num_envs), options=options)
+
+    def reset_wait(self, seed=None, options=None):
+        seeds, options = self._reset_kwargs['seeds'], self._reset_kwargs['options']
+        results = [env.reset(seed=s, options=options) for env, s in zip(self.envs, seeds)]
+        return self._batch_reset(results)
+
+    def step_async(self, actions):
+        self._actions = self._check_actions(actions)
+
+    def step_wait(self):
+        results = [_step_with_autoreset(env, a, self.autoreset) for env, a in zip(self.envs, self._actions)]
+        self._actions = None
+        return self._batch_step(results)
+
+    def call(self, name: str, *args, **kwargs) -> Tuple[Any, ...]:
+        results = []
+        for env in self.envs:
+            function = getattr(env, name)
+            results.append(function(*args, **kwargs) if callable(function) else function)
+        return tuple(results)
+
+    def call_each(self, name: str, args_list: Sequence[Tuple], indices: Union[Sequence[int], None] = None) -> Tuple[Any, ...]:
+        """ Call `name` on the sub-environments with different arguments for each of them. """
+        indices = range(len(args_list)) if indices is None else indices
+        return tuple(getattr(self.envs[i], name)(*args) for i, args in zip(indices, args_list))
+
+    def get_attr(self, name: str) -> Tuple[Any, ...]:
+        return tuple(getattr(env, name) for env in self.envs)
+
+    def set_attr(self, name: str, values: Any):
+        if not isinstance(values, (list, tuple)):
+            values = [values] * self.num_envs
+        for env, value in zip(self.envs, values):
+            setattr(env, name, value)
+
+    def close_extras(self, **kwargs):
+        for env in self.envs:
+            env.close()
+
+
+def _worker(index: int, env_fn: CloudpickleWrapper, pipe, parent_pipe, autoreset: bool):
+    """ The loop run by each subprocess of ProcessLLFVectorEnv. """
+    parent_pipe.close()
+    env = None
+    try:
+        env = env_fn()
+        while True:
+            command, data = pipe.recv()
+            if command == 'reset':
+                pipe.send((env.reset(**data), True))
+            elif command == 'step':
+                pipe.send((_step_with_autoreset(env, data, autoreset), True))
+            elif command == 'call':
+                name, args, kwargs = data
+                function = getattr(env, name)
+                pipe.send((function(*args, **kwargs) if callable(function) else function, True))
+            elif command == 'setattr':
+                name, value = data
+                setattr(env, name, value)
+                pipe.send((None, True))
+            elif command == 'spaces':
+                pipe.send(((env.observation_space, env.action_space), True))
+            elif command == 'close':
+                pipe.send((None, True))
+                break
+            else:
+                raise RuntimeError(f'Received unknown command `{command}`.')
+    except (KeyboardInterrupt, Exception):
+        error_type, error, _ = sys.exc_info()
+        pipe.send(((index, error_type.__name__, str(error), traceback.format_exc()), False))
+    finally:
+        if env is not None:
+            env.close()
+        pipe.close()
+
+
+class ProcessLLFVectorEnv(LLFVectorEnv):
+    """ Step the sub-environments in parallel, one subprocess per sub-environment.
+
+        Observations are pickled back to the main process, so this works with
+        the Text and Feedback fields of LLF observations which cannot be
+        placed in shared memory.
+    """
+
+    def __init__(self, env_fns: Sequence[Callable[[], gym.Env]], autoreset: bool = True, context: Union[str, None] = None, daemon: bool = True):
+        ctx = mp.get_context(context)
+        self.parent_pipes, self.processes = [], []
+        for index, env_fn in enumerate(env_fns):
+            parent_pipe, child_pipe = ctx.Pipe()
+            process = ctx.Process(target=_worker,
+                                  name=f'Worker<{type(self).__name__}>-{index}',
+                                  args=(index, CloudpickleWrapper(env_fn), child_pipe, parent_pipe, autoreset))
+            process.daemon = daemon
+            process.start()
+            child_pipe.close()
+            self.parent_pipes.append(parent_pipe)
+            self.processes.append(process)
+        self.closed, self.viewer = False, None
+        self._waiting = None
+        # Query the spaces from a worker instead of building an env here.
+        self.parent_pipes[0].send(('spaces', None))
+        observation_space, action_space = self._receive([self.parent_pipes[0]])[0]
+        super().__init__(len(self.processes), observation_space, action_space, autoreset=autoreset)
+
+    def _receive(self, pipes):
+        results, errors = [], []
+        for pipe in pipes:
+            result, success = pipe.recv()
+            (results if success else errors).append(result)
+        if errors:
+            self.close(terminate=True)
+            index, name, message, trace = errors[0]
+            raise RuntimeError(f'Worker {index} raised {name}: {message}\n{trace}')
+        return results
+
+    def _send(self, command, data_list):
+        assert not self.closed, 'Trying to operate on a closed vector env.'
+        assert self._waiting is None, f'Calling `{command}` while waiting for a pending call to `{self._waiting}`.'
+        for pipe, data in zip(self.parent_pipes, data_list):
+            pipe.send((command, data))
+        self._waiting = command
+
+    def _wait(self, command):
+        assert self._waiting == command, f'Calling `{command}_wait` without any prior call to `{command}_async`.'
+        self._waiting = None
+        return self._receive(self.parent_pipes)
+
+    def reset_async(self, seed=None, options=None):
+        seeds = _seeds(seed, self.num_envs)
+        self._send('reset', [dict(seed=s, options=options) for s in seeds])
+
+    def reset_wait(self, seed=None, options=None):
+        return self._batch_reset(self._wait('reset'))
+
+    def step_async(self, actions):
+        self._send('step', self._check_actions(actions))
+
+    def step_wait(self):
+        return self._batch_step(self._wait('step'))
+
+    def call_async(self, name: str, *args, **kwargs):
+        self._send('call', [(name, args, kwargs)] * self.num_envs)
+
+    def call_wait(self, **kwargs) -> Tuple[Any, ...]:
+        return tuple(self._wait('call'))
+
+    def call_each(self, name: str, args_list: Sequence[Tuple], indices: Union[Sequence[int], None] = None) -> Tuple[Any, ...]:
+        """ Call `name` on the sub-environments with different arguments for each of them. """
+        indices = range(len(args_list)) if indices is None else indices
+        pipes = [self.parent_pipes[i] for i in indices]
+        assert self._waiting is None, f'Calling `call_each` while waiting for a pending call to `{self._waiting}`.'
+        for pipe, args in zip(pipes, args_list):
+            pipe.send(('call', (name, tuple(args), {})))
+        return tuple(self._receive(pipes))
+
+    def get_attr(self, name: str) -> Tuple[Any, ...]:
+        return self.call(name)
+
+    def set_attr(self, name: str, values: Any):
+        if not isinstance(values, (list, tuple)):
+            values = [values] * self.num_envs
+        self._send('setattr', [(name, value) for value in values])
+        self._wait('setattr')
+
+    def close_extras(self, timeout=None, terminate=False):
+        if not terminate and self._waiting is not None:
+            self._wait(self._waiting)
+        for pipe, process in zip(self.parent_pipes, self.processes):
+            if terminate:
+                if process.is_alive():
+                    process.terminate()
+            elif process.is_alive():
+                try:
+                    pipe.send(('close', None))
+                    pipe.recv()
+                except (EOFError, BrokenPipeError):
+                    pass
+        for pipe, process in zip(self.parent_pipes, self.processes):
+            pipe.close()
+            process.join(timeout)
+
+
+VECTOR_MODES = {
+    'sync': SyncLLFVectorEnv,
+    'process': ProcessLLFVectorEnv,
+}
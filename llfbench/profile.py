@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import signal
+import pstats
+import cProfile
+import argparse
+import warnings
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Union
+import gymnasium as gym
+import llfbench
+
+"""
+
+Profile an LLF env from the command line.
+
+    python -m llfbench.profile llf-gridworld-v0 [--steps 1000] [--policy expert] [--output profile]
+
+The env is made with `llfbench.make` and driven for `--steps` steps by a
+built-in policy: random actions, or with `--policy expert` the
+`info['expert_action']` of the envs that provide one (e.g. gridworld and
+alfworld), falling back to random actions otherwise. The envs with a Text
+action space, which cannot be sampled, take a fixed valid action instead. Episodes are reset with
+consecutive seeds, so every pass below steps through the same trajectory.
+
+The workload is run three times, so that the profilers do not distort each
+other:
+
+    1. under cProfile; the stats are written to `<output>/<env_id>.prof`
+       (readable with pstats or snakeviz) and the top functions by cumulative
+       time are printed.
+    2. under a sampling profiler (SIGPROF every `--interval` seconds of CPU
+       time); the sampled stacks are written in the collapsed format to
+       `<output>/<env_id>.collapsed`, e.g. for flamegraph.pl or speedscope.
+    3. under tracemalloc; the top allocation sites of the memory still held
+       at the end, and the peak traced memory, are printed.
+
+"""
+
+
+# Actions of the envs with a Text action space, which cannot be sampled.
+TEXT_ACTIONS = {
+    'llf-optimization': 'x = [1.0, 2.0]',
+    'llf-reco': '[{"title": "John Wick"}]',
+    'llf-poem': 'The sun is up\nThe sky is blue today\nHello there',
+    'llf-alfworld': 'look',
+}
+
+
+def text_action(env_name: str) -> str:
+    for prefix, action in TEXT_ACTIONS.items():
+        if env_name.startswith(prefix):
+            return action
+    return 'test action'
+
+
+def random_action(env) -> Any:
+    """ A random action, or the fixed action of an env with a Text action space. """
+    if isinstance(env.action_space, gym.spaces.Text):
+        return text_action(env.spec.id)
+    return env.action_space.sample()
+
+
+def run(env, steps: int, policy: str = 'random', seed: int = 0):
+    """ Step the env for `steps` steps, resetting it when an episode ends. """
+    env.action_space.seed(seed)
+    _, info = env.reset(seed=seed)
+    for _ in range(steps):
+        if policy == 'expert' and info.get('expert_action') is not None:
+            action = info['expert_action']
+        else:
+            action = random_action(env)
+        _, _, terminated, truncated, info = env.step(action)
+        if terminated or truncated:
+            seed += 1
+            _, info = env.reset(seed=seed)
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """ Count the stacks of the main thread, sampled every `interval` seconds
+        of CPU time. """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def _sample(self, signum, frame):
+        names = []
+        while frame is not None:
+            names.append(frame_name(frame).replace(';', ':'))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(names))] += 1
+
+    def __enter__(self):
+        self._handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def __exit__(self, *args):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._handler)
+
+    def write(self, path: str):
+        """ Write the stacks in the collapsed format, one `stack count` per line. """
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def profile_calls(env, args, path: str) -> pstats.Stats:
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    run(env, args.steps, args.policy, args.seed)
+    profiler.disable()
+    elapsed = time.perf_counter() - start
+    profiler.dump_stats(path)
+    print(f'cProfile: {args.steps} steps in {elapsed:.2f} s (with profiling overhead); stats written to {path}')
+    stats = pstats.Stats(profiler, stream=sys.stdout)
+    stats.sort_stats('cumulative').print_stats(args.top)
+    return stats
+
+
+def profile_stacks(env, args, path: str) -> StackSampler:
+    with StackSampler(args.interval) as sampler:
+        run(env, args.steps, args.policy, args.seed)
+    sampler.write(path)
+    print(f'Sampling: {sum(sampler.stacks.values())} samples of {len(sampler.stacks)} stacks written to {path}')
+    return sampler
+
+
+def profile_allocations(env, args) -> List[tracemalloc.StatisticDiff]:
+    tracemalloc.start(args.frames)
+    before = tracemalloc.take_snapshot()
+    run(env, args.steps, args.policy, args.seed)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')]
+    statistics = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+    print(f'tracemalloc: peak traced memory {peak / 2**20:.1f} MB; top allocation sites still held after {args.steps} steps:')
+    for statistic in statistics[:args.top]:
+        print(f'    {statistic}')
+    return statistics
+
+
+def build_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m llfbench.profile', description='Profile an LLF env.')
+    parser.add_argument('env_id')
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--policy', choices=('random', 'expert'), default='random')
+    parser.add_argument('--instruction_type', default='b')
+    parser.add_argument('--feedback_type', default='a')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='profile', help='the directory of the output files')
+    parser.add_argument('--top', type=int, default=20, help='the number of functions and allocation sites to print')
+    parser.add_argument('--interval', type=float, default=0.001, help='the sampling interval (s) of the collapsed stacks')
+    parser.add_argument('--frames', type=int, default=1, help='the number of frames of a tracemalloc allocation site')
+    return parser
+
+
+def main(argv: Union[List[str], None] = None) -> Dict[str, str]:
+    args = build_argparser().parse_args(argv)
+    warnings.filterwarnings('ignore')
+    env = llfbench.make(args.env_id, instruction_type=args.instruction_type, feedback_type=args.feedback_type)
+    run(env, min(args.steps, 10), args.policy, args.seed)  # warm up, e.g. the caches of compiled templates
+
+    os.makedirs(args.output, exist_ok=True)
+    paths = dict(prof=os.path.join(args.output, f'{args.env_id}.prof'),
+                 collapsed=os.path.join(args.output, f'{args.env_id}.collapsed'))
+    profile_calls(env, args, paths['prof'])
+    profile_stacks(env, args, paths['collapsed'])
+    profile_allocations(env, args)
+    env.close()
+    return paths
+
+
+if __name__ == '__main__':
+    main()
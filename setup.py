@@ -32,6 +32,7 @@ setuptools.setup(
     ],
     extras_require={
         'metaworld': ['metaworld@git+https://github.com/Farama-Foundation/Metaworld.git@c822f28#egg=metaworld'],
-        'alfworld': [ 'alfworld>=0.3.0' ]
+        'alfworld': [ 'alfworld>=0.3.0' ],
+        'zstd': ['zstandard'],  # faster compression of recorded trajectories
     }
 )
@@ -0,0 +1,84 @@
+import time
+import numpy as np
+import gymnasium as gym
+import llfbench
+from llfbench.envs.action_parser import ActionParseError, make_parser
+from llfbench.envs.env_wrappers import TextWrapper
+
+
+def check_error(parser, text, reason):
+    try:
+        parser.parse(text)
+    except ActionParseError as error:
+        assert reason in error.reason, error.feedback
+        assert error.action == text
+        return error
+    raise AssertionError(f'{text!r} should not be parsed.')
+
+
+def test_discrete():
+    parser = make_parser(gym.spaces.Discrete(4))
+    assert parser.parse('2') == 2
+    assert parser.parse(' 3\n') == 3
+    check_error(parser, '4', 'out of range')
+    check_error(parser, 'two', 'not an integer')
+    check_error(parser, '1.5', 'not an integer')
+
+
+def test_box():
+    parser = make_parser(gym.spaces.Box(-1, 1, (4,)))
+    expected = np.array([0.1, -0.2, 0.3, 1.0], dtype=np.float32)
+    for text in ['[0.1, -0.2, 0.3, 1]', '(0.1, -0.2, 0.3, 1)', '[0.1 -0.2 0.3 1.]', '0.1, -0.2, 0.3, 1', ' [1e-1, -2e-1, .3, +1,] ']:
+        action = parser.parse(text)
+        assert action.dtype == np.float32 and np.array_equal(action, expected), text
+    check_error(parser, '[0.1, 0.2, 0.3]', 'shape')
+    check_error(parser, '[0.1, 0.2, 0.3', 'not closed')
+    error = check_error(parser, '[0.1, x, 0.3, 1]', 'unexpected character')
+    assert error.position == 6
+    check_error(parser, '__import__("os").getcwd()', 'unexpected character')
+    # A long text that almost matches a flat list is rejected without backtracking.
+    start = time.perf_counter()
+    check_error(parser, '    '.join(['1'] * 40) + ' ?', 'unexpected character')
+    assert time.perf_counter() - start < 1.0
+
+    parser = make_parser(gym.spaces.Box(-1, 1, (2, 2)))
+    assert np.array_equal(parser.parse('[[1, 2], [3, 4]]'), [[1, 2], [3, 4]])
+    check_error(parser, '[[1, 2], [3, 4]] [5]', 'after the action')
+    check_error(parser, '[1, 2, 3, 4]', 'shape')
+    check_error(parser, '[[1, 2], [3]]', 'do not form an array')
+    check_error(parser, '[' * 3000, 'nested too deeply')
+    check_error(make_parser(gym.spaces.Box(-1, 1, (2,))), '[[1, 2], [3]]', 'nested too deeply')
+    check_error(make_parser(gym.spaces.Box(-1, 1, (2,), dtype=np.int64)), '[nan, 1]', 'do not form an array')
+
+
+def test_parse_batch():
+    parser = make_parser(gym.spaces.Discrete(4))
+    results = parser.parse_batch(['0', 'left', '3'])
+    assert results[0] == 0 and results[2] == 3
+    assert isinstance(results[1], ActionParseError)
+
+
+def test_text_wrapper():
+    env = TextWrapper(llfbench.make('llf-gridworld-v0'))
+    env.reset(seed=0)
+    observation, reward, terminated, truncated, info = env.step('north')
+    assert observation['feedback'].startswith('Cannot parse action')
+    assert info['parse_error']['reason'] == 'it is not an integer'
+    assert not info['success']
+    observation, reward, terminated, truncated, info = env.step('1')
+    assert 'parse_error' not in info
+
+    # Texts that the parser rejects, and not numpy or the recursion limit.
+    env = TextWrapper(llfbench.make('llf-highway-parking-v0'))
+    env.reset(seed=0)
+    for action in ('[[1,2],[3]]', '[' * 3000):
+        observation, reward, terminated, truncated, info = env.step(action)
+        assert observation['feedback'].startswith('Cannot parse action'), action
+        assert 'parse_error' in info
+
+
+if __name__ == '__main__':
+    test_discrete()
+    test_box()
+    test_parse_batch()
+    test_text_wrapper()
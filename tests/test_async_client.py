@@ -0,0 +1,143 @@
+import os
+import time
+import pickle
+import random
+import sqlite3
+import asyncio
+import tempfile
+import openai
+from llfbench.agents.async_client import AsyncClient, TokenBucket, backoff_delay
+from llfbench.agents.llm_cache import ResponseCache
+from llfbench.agents.failures import CircuitBreaker, LLMCallError
+
+
+MESSAGES = [{'role': 'user', 'content': 'Go up.'}]
+
+
+class FakeBackend:
+    """ A request coroutine that takes `latency` seconds and fails with the
+        given errors first. """
+
+    def __init__(self, latency=0.02, errors=()):
+        self.latency = latency
+        self.errors = list(errors)
+        self.in_flight = self.max_in_flight = self.calls = 0
+
+    async def __call__(self, messages, model, temperature, timeout, max_tokens=None, logprobs=None):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.errors:
+                raise self.errors.pop(0)
+            return messages[-1]['content'], {'response': {'usage': {'total_tokens': 10}}}
+        finally:
+            self.in_flight -= 1
+
+
+def call_all(client, n):
+    async def main():
+        return await asyncio.gather(*[client.call(MESSAGES, 'azure:gpt-35-turbo', 0.0, 10) for _ in range(n)])
+    return asyncio.run(main())
+
+
+def test_max_in_flight():
+    """ At most max_in_flight requests are in flight, from coroutines and threads alike. """
+    backend = FakeBackend()
+    client = AsyncClient(backend, max_in_flight=3)
+    results = call_all(client, 12)
+    assert [response for response, _ in results] == ['Go up.'] * 12
+    assert backend.max_in_flight == 3 and client.stats['requests'] == 12 and client.stats['tokens'] == 120
+    assert client.run(client.call(MESSAGES, 'azure:gpt-35-turbo', 0.0, 10))[0] == 'Go up.'
+    copy = pickle.loads(pickle.dumps(client))  # e.g. sent to a worker
+    assert copy.max_in_flight == 3 and copy.stats['requests'] == 0
+
+
+def test_rate_limit():
+    """ A bucket paces the acquisitions at its rate once its burst is spent. """
+    async def acquire_all(bucket, n):
+        await asyncio.gather(*[bucket.acquire() for _ in range(n)])
+
+    bucket = TokenBucket(1200, burst=1)  # 20 per s
+    start = time.monotonic()
+    asyncio.run(acquire_all(bucket, 11))
+    assert 0.45 < time.monotonic() - start < 1.5
+
+    bucket = TokenBucket(60, burst=10, clock=lambda: 0.0)  # a stopped clock
+    asyncio.run(bucket.acquire(4))
+    bucket.charge(-100)  # a refund does not exceed the burst
+    assert bucket.level == 10
+
+    client = AsyncClient(FakeBackend(latency=0.0), requests_per_minute=60, tokens_per_minute=6000)
+    call_all(client, 5)
+    assert client.requests.level < 6  # 10 per burst
+    assert client.tokens.level < 1000 - 5 * 10 + 1
+
+
+def test_backoff():
+    """ Retryable errors are retried after a jittered backoff; fatal ones are not. """
+    rng = random.Random(0)
+    delays = [backoff_delay(attempt, base=1.0, cap=8.0, rng=rng) for attempt in range(1, 7)]
+    assert all(0 <= d <= min(8.0, 2 ** (a - 1)) for a, d in zip(range(1, 7), delays))
+    assert len(set(delays)) == len(delays)
+
+    backend = FakeBackend(errors=[openai.error.RateLimitError('slow down'), openai.error.Timeout('timed out')])
+    client = AsyncClient(backend, backoff_base=0.01)
+    assert call_all(client, 1)[0][0] == 'Go up.'
+    assert backend.calls == 3 and client.stats['retries'] == 2
+
+    backend = FakeBackend(errors=[openai.error.InvalidRequestError('too long', 'messages')])
+    client = AsyncClient(backend, backoff_base=0.01)
+    try:
+        call_all(client, 1)
+        assert False, 'the request should fail'
+    except LLMCallError as e:
+        assert e.kind == 'request' and e.attempts == 1
+    assert backend.calls == 1 and client.stats['failures'] == 1
+
+    try:
+        asyncio.run(AsyncClient(FakeBackend()).call(MESSAGES, 'azure:gpt-35-turbo', 0.0, 10, max_attempts=0))
+        assert False, 'the request should fail'
+    except LLMCallError as e:
+        assert e.attempts == 0
+
+
+def test_breaker():
+    """ Requests resume after the probe of an open breaker is rate limited. """
+    backend = FakeBackend(errors=[openai.error.APIConnectionError('refused'), openai.error.RateLimitError('slow down')])
+    breaker = CircuitBreaker(threshold=1, cooldown=0.1)
+    client = AsyncClient(backend, backoff_base=0.01, breaker=breaker)
+    start = time.monotonic()
+    assert [response for response, _ in call_all(client, 3)] == ['Go up.'] * 3
+    assert time.monotonic() - start < 2.0 and breaker.closed
+
+
+def test_locked_cache():
+    """ A cache write waiting for a lock does not stall the other requests
+        on the loop of the client, and the response is still returned. """
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, 'cache.db'), timeout=1.0)
+        other = sqlite3.connect(cache.path, isolation_level=None)
+        other.execute('BEGIN IMMEDIATE')
+        client = AsyncClient(FakeBackend())
+
+        async def main():
+            cached = asyncio.ensure_future(client.call(MESSAGES, 'azure:gpt-35-turbo', 0.0, 10, cache=cache))
+            await asyncio.sleep(0.2)  # its put is waiting for the lock
+            start = time.monotonic()
+            response, _ = await client.call(MESSAGES, 'azure:gpt-35-turbo', 0.7, 10, cache=cache)  # not cached
+            assert response == 'Go up.' and time.monotonic() - start < 0.5 and not cached.done()
+            return await cached
+
+        assert asyncio.run(main())[0] == 'Go up.'
+        other.execute('ROLLBACK')
+        assert cache.get(cache.key('azure:gpt-35-turbo', MESSAGES, 0.0, None)) is None
+
+
+if __name__ == '__main__':
+    test_max_in_flight()
+    test_rate_limit()
+    test_backoff()
+    test_breaker()
+    test_locked_cache()
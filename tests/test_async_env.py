@@ -0,0 +1,84 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import gymnasium as gym
+import pytest
+import llfbench
+from llfbench.envs.llf_env import AsyncWrapper
+
+
+ACTIONS = [0, 1, 2, 3] * 3
+
+
+class CountingExecutor(ThreadPoolExecutor):
+
+    def __init__(self):
+        super().__init__(4)
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        return super().submit(*args, **kwargs)
+
+
+def rollout(env, seed):
+    results = [str(env.reset(seed=seed)[0])]
+    for action in ACTIONS:
+        results.append(str(env.step(action)[:4]))
+    return results
+
+
+async def arollout(env, seed):
+    results = [str((await env.areset(seed=seed))[0])]
+    for action in ACTIONS:
+        results.append(str((await env.astep(action))[:4]))
+        await asyncio.sleep(0)  # interleave the episodes
+    return results
+
+
+def check_concurrent(blocking):
+    """ Episodes run concurrently on one event loop match the same episodes
+        run one after another with reset and step. """
+    seeds = range(4)
+    expected = [rollout(llfbench.make('llf-gridworld-v0', feedback_type='a'), seed) for seed in seeds]
+
+    envs = [llfbench.make('llf-gridworld-v0', feedback_type='a') for _ in seeds]
+    executor = CountingExecutor()
+    for env in envs:
+        env.blocking = blocking  # the gridworld is cheap; force the executor
+        env.set_executor(executor)
+
+    async def main():
+        return await asyncio.gather(*[arollout(env, seed) for env, seed in zip(envs, seeds)])
+
+    with executor:
+        assert asyncio.run(main()) == expected
+    assert executor.calls == (len(seeds) * (len(ACTIONS) + 1) if blocking else 0)
+
+
+def test_inline():
+    check_concurrent(blocking=False)
+
+
+def test_executor():
+    check_concurrent(blocking=True)
+
+
+def test_wrappers():
+    """ areset and astep go through the wrappers below the AsyncWrapper. """
+    for blocking in (False, True):
+        env = AsyncWrapper(gym.make('llf-gridworld-v0', max_episode_steps=3))
+        env.blocking = blocking
+
+        async def main():
+            with pytest.raises(gym.error.ResetNeeded):  # OrderEnforcing
+                await env.astep(0)
+            await env.areset(seed=0)
+            return [(await env.astep(action))[3] for action in ACTIONS[:3]]
+
+        assert asyncio.run(main()) == [False, False, True]  # TimeLimit
+
+
+if __name__ == '__main__':
+    test_inline()
+    test_executor()
+    test_wrappers()
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import openai
+import llfbench
+from llfbench.agents.utils import evaluate_agent
+from llfbench.agents.failures import (RETRYABLE, REQUEST, PROCESS, CircuitBreaker, LLMCallError, LLMFatalError,
+                                      classify)
+
+
+def test_classify():
+    assert classify(openai.error.RateLimitError('slow down')) == RETRYABLE
+    assert classify(openai.error.ServiceUnavailableError('down')) == RETRYABLE
+    assert classify(openai.error.APIError('bad gateway', http_status=502)) == RETRYABLE
+    assert classify(ValueError('unexpected')) == RETRYABLE
+    assert classify(openai.error.InvalidRequestError('too long', 'messages')) == REQUEST
+    assert classify(openai.error.APIError('not found', http_status=404)) == REQUEST
+    assert classify(openai.error.AuthenticationError('wrong key')) == PROCESS
+
+
+def in_thread(fn):
+    """ Call fn in another thread (another caller of the breaker) and return its result. """
+    results = []
+    thread = threading.Thread(target=lambda: results.append(fn()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+def test_circuit_breaker():
+    """ The breaker opens after `threshold` backend errors, lets a single
+        probe through after the cooldown, and closes when it succeeds. """
+    breaker = CircuitBreaker(threshold=2, cooldown=0.1)
+    assert breaker.failure(openai.error.RateLimitError('slow down')) == 0  # the backend is up
+    assert breaker.failure(openai.error.APIConnectionError('refused')) == 0
+    assert breaker.failure(openai.error.APIConnectionError('refused')) == 0.1
+    assert 0 < breaker.delay() <= 0.1
+    time.sleep(0.1)
+    assert breaker.delay() == 0  # the probe
+    assert in_thread(breaker.delay) > 0  # the others wait for it
+    assert in_thread(lambda: breaker.failure(openai.error.APIConnectionError('refused'))) == 0  # not the probe
+    assert breaker.failure(openai.error.APIConnectionError('refused')) == 0.2  # reopened, for longer
+    time.sleep(0.2)
+    breaker.wait()
+    breaker.success()
+    assert breaker.closed and breaker.delay() == 0
+
+
+def test_probe_answered():
+    """ A probe that the backend answers with a rate limit (not a backend
+        error) closes the breaker, and the calls resume. """
+    breaker = CircuitBreaker(threshold=1, cooldown=0.1)
+    assert breaker.failure(openai.error.APIConnectionError('refused')) == 0.1
+    time.sleep(0.1)
+    assert breaker.delay() == 0 and breaker.probing  # the probe
+    assert breaker.failure(openai.error.RateLimitError('slow down')) == 0
+    assert breaker.closed and breaker.delay() == 0
+
+    breaker.failure(openai.error.APIConnectionError('refused'))
+    time.sleep(0.1)
+    assert breaker.delay() == 0  # a probe that is cancelled
+    breaker.release()
+    assert in_thread(breaker.delay) == 0  # another caller probes
+
+
+def test_concurrent_failures():
+    """ The errors of the requests in flight when the breaker opens count
+        once: the pause is not extended by each of them. """
+    breaker = CircuitBreaker(threshold=5, cooldown=0.2)
+    barrier = threading.Barrier(16)
+    pauses = []
+
+    def request():
+        breaker.wait()
+        barrier.wait()  # all in flight, then all time out
+        pauses.append(breaker.failure(openai.error.Timeout('timed out')))
+
+    threads = [threading.Thread(target=request) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(pauses) == [0] * 15 + [0.2]
+    assert breaker.failures == 16 and breaker.next_cooldown == 0.4
+    assert 0.1 < breaker.delay() <= 0.2
+
+
+class FailingAgent:
+    """ An agent whose LLM fails in the given episodes, with a fatal error if `fatal`. """
+
+    def __init__(self, failing_episodes, fatal=False):
+        self.failing_episodes = failing_episodes
+        self.fatal = fatal
+        self.episode = -1
+
+    def reset(self, docstring):
+        self.episode += 1
+
+    def act(self, observation, feedback, **kwargs):
+        if self.episode in self.failing_episodes:
+            raise (LLMFatalError if self.fatal else LLMCallError)('The LLM failed.', attempts=3)
+        return 0
+
+
+def test_rollout_failure():
+    """ An episode whose LLM call fails is marked failed, and the others run;
+        a fatal error stops the evaluation. """
+    env = llfbench.make('llf-gridworld-v0')
+    scores, data = evaluate_agent(FailingAgent([1]), env, horizon=3, n_episodes=3, log_data=True, seed=0)
+    assert len(scores) == 3
+    assert [episode['failure'] is not None for episode in data] == [False, True, False]
+    assert list(np.isnan(scores)) == [False, True, False]
+    assert list(np.isnan(evaluate_agent(FailingAgent([1]), env, horizon=3, n_episodes=3, seed=0))) == [False, True, False]
+    assert data[1]['failure'] == dict(kind='request', message='The LLM failed.', error=None, attempts=3)
+    assert len(data[0]['actions']) == 3 and len(data[1]['actions']) == 0
+    try:
+        evaluate_agent(FailingAgent([1], fatal=True), env, horizon=3, n_episodes=3, seed=0)
+        assert False, 'a fatal error should stop the evaluation'
+    except LLMFatalError:
+        pass
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """ A chat completion endpoint replying with the next status of its script, then 200. """
+
+    def do_POST(self):
+        self.server.body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        status = self.server.script.pop(0) if self.server.script else 200
+        self.server.requests += 1
+        if status == 200:
+            payload = dict(choices=[dict(index=0, message=dict(role='assistant', content='ok'))],
+                           usage=dict(prompt_tokens=5, completion_tokens=1, total_tokens=6))
+        else:
+            payload = dict(error=dict(message=f'Error {status}.', type='error'))
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_call_model():
+    """ call_model retries server errors, pausing in the breaker when the
+        backend seems down, and raises instead of exiting otherwise. """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base, api_key_path = openai.api_base, openai.api_key_path
+    with tempfile.TemporaryDirectory() as directory:
+        key_path = os.path.join(directory, 'key')
+        with open(key_path, 'w') as f:
+            f.write('sk-stub')
+        os.environ.setdefault('OPENAI_KEY_PATH', key_path)
+        from llfbench.agents import llm
+        openai.api_base, openai.api_key_path = f'http://127.0.0.1:{server.server_address[1]}/v1', key_path
+        call = lambda **kwargs: llm.call_model([{'role': 'user', 'content': 'Go up.'}], 'openai:gpt-35-turbo', 0.0, 1,
+                                               wait_time=0.01, **kwargs)
+
+        server.script = [503, 500, 502]
+        breaker = CircuitBreaker(threshold=2, cooldown=0.2)
+        start = time.time()
+        assert call(breaker=breaker)[0] == 'ok'
+        assert server.requests == 4 and time.time() - start >= 0.2 and breaker.closed
+        assert call(max_tokens=7)[0] == 'ok' and server.body['max_tokens'] == 7
+
+        for status, error in [(400, LLMCallError), (401, LLMFatalError)]:
+            server.script, server.requests = [status], 0
+            try:
+                call()
+                assert False, 'the call should fail'
+            except error:
+                assert server.requests == 1  # not retried
+
+        server.script = [503] * 3
+        try:
+            call(max_attempts=3, breaker=CircuitBreaker(threshold=10))
+            assert False, 'the call should fail'
+        except LLMCallError as e:
+            assert e.kind == 'request' and e.attempts == 3
+
+        server.requests = 0
+        try:
+            call(max_attempts=0)
+            assert False, 'the call should fail'
+        except LLMCallError as e:
+            assert e.attempts == 0 and server.requests == 0
+    openai.api_base, openai.api_key_path = api_base, api_key_path
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    test_classify()
+    test_circuit_breaker()
+    test_probe_answered()
+    test_concurrent_failures()
+    test_rollout_failure()
+    test_call_model()
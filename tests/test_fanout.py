@@ -0,0 +1,42 @@
+import llfbench
+from llfbench.envs.oracle import get_llf_wrapper
+
+
+def rollout(env_name, actions, fanout=None, **config):
+    env = llfbench.make(env_name, feedback_type=config.get('feedback_type', 'a'))
+    wrapper = get_llf_wrapper(env)
+    wrapper.set_paraphrase_method(config.get('paraphrase_method', 'random'))
+    wrapper.set_fanout(fanout)
+    env.reset(seed=0)
+    return [env.step(action)[0]['feedback'] for action in actions]
+
+
+def check_fanout(env_name, actions, feedback_types):
+    """ The feedback fanned out to each config should be the same as that of
+        running the trajectory under the config, when neither samples. """
+    configs = [dict(feedback_type=t, paraphrase_method=m) for t in feedback_types for m in (0, 1)]
+    fanout = rollout(env_name, actions, configs)
+    assert all(len(feedbacks) == len(configs) for feedbacks in fanout)
+    for i, config in enumerate(configs):
+        assert [feedbacks[i] for feedbacks in fanout] == rollout(env_name, actions, **config)
+
+
+def test_optimization():
+    check_fanout('llf-optimization-Rosenbrock-v0', ['x = [1.0, 2.0]', 'x = [0.5, 0.5]', 'x = [3.0, -1.0]'],
+                 ('r', 'hp', 'hn', 'fp', 'fn', ('hp', 'fp')))
+
+
+def test_poem():
+    check_fanout('llf-poem-Haiku-v0', ['The sun is up\nThe sky is blue today\nHello there'] * 2, ('r', 'hp', 'hn', 'fp', 'fn'))
+
+
+def test_gridworld():
+    # The feedback is computed by the base env. hn and fn are not checked,
+    # since they sample the action to avoid from the rng of the env.
+    check_fanout('llf-gridworld-v0', [0, 1, 2, 3] * 3, ('r', 'hp', 'fp'))
+
+
+if __name__ == '__main__':
+    test_optimization()
+    test_poem()
+    test_gridworld()
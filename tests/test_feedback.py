@@ -0,0 +1,48 @@
+import pickle
+import numpy as np
+import llfbench
+from llfbench.envs.llf_env import Feedback
+from llfbench.envs.utils import defer, format
+from llfbench.envs.oracle import get_llf_wrapper
+
+
+PROMPTS = ('You got a reward of {reward}.', 'The reward is {reward}.')
+
+
+def test_deferred_fields():
+    """ A deferred field renders like `format` when read, draws the same
+        random numbers, and keeps its template and args in the structured form. """
+    text = format(PROMPTS, rng=np.random.default_rng(0), reward=1.5)
+    feedback = Feedback(r=defer(PROMPTS, rng=np.random.default_rng(0), reward=1.5), hp='Good job.')
+    assert feedback.r == feedback['r'] == text
+    assert feedback.asdict() == dict(r=text, hp='Good job.', hn=None, fp=None, fn=None)
+    assert feedback.structured() == [dict(type='r', template=feedback._r.template, args=dict(reward=1.5)),
+                                     dict(type='hp', template=None, args=None, text='Good job.')]
+    assert feedback._r.template in PROMPTS
+    assert pickle.loads(pickle.dumps(feedback)) == feedback
+    feedback.r += ' More text.'  # rendered and replaced by a string
+    assert feedback.r == text + ' More text.'
+    del feedback['hp']
+    assert feedback.hp is None and 'hp' in feedback
+
+
+def test_unverbalized_step():
+    """ With set_verbalize(False), a step returns the Feedback object, which
+        renders to the same text as the default. """
+    def rollout(verbalize):
+        env = llfbench.make('llf-gridworld-v0', feedback_type='a')
+        get_llf_wrapper(env).set_verbalize(verbalize)
+        env.reset(seed=0)
+        return [env.step(action)[0]['feedback'] for action in [0, 1, 2, 3]]
+
+    texts, feedbacks = rollout(True), rollout(False)
+    wrapper = get_llf_wrapper(llfbench.make('llf-gridworld-v0'))
+    for text, feedback in zip(texts, feedbacks):
+        assert isinstance(feedback, Feedback)
+        assert all(field['template'] is not None for field in feedback.structured())
+        assert wrapper._verbalize_feedback(feedback) == text
+
+
+if __name__ == '__main__':
+    test_deferred_fields()
+    test_unverbalized_step()
@@ -0,0 +1,97 @@
+import string
+import importlib
+import numpy as np
+import pytest
+from llfbench.envs.utils import PromptTable, format, defer
+
+
+class Formatted:
+    """ A value whose format differs from its str. """
+
+    def __str__(self):
+        return 'str'
+
+    def __repr__(self):
+        return 'repr'
+
+    def __format__(self, spec):
+        return f'format({spec})'
+
+
+VALUES = ('text', 3, 2.5, np.float64(1 / 3), np.int64(7), [1, 2], None, Formatted())
+
+TEMPLATES = (
+    'no fields',
+    'a {x} and {y}',
+    'repeated {x}, {x} and {x}',
+    'escaped {{x}} and {{ {x} }}',
+    '{x:>10}|{y:<6}|',
+    '{x!r} {x!s} {x!a}',
+    '{x!r:>12}',
+    '{x[0]}',  # not a named field: str.format
+    '{x:{y}}',  # nested spec: str.format
+)
+
+
+def check_render(template, **kwargs):
+    try:
+        expected = template.format(**kwargs)
+    except Exception as e:
+        with pytest.raises(type(e)):
+            PromptTable((template,)).render(0, kwargs)
+        return
+    assert PromptTable((template,)).render(0, kwargs) == expected, template
+
+
+def test_render():
+    """ render gives the same text as str.format. """
+    for template in TEMPLATES:
+        for x in VALUES:
+            for y in VALUES:
+                check_render(template, x=x, y=y)
+    check_render('{x:.3f} {y:04d}', x=np.float64(1 / 3), y=7)
+    check_render('{x:.3f}', x='text')  # an invalid spec
+    check_render('{x!z}', x=1)  # an invalid conversion
+    check_render('{x} {y}', x=1)  # a missing field
+
+
+def test_prompts():
+    """ render gives the same text as str.format for the prompts of the envs. """
+    for family in ('gridworld', 'bandits', 'optimization', 'reco', 'poem', 'highway', 'alfworld', 'metaworld'):
+        try:
+            module = importlib.import_module(f'llfbench.envs.{family}.prompts')
+        except ImportError:
+            continue
+        for value in vars(module).values():
+            if isinstance(value, (tuple, list)) and len(value) > 0 and all(isinstance(v, str) for v in value):
+                fields = {f for p in value for _, f, _, _ in string.Formatter().parse(p) if f}
+                for x in ('text', 3, 0.25, Formatted()):
+                    for template in value:
+                        check_render(template, **{f: x for f in fields})
+
+
+def test_rng():
+    """ The templates sampled with rng= depend only on the Generator. """
+    prompts = tuple(f'{i}: {{x}}' for i in range(10))
+    np.random.seed(0)
+    state = np.random.get_state()
+    texts = [format(prompts, rng=np.random.default_rng(1), x=0) for _ in range(3)]
+    rng, other = np.random.default_rng(1), np.random.default_rng(1)
+    first = [format(prompts, rng=rng, x=0)]
+    for i in range(20):
+        format(prompts, rng=np.random.default_rng(i), x=i)
+        np.random.rand()
+        first.append(str(defer(prompts, rng=rng, x=0)))
+    second = [format(prompts, rng=other, x=0) for _ in range(21)]
+    assert first == second
+    assert len(set(texts)) == 1
+    np.random.set_state(state)
+    sampled = [format(prompts, x=0) for _ in range(5)]
+    np.random.set_state(state)
+    assert [format(prompts, x=0) for _ in range(5)] == sampled  # without rng, the global np.random
+
+
+if __name__ == '__main__':
+    test_render()
+    test_prompts()
+    test_rng()
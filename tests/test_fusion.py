@@ -0,0 +1,45 @@
+import copy
+import gymnasium as gym
+import llfbench
+from llfbench.envs.oracle import get_llf_wrapper
+from llfbench.envs.llf_env import AsyncWrapper, fused_step
+
+
+def rollout(env, actions):
+    observation, _ = env.reset(seed=0)
+    results = [str(observation)]
+    for action in actions:
+        results.append(str(env.step(action)[:4]))
+    return results
+
+
+def test_production():
+    for env_name, actions in (('llf-gridworld-v0', [0, 1, 2, 3] * 3),
+                              ('llf-poem-Haiku-v0', ['The sun is up\nThe sky is blue today\nHello there'] * 3)):
+        env = llfbench.make(env_name, production=True)
+        wrapper = env
+        while wrapper is not get_llf_wrapper(env):
+            assert not isinstance(wrapper, (gym.wrappers.OrderEnforcing, gym.wrappers.PassiveEnvChecker, AsyncWrapper))
+            wrapper = wrapper.env
+        assert rollout(env, actions) == rollout(llfbench.make(env_name), actions)
+
+
+def test_fused_step():
+    action = 'The sun is up\nThe sky is blue today\nHello there'
+    env = llfbench.make('llf-poem-Haiku-v0')
+    inner = get_llf_wrapper(env).env  # TerminalFreeWrapper -> EnvCompatibility -> the poem env
+    env.reset(seed=0)
+    result = inner.step(action)
+    env.reset(seed=0)
+    assert str(fused_step(inner)(action)) == str(result)
+
+    # A copy steps its own env, not the env the fused step was resolved for.
+    env.reset(seed=0)
+    env.step(action)
+    copied = copy.deepcopy(env)
+    assert str(copied.step(action)[:4]) == str(env.step(action)[:4])
+
+
+if __name__ == '__main__':
+    test_production()
+    test_fused_step()
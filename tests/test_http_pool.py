@@ -0,0 +1,94 @@
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import openai
+from llfbench.agents.http_pool import HTTPPool, aiosession, set_default_pool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """ A keep-alive chat completion endpoint that counts its connections. """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # the headers and the body are sent apart
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        data = json.dumps(dict(choices=[dict(index=0, message=dict(role='assistant', content=body['messages'][-1]['content']))],
+                               usage=dict(prompt_tokens=5, completion_tokens=5, total_tokens=10))).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    server.daemon_threads, server.lock, server.connections = True, threading.Lock(), 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    openai.api_base = f'http://127.0.0.1:{server.server_address[1]}/v1'
+    return server
+
+
+def create(i):
+    response = openai.ChatCompletion.create(model='gpt-35-turbo', messages=[{'role': 'user', 'content': str(i)}],
+                                            api_key='sk-stub')
+    return response['choices'][0]['message']['content']
+
+
+async def acreate(i, pool):
+    with aiosession(pool):
+        response = await openai.ChatCompletion.acreate(model='gpt-35-turbo', messages=[{'role': 'user', 'content': str(i)}],
+                                                       api_key='sk-stub')
+    return response['choices'][0]['message']['content']
+
+
+def test_threads_share_pool():
+    """ The requests of many threads go over at most pool_size connections. """
+    api_base, server = openai.api_base, start_server()
+    try:
+        set_default_pool(HTTPPool(pool_size=2))
+        with ThreadPoolExecutor(8) as executor:
+            assert list(executor.map(create, range(40))) == [str(i) for i in range(40)]
+        assert 1 <= server.connections <= 2
+    finally:
+        set_default_pool(None)
+        openai.api_base = api_base
+        server.shutdown()
+
+
+def test_async_requests_share_pool():
+    """ Concurrent async requests reuse at most pool_size connections, instead
+        of opening one per request. """
+    async def run(pool, n):
+        results = await asyncio.gather(*[acreate(i, pool) for i in range(n)])
+        if pool is not None:
+            await pool.aclose()
+        return results
+
+    api_base, server = openai.api_base, start_server()
+    try:
+        assert asyncio.run(run(None, 10)) == [str(i) for i in range(10)]
+        assert server.connections == 10  # the openai client opens a session per request
+        server.connections = 0
+        pool = HTTPPool(pool_size=1, pool_sizes={openai.api_base: 3})
+        assert asyncio.run(run(pool, 30)) == [str(i) for i in range(30)]
+        assert 1 <= server.connections <= 3
+    finally:
+        openai.api_base = api_base
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    test_threads_share_pool()
+    test_async_requests_share_pool()
@@ -0,0 +1,34 @@
+import llfbench
+from llfbench.envs.oracle import get_llf_wrapper
+
+
+def feedbacks(env_name, feedback_type, actions):
+    """ The Feedback of each step, with the first paraphrase of every prompt
+        so that the feedback does not depend on the rng. """
+    env = get_llf_wrapper(llfbench.make(env_name, feedback_type=feedback_type))
+    env.set_paraphrase_method(0)
+    env.reset(seed=0)
+    return [env._step(action)[0]['feedback'] for action in actions]
+
+
+def check_requested_types(env_name, actions):
+    """ An env configured with a single feedback type should give the same
+        feedback of that type as with all the types, and none of the others. """
+    expected = feedbacks(env_name, 'a', actions)
+    for feedback_type in get_llf_wrapper(llfbench.make(env_name)).FEEDBACK_TYPES:
+        for feedback, full in zip(feedbacks(env_name, feedback_type, actions), expected):
+            assert feedback[feedback_type] == full[feedback_type]
+            assert all(feedback[t] in (None, '') for t in ('r', 'hp', 'hn', 'fp', 'fn') if t != feedback_type)
+
+
+def test_optimization():
+    check_requested_types('llf-optimization-Rosenbrock-v0', ['x = [1.0, 2.0]', 'x = [0.5, 0.5]', 'x = [3.0, -1.0]'])
+
+
+def test_reco():
+    check_requested_types('llf-reco-movie-v0', ['[{"title": "John Wick"}, {"title": "Toy Story"}]'] * 2)
+
+
+if __name__ == '__main__':
+    test_optimization()
+    test_reco()
@@ -0,0 +1,84 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import multiprocessing as mp
+from llfbench.agents.llm_cache import ResponseCache
+
+
+MESSAGES = [{'role': 'system', 'content': 'You are a helpful agent.'}, {'role': 'user', 'content': 'Go up.'}]
+
+
+def test_round_trip():
+    """ A response is read back with its info, under the key of the same request only. """
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, 'cache.db'))
+        key = cache.key('azure:gpt-35-turbo', MESSAGES, 0.0, None)
+        assert key == ResponseCache.key('azure:gpt-35-turbo', [dict(m) for m in MESSAGES], 0.0, None)
+        assert key != cache.key('azure:gpt-35-turbo', MESSAGES, 0.0, 100)
+        assert cache.get(key) is None
+        assert cache.put(key, 'up', {'logprobs': None})
+        assert cache.get(key) == ('up', {'logprobs': None, 'cached': True})
+        assert not cache.put(key, 'up', {'response': object()})  # cannot be encoded
+        assert cache.stats() == dict(hits=1, misses=1, hit_rate=0.5, entries=1, bytes=len('["up", {"logprobs": null}]'))
+        copy = pickle.loads(pickle.dumps(cache))
+        assert copy.get(key)[0] == 'up'
+        assert cache.accepts(0.0) and not cache.accepts(0.7)
+        assert ResponseCache(cache.path, all_temperatures=True).accepts(0.7)
+
+
+def test_eviction():
+    """ The least recently used responses are evicted beyond the bounds. """
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, 'cache.db'), max_entries=3)
+        for i in range(3):
+            cache.put(str(i), f'response {i}', {})
+        cache.get('0')  # now the most recently used
+        cache.put('3', 'response 3', {})
+        assert [cache.get(str(i)) is not None for i in range(4)] == [True, False, True, True]
+
+        size = cache.stats()['bytes'] // 3
+        cache = ResponseCache(os.path.join(directory, 'sized.db'), max_bytes=2 * size)
+        for i in range(3):
+            cache.put(str(i), f'response {i}', {})
+        assert [cache.get(str(i)) is not None for i in range(3)] == [False, True, True]
+        assert cache.stats()['bytes'] == 2 * size
+
+
+def test_locked():
+    """ A response that cannot be written while another process holds the
+        write lock is not cached, and put does not raise. """
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, 'cache.db'), timeout=0.1)
+        other = sqlite3.connect(cache.path, isolation_level=None)
+        other.execute('BEGIN IMMEDIATE')
+        assert not cache.put('0', 'response 0', {})
+        other.execute('ROLLBACK')
+        assert cache.get('0') is None
+        assert cache.put('0', 'response 0', {})
+
+
+def write(cache, worker):
+    for i in range(50):
+        cache.put(f'{worker}-{i}', f'response {i}', {'worker': worker})
+
+
+def test_processes():
+    """ Processes writing to the same cache concurrently lose no response. """
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, 'cache.db'))
+        processes = [mp.Process(target=write, args=(cache, worker)) for worker in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+        assert cache.stats()['entries'] == 200
+        assert cache.get('3-49') == ('response 49', {'worker': 3, 'cached': True})
+
+
+if __name__ == '__main__':
+    test_round_trip()
+    test_eviction()
+    test_locked()
+    test_processes()
@@ -0,0 +1,48 @@
+import functools
+import llfbench
+from llfbench.envs.env_wrappers import FullInformationWrapper
+
+
+def rollout(env, seed, actions):
+    infos = [env.reset(seed=seed)[1]]
+    for action in actions:
+        infos.append(env.step(action)[-1])
+    return infos
+
+
+def check_oracle(num_workers, env_name='llf-gridworld-v0', actions=(0, 1, 2, 3, 0), **kwargs):
+    env_fn = functools.partial(llfbench.make, env_name, **kwargs)
+    env = FullInformationWrapper(env_fn(), env_fn=env_fn, num_workers=num_workers)
+    infos = rollout(env, 0, actions)
+
+    # The oracle does not change the env.
+    plain_infos = rollout(env_fn(), 0, actions)
+    assert [info['success'] for info in infos] == [info['success'] for info in plain_infos]
+
+    # Each result is the same as stepping the action.
+    other = env_fn()
+    for i, info in enumerate(infos):
+        oracle_info = info['oracle_info']
+        assert set(oracle_info.keys()) == set(range(env.action_space.n))
+        for action, result in oracle_info.items():
+            other.reset(seed=0)
+            for a in actions[:i]:
+                other.step(a)
+            observation, reward, terminated, truncated, _ = other.step(action)
+            assert result['reward'] == reward
+            assert result['feedback'] == observation['feedback']
+            assert result['observation'] == observation
+    env.close()
+
+
+def test_oracle():
+    check_oracle(0, feedback_type='m')
+
+
+def test_oracle_workers():
+    check_oracle(2, feedback_type='a')
+
+
+if __name__ == '__main__':
+    test_oracle()
+    test_oracle_workers()
@@ -0,0 +1,26 @@
+import pstats
+import tempfile
+from llfbench import profile
+
+
+def test_profile():
+    with tempfile.TemporaryDirectory() as directory:
+        paths = profile.main(['llf-gridworld-v0', '--steps', '50', '--policy', 'expert', '--output', directory, '--top', '5'])
+        stats = pstats.Stats(paths['prof'])
+        assert any(function == 'step' for _, _, function in stats.stats)
+        with open(paths['collapsed']) as f:
+            for line in f:
+                stack, count = line.rsplit(' ', 1)
+                assert int(count) > 0 and 'run (profile.py' in stack
+
+
+def test_text_actions():
+    """ The random policy of an env with a Text action space. """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = profile.main(['llf-poem-Haiku-v0', '--steps', '5', '--output', directory, '--top', '5'])
+        assert any(function == 'step' for _, _, function in pstats.Stats(paths['prof']).stats)
+
+
+if __name__ == '__main__':
+    test_profile()
+    test_text_actions()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import numpy as np
+import llfbench
+from llfbench.envs.recorder import RecordingWrapper, TrajectoryReader, decode, encode
+
+
+def record(path, num_episodes, actions=(0, 1, 2, 3), **kwargs):
+    env = RecordingWrapper(llfbench.make('llf-gridworld-v0'), path, **kwargs)
+    steps = []
+    for episode in range(num_episodes):
+        observation, info = env.reset(seed=episode)
+        steps.append((observation, None))
+        for action in actions:
+            observation, reward, terminated, truncated, info = env.step(action)
+            steps.append((observation, reward))
+    env.close()
+    return steps
+
+
+def test_recorder():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'trajectories.jsonl.gz')
+        steps = record(path, 3, chunk_size=4, info_keys=('expert_action',))
+        reader = TrajectoryReader(path)
+        assert len(reader) == len(steps) == 15
+        assert len(reader.chunks) == 4
+        records = list(reader.records())
+        for (observation, reward), r in zip(steps, records):
+            assert r['instruction'] == observation['instruction']
+            assert r['observation'] == observation['observation']
+            assert r['feedback'] == observation['feedback']
+            assert r['reward'] == reward
+            assert 'expert_action' in r
+        episodes = list(reader.episodes())
+        assert [len(e) for e in episodes] == [5, 5, 5]
+        assert [e[0]['episode'] for e in episodes] == [0, 1, 2]
+        assert [r['t'] for r in episodes[0]] == [0, 1, 2, 3, 4]
+        assert episodes[0][1]['action'] == 0
+
+        # Appending continues the numbering of the episodes; the bytes of a
+        # chunk which was not indexed (e.g. by a crashed writer) are dropped.
+        with open(path, 'ab') as f:
+            f.write(b'partial chunk')
+        record(path, 1, chunk_size=4)
+        episodes = list(TrajectoryReader(path).episodes())
+        assert [e[0]['episode'] for e in episodes] == [0, 1, 2, 3]
+        assert episodes[3][0]['instruction'] == episodes[0][0]['instruction']  # both seeded with 0
+
+        # A writer which crashed while writing a line of the index: the line
+        # is dropped before appending to the index.
+        with open(path, 'ab') as f:
+            f.write(b'partial chunk')
+        with open(path + '.index', 'a') as f:
+            f.write('{"offset": 0, "len')
+        record(path, 1, chunk_size=4)
+        episodes = list(TrajectoryReader(path).episodes())
+        assert [e[0]['episode'] for e in episodes] == [0, 1, 2, 3, 4]
+
+
+def test_encode():
+    value = dict(a=np.arange(6, dtype=np.float32).reshape(2, 3), b=[np.int64(3), 'text', None], c=np.bool_(True))
+    decoded = decode(encode(value))
+    assert decoded['a'].dtype == np.float32 and np.array_equal(decoded['a'], value['a'])
+    assert decoded['b'] == [3, 'text', None] and decoded['c'] is True
+
+
+if __name__ == '__main__':
+    test_recorder()
+    test_encode()
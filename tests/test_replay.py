@@ -0,0 +1,63 @@
+import os
+import tempfile
+import llfbench
+from llfbench.envs.recorder import RecordingWrapper
+from llfbench.envs.replay import ReplayEnv
+
+
+def run(env, seed, actions):
+    outputs = [env.reset(seed=seed)[0]]
+    for action in actions:
+        observation, reward, terminated, truncated, info = env.step(action)
+        outputs.append((observation, reward, terminated, truncated, info['success']))
+    return outputs
+
+
+def test_replay():
+    env_fn = lambda: llfbench.make('llf-gridworld-v0', feedback_type='m')
+    made = []
+
+    def counted_env_fn():
+        made.append(True)
+        return env_fn()
+
+    recorded = [0, 1, 2, 3]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'trajectories.jsonl.gz')
+        env = RecordingWrapper(env_fn(), path, chunk_size=3)
+        expected = [run(env, seed, recorded) for seed in range(2)]
+        env.close()
+
+        replay = ReplayEnv(path, env_fn=counted_env_fn)
+        assert len(replay) == 2
+        assert replay.action_space == env.action_space and replay.observation_space == env.observation_space
+        replay.action_space.seed(0)
+        replay.action_space.sample()
+        assert [run(replay, None, recorded) for _ in range(2)] == expected
+        assert not made  # no simulation as long as the agent follows the recording
+
+        # Deviating from the recording, or stepping past its end, simulates the episode.
+        for seed, actions in enumerate(([0, 1, 0, 0], recorded + [1, 2])):  # episode i was seeded with i
+            replayed = run(replay, None, actions)
+            assert replayed == run(env_fn(), seed, actions)
+        assert len(made) == 1
+        replay.close()
+
+
+def test_spaces():
+    """ The spaces of the recorded envs are read from the header. """
+    with tempfile.TemporaryDirectory() as directory:
+        for env_name in ('llf-highway-parking-v0', 'llf-poem-Haiku-v0'):
+            path = os.path.join(directory, f'{env_name}.jsonl.gz')
+            env = RecordingWrapper(llfbench.make(env_name), path)
+            env.reset(seed=0)
+            env.close()
+            replay = ReplayEnv(path)  # it cannot make the env
+            assert replay.reader.header['env_id'] == env_name
+            assert replay.action_space == env.action_space and replay.observation_space == env.observation_space
+            replay.close()
+
+
+if __name__ == '__main__':
+    test_replay()
+    test_spaces()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import llfbench
+
+
+def rollout(env, seed, actions):
+    observations = [env.reset(seed=seed)[0]]
+    for action in actions:
+        observations.append(env.step(action)[0])
+    return observations
+
+
+def check_independent_streams(env_name, actions, **kwargs):
+    """ Envs in the same process should not share a random stream: stepping
+        another env in between must not change the results of a seeded env. """
+    env, other = llfbench.make(env_name, **kwargs), llfbench.make(env_name, **kwargs)
+    expected = rollout(env, 0, actions)
+
+    observations = [env.reset(seed=0)[0]]
+    other.reset(seed=1)
+    for action in actions:
+        other.step(action)
+        observations.append(env.step(action)[0])
+    assert observations == expected
+
+
+def test_gridworld():
+    check_independent_streams('llf-gridworld-v0', [0, 1, 2, 3] * 3, feedback_type='m')
+    check_independent_streams('llf-gridworld-v0', [0, 1, 2, 3] * 3, instruction_type='p', feedback_type='a')
+
+
+def test_optimization():
+    check_independent_streams('llf-optimization-Rosenbrock-v0', ['x = [1.0, 2.0]', 'x = [0.5, 0.5]'] * 3, feedback_type='m')
+
+
+def test_bandits():
+    """ The arms are drawn from the seed of the reset, and not from (nor
+        changing) the global np.random of the caller. """
+    env_name = 'llf-bandits-BanditTenArmedGaussian-v0'
+    spec = llfbench.get_spec(env_name)
+    if spec is None or not spec.available:
+        pytest.skip('gym_bandits is not installed')
+    actions = list(range(10))
+    check_independent_streams(env_name, actions, feedback_type='a')
+
+    env = llfbench.make(env_name, feedback_type='a')
+    np.random.seed(1)
+    expected = rollout(env, 0, actions)
+    state = np.random.get_state()
+    np.random.seed(2)
+    assert rollout(env, 0, actions) == expected
+    np.random.seed(1)
+    rollout(env, 0, actions)
+    assert all(np.array_equal(a, b) for a, b in zip(np.random.get_state(), state))
+
+
+if __name__ == '__main__':
+    test_gridworld()
+    test_optimization()
+    test_bandits()
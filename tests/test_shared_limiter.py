@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import multiprocessing as mp
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from llfbench.agents.shared_limiter import SharedRateLimiter
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ A chat completion endpoint that answers at most `capacity` requests
+        per second, and 429 (Retry-After: 1) to the others. """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            now = time.monotonic()
+            server.times = [t for t in server.times if now - t < 1.0]
+            throttled = len(server.times) >= server.capacity
+            if throttled:
+                server.throttled += 1
+            else:
+                server.times.append(now)
+                server.answered += 1
+        if throttled:
+            self.reply(429, dict(error=dict(message='Rate limit exceeded.', type='rate_limit_error')), {'Retry-After': '1'})
+        else:
+            self.reply(200, dict(choices=[dict(index=0, message=dict(role='assistant', content=body['messages'][-1]['content']))],
+                                 usage=dict(prompt_tokens=5, completion_tokens=5, total_tokens=10)))
+
+    def reply(self, status, payload, headers={}):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(capacity):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.capacity, server.lock, server.times, server.answered, server.throttled = capacity, threading.Lock(), [], 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def acquire(limiter, barrier, n, times):
+    barrier.wait()
+    for _ in range(n):
+        limiter.acquire()
+        times.append(time.time())
+
+
+def test_processes_share_rate():
+    """ Processes acquiring from the same limiter are paced together. """
+    with tempfile.TemporaryDirectory() as directory:
+        limiter = SharedRateLimiter('test', requests_per_minute=1200, requests_burst=2, directory=directory)  # 20 per s
+        barrier, times = mp.Barrier(4), mp.Manager().list()
+        processes = [mp.Process(target=acquire, args=(limiter, barrier, 5, times)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        times = sorted(times)
+        assert len(times) == 20 and 0.8 < times[-1] - times[0] < 2.0  # 18 beyond the burst, at 20 per s
+
+        other = SharedRateLimiter('test', requests_per_minute=1200, requests_burst=2, directory=directory)
+        other.pause(0.3)
+        assert limiter.state()['paused'] > 0.2
+        assert 0.25 < limiter.acquire() < 0.5  # paused by the other one
+
+
+def call(port, key_path, limiter, barrier, worker, n):
+    os.environ['OPENAI_KEY_PATH'] = key_path
+    import openai
+    from llfbench.agents import llm
+    openai.api_base, openai.api_key_path = f'http://127.0.0.1:{port}/v1', key_path
+    barrier.wait()
+    for i in range(n):
+        response, _ = llm.call_model([{'role': 'user', 'content': f'{worker}-{i}'}], 'openai:gpt-35-turbo', 0.0, 10,
+                                     wait_time=0.2, max_attempts=50, limiter=limiter)
+        assert response == f'{worker}-{i}'
+
+
+def run_workers(limiter, capacity=10, workers=4, n=5):
+    server = start_stub(capacity)
+    with tempfile.TemporaryDirectory() as directory:
+        key_path = os.path.join(directory, 'key')
+        with open(key_path, 'w') as f:
+            f.write('sk-stub')
+        barrier = mp.Barrier(workers)
+        processes = [mp.Process(target=call, args=(server.server_address[1], key_path, limiter, barrier, worker, n))
+                     for worker in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+    server.shutdown()
+    assert server.answered == workers * n
+    return server.throttled
+
+
+def test_stub_server():
+    """ Workers calling a server that throttles beyond 10 requests per s get
+        429s on their own, and none when they share a limiter within the quota. """
+    assert run_workers(limiter=None) > 0
+    with tempfile.TemporaryDirectory() as directory:
+        limiter = SharedRateLimiter('stub', requests_per_minute=480, requests_burst=2, directory=directory)
+        assert run_workers(limiter) == 0
+
+
+if __name__ == '__main__':
+    test_processes_share_rate()
+    test_stub_server()
@@ -0,0 +1,44 @@
+import llfbench
+import numpy as np
+import gymnasium as gym
+
+ACTION_SPACES = {
+    gym.spaces.Discrete: 'discrete',
+    gym.spaces.Text: 'text',
+    gym.spaces.Box: 'box',
+}
+
+
+def test_specs():
+    """ Check the registered specs against the envs (for the envs that can be made cheaply). """
+    llf_ids = [env_id for env_id in gym.envs.registry if env_id.startswith('llf-')]
+    assert set(llf_ids) == set(llfbench.ENV_SPECS.keys())
+    for env_id, spec in llfbench.ENV_SPECS.items():
+        if not spec.available or spec.make_cost == 'high':
+            continue
+        env = llfbench.make(env_id)
+        assert tuple(env.INSTRUCTION_TYPES) == spec.instruction_types, env_id
+        assert tuple(env.FEEDBACK_TYPES) == spec.feedback_types, env_id
+        assert np.allclose(np.array(env.reward_range, dtype=float), spec.reward_range), env_id
+        assert ACTION_SPACES[type(env.action_space)] == spec.action_space, env_id
+        assert llfbench.supported_types(env_id) == (spec.instruction_types, spec.feedback_types)
+
+
+def test_optional_families():
+    """ The envs of the optional families are registered even if their
+        dependencies are not installed, in which case making them raises. """
+    for env_id, module in (('llf-metaworld-reach-v2', 'metaworld'), ('llf-alfworld-v0', 'alfworld')):
+        spec = llfbench.get_spec(env_id)
+        assert spec is not None and spec.requires == (module,)
+        assert llfbench.supported_types(env_id) == (spec.instruction_types, spec.feedback_types)
+        if not spec.available:
+            try:
+                llfbench.make(env_id)
+                assert False, f'{env_id} should not be made without {module}'
+            except ImportError:
+                pass
+
+
+if __name__ == '__main__':
+    test_specs()
+    test_optional_families()
@@ -0,0 +1,38 @@
+import llfbench
+from llfbench.envs.oracle import get_llf_wrapper
+
+
+def rollout(env, actions):
+    return [env.step(action)[:2] for action in actions]
+
+
+def check_restore(env_name, actions, **kwargs):
+    """ Restoring a snapshot should reproduce the steps taken after it, no
+        matter how many times it is restored. """
+    env = get_llf_wrapper(llfbench.make(env_name, **kwargs))
+    env.reset(seed=0)
+    rollout(env, actions[:2])
+    state = env.get_state()
+    expected = rollout(env, actions)
+    for _ in range(2):
+        env.set_state(state)
+        assert rollout(env, actions) == expected
+
+
+def test_gridworld():
+    check_restore('llf-gridworld-v0', [0, 1, 2, 3] * 3, feedback_type='m')
+    check_restore('llf-gridworld-v0', [0, 1, 2, 3] * 3, instruction_type='p', feedback_type='a')
+
+
+def test_optimization():
+    check_restore('llf-optimization-Rosenbrock-v0', ['x = [1.0, 2.0]', 'x = [0.5, 0.5]'] * 3, feedback_type='m')
+
+
+def test_poem():
+    check_restore('llf-poem-LineSyllableConstrainedPoem-v0', ['The sun is up\nThe sky is blue\nHello there'] * 3, feedback_type='m')
+
+
+if __name__ == '__main__':
+    test_gridworld()
+    test_optimization()
+    test_poem()
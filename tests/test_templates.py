@@ -0,0 +1,51 @@
+import parse
+import numpy as np
+from llfbench.envs.templates import compile_template, TemplateSet
+from llfbench.envs.utils import format
+from llfbench.envs.reco import prompts as reco_prompts
+
+
+def check_search(template, text):
+    parsed = parse.search(template, text)
+    expected = None if parsed is None else parsed.named
+    assert compile_template(template).search(text) == expected, (template, text)
+
+
+def test_search():
+    check_search('This is an {fruit}.', 'This is an apple. This is a banana. This is an apple.')
+    check_search('This is an {fruit}.', 'this is AN apple.')  # case insensitive
+    check_search('This is an {fruit}.', 'This is a banana.')  # no match
+    check_search('{a} and {a}', 'x and y, y and y')  # repeated fields
+    check_search('{{literal}} {x}!', 'a {literal} b!')
+    check_search('(y) of [x] {x}?', 'the output (y) of [x] 1.0?')
+    for name, value in vars(reco_prompts).items():
+        if name.endswith('_template'):
+            examples = getattr(reco_prompts, name[:-len('_template')])
+            for example in examples:
+                text = 'Some text. ' + example.format(movie='movie', rest='a, b', action_comedy='comedy',
+                                                      action_comedy_movie='comedy', correct_years='1990s',
+                                                      child_friendly='child-friendly')
+                check_search(value, text)
+                check_search(value, value.format(movie='movie', rest='a, b', action_comedy='comedy',
+                                                 action_comedy_movie='comedy', correct_years='1990s',
+                                                 child_friendly='child-friendly'))
+
+
+def test_template_set():
+    templates = [(reco_prompts.year_r_pos_template, reco_prompts.year_r_pos),
+                 (reco_prompts.year_r_neg_template, reco_prompts.year_r_neg)]
+    template_set = TemplateSet(templates)
+    for template, _ in templates:
+        text = template.format(movie='movie', correct_years='1990s') + ' More text.'
+        np.random.seed(0)
+        expected = text
+        for t, prompts in templates:
+            expected = compile_template(t).reformat(expected, prompts, format)
+        np.random.seed(0)
+        assert template_set.reformat(text, format) == expected
+        assert expected != text
+
+
+if __name__ == '__main__':
+    test_search()
+    test_template_set()
@@ -0,0 +1,40 @@
+import os
+import json
+import tempfile
+import llfbench
+from llfbench.envs import timing
+
+
+def run(env_name, actions, **kwargs):
+    env = llfbench.make(env_name, **kwargs)
+    env.reset(seed=0)
+    return [env.step(action)[-1] for action in actions]
+
+
+def test_timing():
+    timing.TIMER.reset()
+    timing.enable()
+    try:
+        infos = run('llf-optimization-Rosenbrock-v0', ['x = [1.0, 2.0]'] * 3, feedback_type='a')
+        for info in infos:
+            assert set(info['timing']) == set(timing.STAGES)
+            assert all(stage['time'] >= 0 for stage in info['timing'].values())
+        infos = run('llf-gridworld-v0', [0, 1, 2], feedback_type='a')
+        assert 'env_step' in infos[0]['timing'] and 'paraphrase' in infos[0]['timing']
+
+        summary = timing.TIMER.summary()
+        assert summary['LossLandscapeGymWrapper']['env_step']['count'] == 3
+        assert summary['GridworldWrapper']['verbalize']['count'] == 3
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'timing.json')
+            timing.TIMER.export(path)
+            with open(path) as f:
+                assert json.load(f).keys() == summary.keys()
+    finally:
+        timing.disable()
+        timing.TIMER.reset()
+    assert all('timing' not in info for info in run('llf-gridworld-v0', [0, 1, 2]))
+
+
+if __name__ == '__main__':
+    test_timing()
@@ -0,0 +1,41 @@
+import llfbench
+import numpy as np
+
+
+def run_vector_env(mode, num_envs=3, horizon=25):
+    venv = llfbench.make_vec('llf-gridworld-v0', num_envs, mode=mode)
+    obs, info = venv.reset(seed=0)
+    assert set(obs.keys()) == {'instruction', 'observation', 'feedback'}
+    assert all(len(v) == num_envs for v in obs.values())
+    assert all(i is not None for i in obs['instruction'])
+    assert all(f is None for f in obs['feedback'])
+
+    ended = False
+    for _ in range(horizon):
+        obs, reward, terminated, truncated, info = venv.step([0] * num_envs)
+        assert reward.shape == terminated.shape == truncated.shape == (num_envs,)
+        if np.any(terminated | truncated):
+            ended = True
+            # The final feedback is kept and the env is reset.
+            assert info['_final_observation'].any()
+            for i in np.nonzero(info['_final_observation'])[0]:
+                assert isinstance(info['final_observation'][i]['feedback'], str)
+                assert obs['instruction'][i] is not None
+        else:
+            assert all(isinstance(f, str) for f in obs['feedback'])
+    assert ended
+    assert venv.call('reward_range') == ((0.0, 1.0),) * num_envs
+    venv.close()
+
+
+def test_sync_vector_env():
+    run_vector_env('sync')
+
+
+def test_process_vector_env():
+    run_vector_env('process')
+
+
+if __name__ == '__main__':
+    test_sync_vector_env()
+    test_process_vector_env()